@@ -0,0 +1,73 @@
+from contextlib import contextmanager
+from unittest import mock
+
+import pymongo as pm
+
+from RNPDNO.Config import ConfigReader
+
+import copy
+import os
+
+# Environment variables read by ConfigReader.load_env_vars()
+FAKE_ENV_VARS = {
+    "SCRAPPER_MONGO_HOST": "localhost",
+    "SCRAPPER_MONGO_PORT": "27017",
+    "SCRAPPER_MONGO_CONFIGDB_USERNAME": "bench",
+    "SCRAPPER_MONGO_CONFIGDB_PASSWORD": "bench",
+    "SCRAPPER_MONGO_CONFIGDB_NAME": "rnpdno_config",
+}
+
+# Configuration variables of the stand-in config DB
+FAKE_CONFIG_VARS = {
+    "SCRAPPER_MONGO_TARGETDB_NAME": "rnpdno",
+    "SCRAPPER_MONGO_TARGETDB_USERNAME": "bench",
+    "SCRAPPER_MONGO_TARGETDB_PASSWORD": "bench",
+    # Retry failed requests quickly, a benchmark measures throughput, not back-off
+    "SCRAPPER_RETRY_POLICY": {"max_attempts": 5, "backoff_base": 0.01, "backoff_max": 0.1, "timeout": 10},
+}
+
+@contextmanager
+def mock_config_db(request_templates: list, config_vars: dict = None, client = None):
+    """Serve the app configuration from an in-memory stand-in of MongoDB
+
+    Inside the context, the `SCRAPPER_MONGO_*` environment variables point to a mongomock client seeded with the
+    configuration variables and the request templates, so `Scrapper.load_config()` (and the target DB, e.g. sinks) work
+    without a Mongo server. Requires mongomock.
+
+    Usage:
+        with FakeRNPDNOServer() as server, mock_config_db(fake_request_templates(server.url)):
+            scrapper = bootstrap_scrapper()
+
+    Args:
+        request_templates (list): Request templates (see `fake_request_templates(...)`).
+        config_vars (dict, optional): Configuration variables, updating FAKE_CONFIG_VARS. Defaults to None.
+        client (optional): A mongomock (or pymongo) client to use instead of a new one. Defaults to None.
+
+    Yields:
+        mongomock.MongoClient: The client.
+    """
+
+    if client is None:
+        try:
+            import mongomock
+        except ImportError as e:
+            raise ImportError("The config DB stand-in requires mongomock (pip install mongomock)!") from e
+
+        client = mongomock.MongoClient()
+
+    config_db = client[FAKE_ENV_VARS["SCRAPPER_MONGO_CONFIGDB_NAME"]]
+    config_db["config_vars"].delete_many({})
+    config_db["config_vars"].insert_many([{"name": name, "value": value} for name, value in {**FAKE_CONFIG_VARS, **(config_vars or {})}.items()])
+    config_db["request_templates"].delete_many({})
+    config_db["request_templates"].insert_many(copy.deepcopy(request_templates))
+
+    with mock.patch.dict(os.environ, FAKE_ENV_VARS), \
+            mock.patch.object(pm, "MongoClient", lambda *args, **kwargs: client), \
+            mock.patch.object(ConfigReader, "test_config_db_conn", lambda self: True):
+        # Never hand out clients cached before (or after) the stand-in
+        ConfigReader.clear_clients()
+
+        try:
+            yield client
+        finally:
+            ConfigReader.clear_clients()
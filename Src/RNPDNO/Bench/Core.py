@@ -0,0 +1,174 @@
+from typing import Callable, Union
+
+from RNPDNO.Bench.FakeAPI import FakeRNPDNOServer, fake_request_templates
+from RNPDNO.Bench.Config import mock_config_db
+from RNPDNO.Config import ConfigReader
+from RNPDNO.Crawler import Crawler, bootstrap_scrapper
+from RNPDNO.Ledger import MemoryLedger
+from RNPDNO.Scrapper import Scrapper
+
+import subprocess
+import tracemalloc
+import platform
+import logging
+import json
+import time
+import os
+
+# Init logger
+logger = logging.getLogger(__name__)
+
+def measure(function: Callable, *args, trace_memory: bool = False, **kwargs) -> tuple:
+    """Call a function, measuring its wall time and, optionally, its peak memory
+
+    Tracing memory slows Python code down, so don't trust the time of a call with trace_memory = True.
+
+    Returns:
+        tuple: The result, the number of seconds and the peak of traced memory in bytes (None if not traced).
+    """
+
+    if trace_memory:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+
+    try:
+        result = function(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+
+    return result, seconds, peak
+
+def bench_startup(repeat: int = 5) -> dict:
+    """Measure the time to bootstrap a Scrapper (load the config and initialize a session)
+
+    Must be called inside `mock_config_db(...)`. The config DB client is dropped before every run, so every
+    run pays the connection as a new process would.
+
+    Returns:
+        dict: Mean and minimum seconds.
+    """
+
+    times = []
+
+    for _ in range(repeat):
+        ConfigReader.clear_clients()
+        _, seconds, _ = measure(bootstrap_scrapper, level = logging.WARNING)
+        times.append(seconds)
+
+    return {"mean_seconds": sum(times) / len(times), "min_seconds": min(times)}
+
+def bench_catalogue_crawl(scrapper: Scrapper, server: FakeRNPDNOServer, max_workers: int = 8, trace_memory: bool = False) -> dict:
+    """Measure a full catalogue crawl (see `Crawler.get_catalogue(...)`)
+
+    Returns:
+        dict: Number of records and requests, seconds, requests per second and peak memory in MB (None if not traced).
+    """
+
+    crawler = Crawler(scrapper, max_workers = max_workers)
+
+    server.reset_counts()
+    records, seconds, peak = measure(crawler.get_catalogue, trace_memory = trace_memory)
+
+    return {
+        "records": len(records),
+        "requests": server.n_requests,
+        "seconds": seconds,
+        "requests_per_second": server.n_requests / seconds,
+        "peak_memory_mb": peak / 2 ** 20 if peak is not None else None
+    }
+
+def bench_totals_crawl(scrapper: Scrapper, server: FakeRNPDNOServer, level: str = "municipality", max_workers: int = 8, trace_memory: bool = False) -> dict:
+    """Measure a totals crawl of every geography of a level (see `Crawler.crawl_totals(...)`)
+
+    The units of work are built before the clock starts.
+
+    Returns:
+        dict: Number of units done and failed, number of requests, seconds, requests per second and peak memory in MB (None if not traced).
+    """
+
+    crawler = Crawler(scrapper, max_workers = max_workers)
+    ledger = MemoryLedger(crawler.iter_totals_units(level = level))
+
+    server.reset_counts()
+    result, seconds, peak = measure(crawler.crawl_totals, ledger, trace_memory = trace_memory)
+
+    return {
+        **result,
+        "requests": server.n_requests,
+        "seconds": seconds,
+        "requests_per_second": server.n_requests / seconds,
+        "peak_memory_mb": peak / 2 ** 20 if peak is not None else None
+    }
+
+def get_commit(path: str = None) -> Union[str, None]:
+    """Get the current git commit of the code (None if it's not in a git repository)
+    """
+
+    path = path if path is not None else os.path.dirname(os.path.abspath(__file__))
+
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd = path, capture_output = True, text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(n_states: int = 32, n_municipalities: int = 10, n_neighborhoods: int = 20, latency: float = 0.0, error_rate: float = 0.0, max_workers: int = 8, level: str = "municipality", trace_memory: bool = True) -> dict:
+    """Run the benchmark suite against a FakeRNPDNOServer and a stand-in config DB
+
+    Each crawl is run once to measure its throughput and, if trace_memory is True, once more to measure its peak memory.
+
+    Args:
+        n_states (int, optional): Number of states of the fake catalogue. Defaults to 32.
+        n_municipalities (int, optional): Number of municipalities per state. Defaults to 10.
+        n_neighborhoods (int, optional): Number of neighborhoods per municipality. Defaults to 20.
+        latency (float, optional): Latency of the fake server in seconds. Defaults to 0.0.
+        error_rate (float, optional): Error rate of the fake server. Defaults to 0.0.
+        max_workers (int, optional): Maximum number of requests in flight. Defaults to 8.
+        level (str, optional): Geographic level of the totals crawl. Defaults to "municipality".
+        trace_memory (bool, optional): Should the peak memory of the crawls be measured? Defaults to True.
+
+    Returns:
+        dict: The results, with the parameters, the commit and the Python version.
+    """
+
+    parameters = {
+        "n_states": n_states,
+        "n_municipalities": n_municipalities,
+        "n_neighborhoods": n_neighborhoods,
+        "latency": latency,
+        "error_rate": error_rate,
+        "max_workers": max_workers,
+        "level": level
+    }
+
+    results = {"timestamp": time.time(), "commit": get_commit(), "python": platform.python_version(), "parameters": parameters}
+
+    with FakeRNPDNOServer(n_states = n_states, n_municipalities = n_municipalities, n_neighborhoods = n_neighborhoods, latency = latency, error_rate = error_rate) as server:
+        with mock_config_db(fake_request_templates(server.url)):
+            logger.info("Running startup benchmark...")
+            results["startup"] = bench_startup()
+
+            scrapper = bootstrap_scrapper(level = logging.WARNING)
+
+            logger.info("Running catalogue crawl benchmark...")
+            results["catalogue_crawl"] = bench_catalogue_crawl(scrapper, server, max_workers = max_workers)
+
+            logger.info("Running totals crawl benchmark...")
+            results["totals_crawl"] = bench_totals_crawl(scrapper, server, level = level, max_workers = max_workers)
+
+            if trace_memory:
+                logger.info("Measuring peak memory...")
+                results["catalogue_crawl"]["peak_memory_mb"] = bench_catalogue_crawl(scrapper, server, max_workers = max_workers, trace_memory = True)["peak_memory_mb"]
+                results["totals_crawl"]["peak_memory_mb"] = bench_totals_crawl(scrapper, server, level = level, max_workers = max_workers, trace_memory = True)["peak_memory_mb"]
+
+    return results
+
+def append_results(path: str, results: dict) -> None:
+    """Append benchmark results to a newline-delimited JSON file, to track them across commits
+    """
+
+    with open(path, "a", encoding = "utf-8") as f:
+        f.write(json.dumps(results) + "\n")
@@ -0,0 +1,394 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+from http.cookies import SimpleCookie
+
+import pkgutil
+import threading
+import logging
+import random
+import json
+import time
+import zlib
+
+# Init logger
+logger = logging.getLogger(__name__)
+
+# Name of the session cookie
+SESSION_COOKIE = "ASP.NET_SessionId"
+
+# Pages that don't need a session cookie
+DASHBOARD_PATHS = ("/Dashboard/Index", "/Dashboard/ContextoGeneral", "/Dashboard/Disclaimer")
+
+# Page the server redirects to when the session cookie is missing or expired
+DISCLAIMER_HTML = "<!DOCTYPE html><html><head><title>RNPDNO</title></head><body><p>Aviso de privacidad</p></body></html>"
+
+# Sexes of the chart series
+SEXES = ("Hombre", "Mujer", "Indeterminado")
+
+# BarChartSexoColonia only charts the neighborhoods with the most records, as the real server
+MAX_NEIGHBORHOOD_CATEGORIES = 30
+
+# Categories of AreaChartSexoAnio, as sent by the real server
+YEAR_CATEGORIES = ["1.CIFRA SIN  AÑO DE REFERENCIA", *[str(year) for year in range(2000, 2022)]]
+
+def fake_request_templates(host: str) -> list:
+    """Load the packaged request templates pointing to another host (e.g. a FakeRNPDNOServer)
+
+    Args:
+        host (str): Host URL (e.g. "http://127.0.0.1:8000/").
+
+    Returns:
+        list: The request templates.
+    """
+
+    templates = json.loads(pkgutil.get_data("RNPDNO", "Data/request_templates.json"))
+
+    for template in templates:
+        template["host"] = host
+
+    return templates
+
+class FakeRNPDNOServer:
+    """Local stand-in of the public version of the RNPDNO
+
+    Serves the dashboard pages and the Catalogo and Sociodemograficos end-points documented in `Test/API.md`, with a
+    synthetic catalogue of configurable size. Counts are derived from a hash of the request payload, so they are
+    deterministic and consistent between end-points of the same query (e.g. TotalGlobal is always the sum of
+    TotalDesaparecidos and TotalLocalizados). Every request waits `latency` seconds, and fails with a 503 response with
+    probability `error_rate`.
+
+    If `session_ttl` is set, every visit to the dashboard index hands out a new session cookie that is valid for that many
+    requests. Requests without a valid cookie are redirected to a disclaimer page (HTML), as the real server does.
+
+    Usage:
+        with FakeRNPDNOServer(latency = 0.05) as server:
+            templates = fake_request_templates(server.url)
+    """
+
+    def __init__(self, n_states: int = 32, n_municipalities: int = 10, n_neighborhoods: int = 20, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0, port: int = 0, session_ttl: int = None) -> None:
+        """Create a new fake server
+
+        Args:
+            n_states (int, optional): Number of states. Defaults to 32.
+            n_municipalities (int, optional): Number of municipalities per state. Defaults to 10.
+            n_neighborhoods (int, optional): Number of neighborhoods per municipality. Defaults to 20.
+            latency (float, optional): Seconds every request waits before being answered. Defaults to 0.0.
+            error_rate (float, optional): Probability of answering with a 503 error. Defaults to 0.0.
+            seed (int, optional): Seed of the error generator. Defaults to 0.
+            port (int, optional): Port. Defaults to 0 (any free port).
+            session_ttl (int, optional): Number of requests a session cookie is valid for. Defaults to None (cookies never expire).
+
+        Raises:
+            ValueError: If the error rate is not between 0 and 1.
+        """
+
+        if not 0 <= error_rate <= 1:
+            raise ValueError("The error rate must be between 0 and 1!")
+
+        self.n_states = n_states
+        self.n_municipalities = n_municipalities
+        self.n_neighborhoods = n_neighborhoods
+        self.latency = latency
+        self.error_rate = error_rate
+        self.session_ttl = session_ttl
+
+        self.__random = random.Random(seed)
+        self.__port = port
+        self.__server = None
+        self.__counts = {}
+        self.__sessions = {}
+        self.__lock = threading.Lock()
+
+    def __enter__(self) -> "FakeRNPDNOServer":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+    @property
+    def url(self) -> str:
+        """Host URL of the server (e.g. "http://127.0.0.1:8000/")
+        """
+
+        if self.__server is None:
+            raise RuntimeError("The server must be started first via the start method!")
+
+        return "http://127.0.0.1:{0}/".format(self.__server.server_port)
+
+    @property
+    def request_counts(self) -> dict:
+        """Number of requests received by path
+        """
+
+        with self.__lock:
+            return dict(self.__counts)
+
+    @property
+    def n_requests(self) -> int:
+
+        with self.__lock:
+            return sum(self.__counts.values())
+
+    def reset_counts(self) -> None:
+
+        with self.__lock:
+            self.__counts.clear()
+
+    def start(self) -> None:
+
+        fake_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            # Keep connections alive, as the real server does
+            protocol_version = "HTTP/1.1"
+
+            # Headers and body are written separately, don't let Nagle's algorithm delay the body
+            disable_nagle_algorithm = True
+
+            def do_GET(self) -> None:
+                fake_server._handle(self, {})
+
+            def do_POST(self) -> None:
+
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length).decode("utf-8")
+
+                # The Sociodemograficos end-points take JSON, the Scrapper sends form data
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    payload = json.loads(body or "{}")
+                else:
+                    payload = {key: values[0] for key, values in parse_qs(body, keep_blank_values = True).items()}
+
+                fake_server._handle(self, payload)
+
+            def log_message(self, format: str, *args) -> None:
+                logger.debug(format, *args)
+
+        self.__server = ThreadingHTTPServer(("127.0.0.1", self.__port), Handler)
+        self.__server.daemon_threads = True
+        threading.Thread(target = self.__server.serve_forever, daemon = True).start()
+
+        logger.info("Fake RNPDNO server listening at %s", self.url)
+
+    def stop(self) -> None:
+
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
+
+    def _handle(self, handler: BaseHTTPRequestHandler, payload: dict) -> None:
+
+        path = handler.path.split("?")[0].rstrip("/")
+
+        with self.__lock:
+            self.__counts[path] = self.__counts.get(path, 0) + 1
+            failed = self.error_rate > 0 and self.__random.random() < self.error_rate
+
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        if failed:
+            return self.__send(handler, 503, {"error": "Service Unavailable"}, {"Retry-After": "0"})
+
+        if path == "/Dashboard/Disclaimer":
+            return self.__send_html(handler, DISCLAIMER_HTML)
+
+        if self.session_ttl is not None and path not in DASHBOARD_PATHS and not self.__use_session(handler):
+            return self.__send_redirect(handler, "/Dashboard/Disclaimer")
+
+        routes = {
+            "/Dashboard/Index": self.__dashboard,
+            "/Dashboard/ContextoGeneral": self.__dashboard,
+            "/Catalogo/Estados": self.__states,
+            "/Catalogo/Municipios": self.__municipalities,
+            "/Catalogo/Colonias": self.__neighborhoods,
+            "/Sociodemograficos/Totales": self.__totals,
+            "/Sociodemograficos/BarChartSexoColonia": self.__sex_by_neighborhood,
+            "/Sociodemograficos/AreaChartSexoAnio": self.__sex_by_year,
+        }
+
+        route = routes.get(path)
+
+        if route is None:
+            return self.__send(handler, 404, {"error": "Not Found"})
+
+        self.__send(handler, 200, route(payload), {"Set-Cookie": "{0}={1}; path=/".format(SESSION_COOKIE, self.__new_session())} if path == "/Dashboard/Index" else {})
+
+    def __new_session(self) -> str:
+
+        if self.session_ttl is None:
+            return "fake"
+
+        with self.__lock:
+            session_id = "fake{0}".format(len(self.__sessions))
+            self.__sessions[session_id] = 0
+
+        return session_id
+
+    def __use_session(self, handler: BaseHTTPRequestHandler) -> bool:
+
+        cookie = SimpleCookie(handler.headers.get("Cookie", "")).get(SESSION_COOKIE)
+
+        with self.__lock:
+            n_requests = self.__sessions.get(cookie.value) if cookie is not None else None
+
+            if n_requests is None or n_requests >= self.session_ttl:
+                return False
+
+            self.__sessions[cookie.value] = n_requests + 1
+
+        return True
+
+    @staticmethod
+    def __send_redirect(handler: BaseHTTPRequestHandler, location: str) -> None:
+
+        handler.send_response(302)
+        handler.send_header("Location", location)
+        handler.send_header("Content-Length", "0")
+        handler.end_headers()
+
+    @staticmethod
+    def __send_html(handler: BaseHTTPRequestHandler, html: str) -> None:
+
+        body = html.encode("utf-8")
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/html; charset=utf-8")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    @staticmethod
+    def __send(handler: BaseHTTPRequestHandler, status: int, content, headers: dict = None) -> None:
+
+        body = json.dumps(content, ensure_ascii = False).encode("utf-8")
+
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json; charset=utf-8")
+        handler.send_header("Content-Length", str(len(body)))
+
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    @staticmethod
+    def __count(payload: dict, salt: str, maximum: int) -> int:
+
+        # Deterministic pseudo-random count of a query
+        raw_key = json.dumps(payload, sort_keys = True) + salt
+
+        return zlib.crc32(raw_key.encode("utf-8")) % (maximum + 1)
+
+    @staticmethod
+    def __format_int(value: int) -> str:
+        return "{0:,}".format(value)
+
+    @staticmethod
+    def __format_percentage(part: int, whole: int) -> str:
+        return "{0:.2f} %".format(100 * part / whole if whole > 0 else 0)
+
+    def __dashboard(self, payload: dict) -> dict:
+        return {}
+
+    def __states(self, payload: dict) -> list:
+
+        return [{"Value": 0, "Text": "--TODOS--"}, *({"Value": i, "Text": "ESTADO {0}".format(i)} for i in range(1, self.n_states + 1))]
+
+    def __municipalities(self, payload: dict) -> list:
+
+        state_id = int(payload.get("idEstado") or 0)
+
+        if not 1 <= state_id <= self.n_states:
+            return [{"Value": 0, "Text": "--TODOS--"}]
+
+        return [{"Value": 0, "Text": "--TODOS--"}, *({"Value": i, "Text": "MUNICIPIO {0}-{1}".format(state_id, i)} for i in range(1, self.n_municipalities + 1))]
+
+    def __neighborhood_ids(self, state_id: int, mun_id: int) -> list:
+
+        return [(state_id * 1000 + mun_id) * 1000 + i for i in range(1, self.n_neighborhoods + 1)]
+
+    def __neighborhoods(self, payload: dict) -> list:
+
+        state_id = int(payload.get("idEstado") or 0)
+        mun_id = int(payload.get("idMunicipio") or 0)
+
+        if not (1 <= state_id <= self.n_states and 1 <= mun_id <= self.n_municipalities):
+            return [{"Value": 0, "Text": "--TODAS--"}]
+
+        return [{"Value": 0, "Text": "--TODAS--"}, *({"Value": i, "Text": "COLONIA {0}".format(i)} for i in self.__neighborhood_ids(state_id, mun_id))]
+
+    def __totals(self, payload: dict) -> dict:
+
+        only_missing = self.__count(payload, "desaparecidos", 5000)
+        only_untraceable = self.__count(payload, "nolocalizados", 1000)
+        found_alive = self.__count(payload, "localizados_con_vida", 5000)
+        found_dead = self.__count(payload, "localizados_sin_vida", 500)
+
+        missing = only_missing + only_untraceable
+        found = found_alive + found_dead
+        total = missing + found
+
+        return {
+            "TotalGlobal": self.__format_int(total),
+            "TotalDesaparecidos": self.__format_int(missing),
+            "TotalLocalizados": self.__format_int(found),
+            "PorcentajeDesaparecidos": self.__format_percentage(missing, total),
+            "PorcentajeLocalizados": self.__format_percentage(found, total),
+            "TotalSoloDesaparecidos": self.__format_int(only_missing),
+            "TotalSoloNoLocalizados": self.__format_int(only_untraceable),
+            "PorcentajeSoloDesaparecidos": self.__format_percentage(only_missing, missing),
+            "PorcentajeSoloNoLocalizados": self.__format_percentage(only_untraceable, missing),
+            "TotalLocalizadosCV": self.__format_int(found_alive),
+            "TotalLocalizadosSV": self.__format_int(found_dead),
+            "PorcentajeLocalizadosCV": self.__format_percentage(found_alive, found),
+            "PorcentajeLocalizadosSV": self.__format_percentage(found_dead, found)
+        }
+
+    def __chart(self, payload: dict, categories: list, max_categories: int = None, uncategorized: str = None) -> dict:
+
+        counts = {sex: [self.__count(payload, sex + category, 50) for category in categories] for sex in SEXES}
+
+        # The table holds the totals over all the categories, including the ones left out of the chart, and over the records without a category
+        totals = {sex: sum(data) for sex, data in counts.items()}
+
+        if uncategorized is not None:
+            totals = {sex: total + self.__count(payload, sex + uncategorized, 50) for sex, total in totals.items()}
+
+        total = sum(totals.values())
+
+        table = [{"text": sex, "value": self.__format_int(totals[sex]), "porcent": self.__format_percentage(totals[sex], total)} for sex in SEXES]
+        table.append({"text": "<strong>Total</strong>", "value": self.__format_int(total), "porcent": self.__format_percentage(total, total)})
+
+        # Keep the categories with the most records
+        if max_categories is not None and len(categories) > max_categories:
+            kept = sorted(range(len(categories)), key = lambda i: -sum(counts[sex][i] for sex in SEXES))[:max_categories]
+            categories = [categories[i] for i in kept]
+            counts = {sex: [data[i] for i in kept] for sex, data in counts.items()}
+
+        series = [{"name": sex, "data": counts[sex]} for sex in SEXES]
+
+        return {
+            "Title": payload.get("titulo", ""),
+            "Subtitle": payload.get("subtitulo", ""),
+            "XAxisCategories": categories,
+            "Series": series,
+            "TableValues": table,
+            "TableTotal": None
+        }
+
+    def __sex_by_neighborhood(self, payload: dict) -> dict:
+
+        state_id = int(payload.get("idEstado") or 0)
+        mun_id = int(payload.get("idMunicipio") or 0)
+
+        # Persons whose neighborhood is unknown are only counted in the table
+        return self.__chart(payload, ["COLONIA {0}".format(i) for i in self.__neighborhood_ids(state_id, mun_id)], max_categories = MAX_NEIGHBORHOOD_CATEGORIES, uncategorized = "SIN COLONIA")
+
+    def __sex_by_year(self, payload: dict) -> dict:
+
+        return self.__chart(payload, YEAR_CATEGORIES)
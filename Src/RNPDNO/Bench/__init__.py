@@ -0,0 +1,3 @@
+from .FakeAPI import FakeRNPDNOServer, fake_request_templates
+from .Config import mock_config_db, FAKE_ENV_VARS, FAKE_CONFIG_VARS
+from .Core import run_benchmarks, bench_startup, bench_catalogue_crawl, bench_totals_crawl, measure, append_results
@@ -0,0 +1,226 @@
+from typing import Union
+from collections import OrderedDict
+
+import threading
+import sqlite3
+import json
+import time
+
+# Default maximum number of cached responses of every backend
+DEFAULT_MAX_ENTRIES = 100000
+
+class MemoryCacheBackend:
+    """In-memory LRU storage for cached responses
+
+    Entries are kept in insertion/access order and the least recently used entries are evicted
+    once the backend holds more than `max_entries` entries.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+
+        if max_entries < 1:
+            raise ValueError("The cache must hold at least one entry!")
+
+        self.__max_entries = max_entries
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    @property
+    def max_entries(self) -> int:
+        return self.__max_entries
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def get(self, key: str) -> Union[dict, None]:
+
+        with self.__lock:
+            entry = self.__entries.get(key)
+
+            if entry is not None:
+                self.__entries.move_to_end(key)
+
+            return entry
+
+    def set(self, key: str, entry: dict) -> None:
+
+        with self.__lock:
+            self.__entries[key] = entry
+            self.__entries.move_to_end(key)
+
+            # Evict least recently used entries
+            while len(self.__entries) > self.__max_entries:
+                self.__entries.popitem(last = False)
+
+    def touch(self, key: str, stored_at: float) -> None:
+
+        with self.__lock:
+            if key in self.__entries:
+                self.__entries[key]["stored_at"] = stored_at
+                self.__entries.move_to_end(key)
+
+    def clear(self) -> None:
+
+        with self.__lock:
+            self.__entries.clear()
+
+class SQLiteCacheBackend:
+    """SQLite LRU storage for cached responses
+
+    The SQLite backend persists cached responses between runs. Entries are evicted by last access time
+    once the database holds more than `max_entries` entries (plus an eviction margin, so eviction runs once
+    every `eviction_margin` inserts instead of on every insert).
+
+    Cache hits don't write to the database: access times are kept in memory and written in a single transaction
+    once `access_flush_size` hits are pending or `access_flush_interval` seconds have passed (and before evicting).
+    """
+
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES, eviction_margin: int = None, access_flush_size: int = 1000, access_flush_interval: float = 30.0) -> None:
+        """Open (or create) a SQLite cache
+
+        Args:
+            path (str): Path of the SQLite file.
+            max_entries (int, optional): Maximum number of cached responses. Defaults to DEFAULT_MAX_ENTRIES.
+            eviction_margin (int, optional): Number of entries over `max_entries` tolerated before evicting. Defaults to None (10% of `max_entries`).
+            access_flush_size (int, optional): Number of pending access times that triggers a write. Defaults to 1000.
+            access_flush_interval (float, optional): Maximum age in seconds of pending access times. Defaults to 30.0.
+
+        Raises:
+            ValueError: If `max_entries` is lower than 1.
+        """
+
+        if max_entries < 1:
+            raise ValueError("The cache must hold at least one entry!")
+
+        self.__path = path
+        self.__max_entries = max_entries
+        self.__eviction_margin = max(0, eviction_margin) if eviction_margin is not None else max(1, max_entries // 10)
+        self.__access_flush_size = access_flush_size
+        self.__access_flush_interval = access_flush_interval
+        self.__lock = threading.Lock()
+
+        # Access times of cache hits not written yet, and time of the last write
+        self.__pending_accesses = {}
+        self.__last_access_flush = time.monotonic()
+
+        # The connection is shared by all threads, access is serialized with the lock
+        self.__conn = sqlite3.connect(path, check_same_thread = False)
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, "
+            "url TEXT, "
+            "status_code INTEGER, "
+            "headers TEXT, "
+            "body BLOB, "
+            "stored_at REAL, "
+            "last_access REAL)"
+        )
+        self.__conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self.__conn.commit()
+
+        # Upper bound of the number of rows (replaced keys are counted as new rows until the next eviction)
+        self.__n_rows = self.__conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    @property
+    def max_entries(self) -> int:
+        return self.__max_entries
+
+    @property
+    def eviction_margin(self) -> int:
+        return self.__eviction_margin
+
+    def __len__(self) -> int:
+
+        with self.__lock:
+            return self.__conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def __flush_accesses(self) -> None:
+        # Must be called while holding the lock, doesn't commit
+
+        if self.__pending_accesses:
+            self.__conn.executemany(
+                "UPDATE responses SET last_access = ? WHERE key = ?",
+                [(last_access, key) for key, last_access in self.__pending_accesses.items()]
+            )
+            self.__pending_accesses.clear()
+
+        self.__last_access_flush = time.monotonic()
+
+    def __evict(self) -> None:
+        # Must be called while holding the lock, doesn't commit
+
+        # Evict least recently used entries, with up to date access times
+        self.__flush_accesses()
+        self.__conn.execute(
+            "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.__max_entries, )
+        )
+        self.__n_rows = self.__conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def flush(self) -> None:
+        """Write the pending access times
+        """
+
+        with self.__lock:
+            self.__flush_accesses()
+            self.__conn.commit()
+
+    def get(self, key: str) -> Union[dict, None]:
+
+        with self.__lock:
+            row = self.__conn.execute("SELECT url, status_code, headers, body, stored_at FROM responses WHERE key = ?", (key, )).fetchone()
+
+            if row is None:
+                return None
+
+            self.__pending_accesses[key] = time.time()
+
+            if len(self.__pending_accesses) >= self.__access_flush_size or time.monotonic() - self.__last_access_flush >= self.__access_flush_interval:
+                self.__flush_accesses()
+                self.__conn.commit()
+
+        url, status_code, headers, body, stored_at = row
+
+        return {"url": url, "status_code": status_code, "headers": json.loads(headers), "body": body, "stored_at": stored_at}
+
+    def set(self, key: str, entry: dict) -> None:
+
+        with self.__lock:
+            self.__conn.execute(
+                "INSERT OR REPLACE INTO responses (key, url, status_code, headers, body, stored_at, last_access) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, entry["url"], entry["status_code"], json.dumps(entry["headers"]), entry["body"], entry["stored_at"], time.time())
+            )
+            self.__pending_accesses.pop(key, None)
+            self.__n_rows += 1
+
+            if self.__n_rows > self.__max_entries + self.__eviction_margin:
+                self.__evict()
+
+            self.__conn.commit()
+
+    def touch(self, key: str, stored_at: float) -> None:
+
+        with self.__lock:
+            self.__pending_accesses.pop(key, None)
+            self.__conn.execute("UPDATE responses SET stored_at = ?, last_access = ? WHERE key = ?", (stored_at, time.time(), key))
+            self.__conn.commit()
+
+    def clear(self) -> None:
+
+        with self.__lock:
+            self.__pending_accesses.clear()
+            self.__conn.execute("DELETE FROM responses")
+            self.__conn.commit()
+            self.__n_rows = 0
+
+    def close(self) -> None:
+
+        with self.__lock:
+            self.__flush_accesses()
+            self.__conn.commit()
+            self.__conn.close()
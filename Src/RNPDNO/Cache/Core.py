@@ -0,0 +1,184 @@
+from typing import Union
+
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from RNPDNO.Cache.Backends import MemoryCacheBackend
+
+import requests
+
+import threading
+import hashlib
+import logging
+import json
+import time
+
+# Init logger
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """Cache of responses to template requests
+
+    Responses are keyed by the template's API and end-point names plus the normalised request payload.
+    Only end-points with a TTL are cached. Once an entry is older than its TTL it is stale: if the server
+    sent an `ETag` or `Last-Modified` header with it, the request is revalidated with a conditional request,
+    otherwise it is sent again.
+
+    TTLs are expressed in seconds and keyed by "<api>/<end_point>" (e.g. "catalogue/municipalities").
+    """
+
+    # Catalogues hardly ever change
+    DEFAULT_TTLS = {
+        "catalogue/states": 7 * 24 * 3600,
+        "catalogue/municipalities": 7 * 24 * 3600,
+        "catalogue/neighborhoods": 7 * 24 * 3600,
+    }
+
+    def __init__(self, backend = None, ttls: dict = None) -> None:
+        """Create a new response cache
+
+        Args:
+            backend (optional): Storage backend (MemoryCacheBackend or SQLiteCacheBackend). Defaults to None (an in-memory backend).
+            ttls (dict, optional): TTLs in seconds keyed by "<api>/<end_point>", updating the default TTLs. Defaults to None.
+        """
+
+        self.__backend = backend if backend is not None else MemoryCacheBackend()
+        self.__ttls = {**self.DEFAULT_TTLS, **(ttls or {})}
+
+        self.__stats = {"hits": 0, "misses": 0, "revalidations": 0}
+        self.__stats_lock = threading.Lock()
+
+    @property
+    def backend(self):
+        return self.__backend
+
+    @property
+    def ttls(self) -> dict:
+        return self.__ttls
+
+    @property
+    def stats(self) -> dict:
+        """Cache statistics
+
+        Returns:
+            dict: Number of hits, misses and successful revalidations (304 responses).
+        """
+
+        with self.__stats_lock:
+            return dict(self.__stats)
+
+    def __count(self, stat: str) -> None:
+
+        with self.__stats_lock:
+            self.__stats[stat] += 1
+
+    def get_ttl(self, api_name: str, end_point: str) -> Union[float, None]:
+        """Get the TTL of an end-point
+
+        Returns:
+            float: TTL in seconds.
+            None: If responses of the end-point must not be cached.
+        """
+
+        ttl = self.ttls.get("{0}/{1}".format(api_name, end_point))
+
+        if ttl is None or ttl <= 0:
+            return None
+
+        return ttl
+
+    @staticmethod
+    def make_key(api_name: str, end_point: str, payload: Union[dict, None]) -> str:
+        """Build the cache key of a request
+
+        Payload values are coerced as strings, since they are sent as form data (1 and "1" are the same request).
+        """
+
+        normalised_payload = {str(key): str(value) for key, value in (payload or {}).items()}
+        raw_key = json.dumps([api_name, end_point, normalised_payload], sort_keys = True, separators = (",", ":"))
+
+        return hashlib.sha1(raw_key.encode("utf-8")).hexdigest()
+
+    def lookup(self, key: str, ttl: float) -> tuple:
+        """Look for a cached response
+
+        Args:
+            key (str): Cache key of the request.
+            ttl (float): TTL of the end-point in seconds.
+
+        Returns:
+            tuple: The cached entry (or None) and a dict of conditional request headers. If the headers are not empty,
+                the entry is stale and must be revalidated before being used.
+        """
+
+        entry = self.backend.get(key)
+
+        if entry is None:
+            self.__count("misses")
+            return None, {}
+
+        if time.time() - entry["stored_at"] <= ttl:
+            self.__count("hits")
+            return entry, {}
+
+        # Stale entry, build revalidation headers
+        self.__count("misses")
+        conditional_headers = {}
+
+        if "ETag" in entry["headers"]:
+            conditional_headers["If-None-Match"] = entry["headers"]["ETag"]
+
+        if "Last-Modified" in entry["headers"]:
+            conditional_headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+
+        # The entry can't be revalidated, the request must be sent again
+        if len(conditional_headers) == 0:
+            return None, {}
+
+        return entry, conditional_headers
+
+    def is_fresh(self, key: str, ttl: float) -> bool:
+        """Check if a request has a fresh cached response, without counting a hit or a miss (e.g. to plan a crawl)
+        """
+
+        entry = self.backend.get(key)
+
+        return entry is not None and time.time() - entry["stored_at"] <= ttl
+
+    def store(self, key: str, response: requests.Response) -> None:
+
+        headers = {name: response.headers[name] for name in ("Content-Type", "ETag", "Last-Modified") if name in response.headers}
+
+        self.backend.set(key, {
+            "url": response.url,
+            "status_code": response.status_code,
+            "headers": headers,
+            "body": response.content,
+            "stored_at": time.time()
+        })
+
+    def revalidated(self, key: str) -> None:
+        """Mark a stale entry as fresh after the server answered a conditional request with 304 Not Modified
+        """
+
+        self.__count("revalidations")
+        self.backend.touch(key, time.time())
+
+    @staticmethod
+    def build_response(entry: dict) -> requests.Response:
+        """Rebuild a requests Response from a cached entry
+        """
+
+        response = requests.Response()
+        response.url = entry["url"]
+        response.status_code = entry["status_code"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response._content = entry["body"]
+        response.encoding = get_encoding_from_headers(response.headers)
+
+        return response
+
+    def clear(self) -> None:
+
+        logger.info("Clearing response cache...")
+        self.backend.clear()
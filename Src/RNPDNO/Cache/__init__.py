@@ -0,0 +1,2 @@
+from .Core import ResponseCache
+from .Backends import MemoryCacheBackend, SQLiteCacheBackend, DEFAULT_MAX_ENTRIES
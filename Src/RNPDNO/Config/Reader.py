@@ -1,8 +1,9 @@
 import pymongo as pm
-from pymongo.errors import ConnectionFailure
+from pymongo.errors import ConnectionFailure, OperationFailure
 
 from typing import Union
 
+import threading
 import logging
 import re
 import os
@@ -12,6 +13,11 @@ logger = logging.getLogger(__name__)
 
 class ConfigReader(dict):
 
+    # Mongo clients shared by all the instances in the process, keyed by URI.
+    # pymongo clients are thread-safe and keep their own connection pool.
+    __clients = {}
+    __clients_lock = threading.Lock()
+
     def __init__(self):
 
         # Call parent class' init method
@@ -29,6 +35,17 @@ class ConfigReader(dict):
     def app_vars(self) -> dict:
         return self.__app_vars
 
+    @classmethod
+    def clear_clients(cls) -> None:
+        """Close and forget the Mongo clients shared by the process (e.g. after a fork, or between test sessions)
+        """
+
+        with cls.__clients_lock:
+            for client in cls.__clients.values():
+                client.close()
+
+            cls.__clients.clear()
+
     def test_config_db_conn(self) -> bool:
 
         if self.config_db_conn is None:
@@ -45,6 +62,14 @@ class ConfigReader(dict):
             return True
 
     def open_new_config_db_conn(self) -> None:
+        """Connect to the config DB
+
+        The Mongo client is created the first time a ConfigReader connects to a given URI, and reused by
+        every ConfigReader of the process afterwards, so the connection handshake is only paid once.
+
+        Raises:
+            ConnectionError: If a new client can't connect to the Mongo server.
+        """
 
         # Define the mongo uri
         mongo_uri = "mongodb://{username}:{password}@{host}:{port}/{db}".format(
@@ -55,10 +80,25 @@ class ConfigReader(dict):
             db = self.app_vars["SCRAPPER_MONGO_CONFIGDB_NAME"]
         )
 
-        # Open a new connection to the database
-        logger.info("Opening new connection to the config DB...")
-        logger.debug("Mongo URI used to connect to the new config DB: %s", mongo_uri)
-        self.__config_db_conn = pm.MongoClient(mongo_uri)
+        with self.__clients_lock:
+            if mongo_uri in self.__clients:
+                logger.debug("Reusing connection to the config DB...")
+                self.__config_db_conn = self.__clients[mongo_uri]
+                return
+
+            # Open a new connection to the database
+            logger.info("Opening new connection to the config DB...")
+            logger.debug("Mongo URI used to connect to the new config DB: %s", mongo_uri)
+            self.__config_db_conn = pm.MongoClient(mongo_uri)
+
+            if not self.test_config_db_conn():
+                self.__config_db_conn.close()
+                self.__config_db_conn = None
+                raise ConnectionError("Can't load the app config, since there's not a valid connection to a Mongo host!")
+
+            self.__clients[mongo_uri] = self.__config_db_conn
+
+        logger.info("Successful connection to the config DB!")
 
     def load_env_vars(self) -> None:
         """Set environment configuration variables
@@ -108,17 +148,13 @@ class ConfigReader(dict):
         if not self.__app_vars_loaded:
             raise ValueError("Environment variables must be loaded before loading the app configuration!")
 
-        # Open new connection
-        self.open_new_config_db_conn()
-        
-        if not self.test_config_db_conn():
-            raise ConnectionError("Can't load the app config, since there's not a valid connection to a Mongo host!")
+        # Open new connection (or reuse the process' connection)
+        if self.config_db_conn is None:
+            self.open_new_config_db_conn()
 
         # Get app_config db
         app_config_db = self.config_db_conn[self.app_vars["SCRAPPER_MONGO_CONFIGDB_NAME"]]
 
-        logger.info("Successful connection to the config DB!")
-
         # Get app_config_vars collection
         app_config_vars_collection = app_config_db[collection]
 
@@ -126,7 +162,7 @@ class ConfigReader(dict):
             logger.debug("Registering configuration variables to self, since collection is config_vars...")
 
             # Loop through each doc and register to self
-            for document in app_config_vars_collection.find():
+            for document in app_config_vars_collection.find({}, {"_id": 0, "name": 1, "value": 1}):
                 # Get config variable name
                 var_name = document["name"]
                 # Get config variable value
@@ -140,9 +176,76 @@ class ConfigReader(dict):
             return_list = []
 
             # Loop through each doc and register to return_dict
-            for document in app_config_vars_collection.find():
+            for document in app_config_vars_collection.find({}, {"_id": 0}):
                 return_list.append(document)
 
             logger.info("%s configuration variables were loaded!", len(return_list))
 
             return return_list
+
+    def load_app_config(self, vars_collection: str = "config_vars", templates_collection: str = "request_templates") -> list:
+        """Load the configuration variables and the request templates in a single round-trip
+
+        Both collections are read with one aggregation (using `$unionWith`, MongoDB 4.4+). Servers (or stand-ins, like
+        mongomock) without `$unionWith` fall back to one query per collection. Configuration variables are registered to
+        self, as in `ConfigReader.load_config(collection = "config_vars")`.
+
+        Args:
+            vars_collection (str, optional): Name of the configuration variables collection. Defaults to "config_vars".
+            templates_collection (str, optional): Name of the request templates collection. Defaults to "request_templates".
+
+        Raises:
+            ValueError: If environment variables are not loaded before calling this method.
+            ConnectionError: If a new client can't connect to the Mongo server.
+
+        Returns:
+            list: The request templates.
+        """
+
+        logger.info("Loading app configuration from DB (collections: %s, %s)...", vars_collection, templates_collection)
+
+        # Check if env vars have been loaded
+        if not self.__app_vars_loaded:
+            raise ValueError("Environment variables must be loaded before loading the app configuration!")
+
+        # Open new connection (or reuse the process' connection)
+        if self.config_db_conn is None:
+            self.open_new_config_db_conn()
+
+        # Get app_config db
+        app_config_db = self.config_db_conn[self.app_vars["SCRAPPER_MONGO_CONFIGDB_NAME"]]
+
+        # Tag each document with its collection
+        pipeline = [
+            {"$project": {"_id": 0, "name": 1, "value": 1}},
+            {"$addFields": {"__collection": vars_collection}},
+            {"$unionWith": {
+                "coll": templates_collection,
+                "pipeline": [
+                    {"$project": {"_id": 0}},
+                    {"$addFields": {"__collection": templates_collection}}
+                ]
+            }}
+        ]
+
+        try:
+            documents = list(app_config_db[vars_collection].aggregate(pipeline))
+        except (OperationFailure, NotImplementedError):
+            logger.info("The config DB doesn't support $unionWith, loading each collection separately...")
+            documents = [{**document, "__collection": vars_collection} for document in app_config_db[vars_collection].find({}, {"_id": 0, "name": 1, "value": 1})]
+            documents += [{**document, "__collection": templates_collection} for document in app_config_db[templates_collection].find({}, {"_id": 0})]
+
+        return_list = []
+
+        for document in documents:
+            collection = document.pop("__collection")
+
+            if collection == vars_collection:
+                # Register to self
+                self.update({document["name"]: document["value"]})
+            else:
+                return_list.append(document)
+
+        logger.info("%s configuration variables and %s request templates were loaded!", len(self), len(return_list))
+
+        return return_list
@@ -0,0 +1,701 @@
+from typing import Callable, Iterable, Iterator, Union
+
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+from requests.adapters import HTTPAdapter
+
+from RNPDNO.Scrapper import Scrapper, RateLimiter, TotalsParser, TotalsRollup, stack_yearly_series
+from RNPDNO.Sink import MongoSink
+from RNPDNO.Geography import GeographyIndex
+from RNPDNO.Ledger import IN_FLIGHT, FAILED, FILTERS_FIELD, unit_filters
+from RNPDNO.Scrapper.Windows import REGISTRY_START_DATE, parse_date, format_date, split_date_range, split_backfill_range
+
+from datetime import date, timedelta
+from itertools import islice
+
+import requests
+
+import logging
+import random
+
+# Init logger
+logger = logging.getLogger(__name__)
+
+class Crawler:
+    """Concurrent crawler of the state → municipality → neighborhood catalogue tree
+
+    The crawler walks the catalogue tree using a bounded pool of worker threads. Every worker uses the session
+    of the supplied `Scrapper`, so the session cookie obtained by `Scrapper.initialize_requests_sessions()` is
+    shared by all the requests sent by the crawler.
+    """
+
+    def __init__(self, scrapper: Scrapper, max_workers: int = 8, requests_per_second: float = None, burst: int = 1) -> None:
+        """Create a new crawler
+
+        Args:
+            scrapper (Scrapper): A Scrapper instance with its configuration loaded and its requests session initialized.
+            max_workers (int, optional): Maximum number of requests in flight. Defaults to 8.
+            requests_per_second (float, optional): Maximum number of requests sent per second. Defaults to None (no limit).
+            burst (int, optional): Number of requests that can be sent at once after an idle period. Defaults to 1.
+
+        Raises:
+            ValueError: If max_workers is not a positive number.
+        """
+
+        if max_workers < 1:
+            raise ValueError("The number of workers must be at least 1!")
+
+        self.__scrapper = scrapper
+        self.__max_workers = max_workers
+        self.__rate_limiter = RateLimiter(requests_per_second, burst) if requests_per_second is not None else None
+
+        # Fail early if the scrapper is not ready to send requests
+        self.scrapper.check_config_loaded()
+        self.scrapper.check_session_created()
+
+        # The default connection pool of a requests session keeps up to 10 connections per host,
+        # size it for the number of workers so connections are reused instead of discarded
+        adapter = HTTPAdapter(pool_connections = max_workers, pool_maxsize = max_workers)
+        self.scrapper.session.mount("https://", adapter)
+        self.scrapper.session.mount("http://", adapter)
+
+    @property
+    def scrapper(self) -> Scrapper:
+        """Scrapper used to send the requests
+        """
+        return self.__scrapper
+
+    @property
+    def max_workers(self) -> int:
+        """Maximum number of requests in flight
+        """
+        return self.__max_workers
+
+    @property
+    def rate_limiter(self) -> Union[RateLimiter, None]:
+        """Rate limiter shared by the workers (None if there's no limit)
+        """
+        return self.__rate_limiter
+
+    def __call(self, getter: Callable, *args, **kwargs):
+
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+
+        return getter(*args, **kwargs)
+
+    @staticmethod
+    def __fetch_catalogue(iter_getter: Callable, *args) -> list:
+
+        # Decode in the worker thread, without the "All" option
+        return list(iter_getter(*args, drop_all = True))
+
+    def __get_states(self, state_ids: Iterable[str] = None) -> list:
+
+        # The "All" option (id 0) is not a real geography
+        states = self.__call(self.scrapper.iter_states_catalogue, drop_all = True)
+
+        if state_ids is None:
+            return list(states)
+
+        state_ids = {int(state_id) for state_id in state_ids}
+
+        return [state for state in states if state.id in state_ids]
+
+    def iter_catalogue(self, state_ids: Iterable[str] = None, include_neighborhoods: bool = True) -> Iterator[dict]:
+        """Walk the catalogue tree and yield flattened records as they arrive
+
+        Records are yielded in completion order, not in catalogue order.
+        If `include_neighborhoods` is True, one record is yielded per neighborhood with the keys
+        `state_id`, `state_name`, `mun_id`, `mun_name`, `neighborhood_id` and `neighborhood_name`.
+        Otherwise, one record is yielded per municipality (without the neighborhood keys).
+
+        Args:
+            state_ids (Iterable[str], optional): Ids of the states to crawl. Defaults to None (all states).
+            include_neighborhoods (bool, optional): Should the crawler descend to the neighborhood level? Defaults to True.
+
+        Raises:
+            Scrapper.Exceptions.UnsuccessfulRequest: If any request of the crawl fails. Pending requests are cancelled.
+
+        Yields:
+            dict: A flattened catalogue record.
+        """
+
+        logger.info("Starting catalogue crawl (workers: %s, neighborhoods: %s)...", self.max_workers, include_neighborhoods)
+
+        # Get states
+        states = self.__get_states(state_ids)
+
+        n_records = 0
+
+        with ThreadPoolExecutor(max_workers = self.max_workers) as executor:
+            # Map each future to the catalogue level and the parent records
+            pending = {}
+
+            for state in states:
+                future = executor.submit(self.__call, self.__fetch_catalogue, self.scrapper.iter_municipalities_catalogue, str(state.id))
+                pending[future] = ("municipalities", state, None)
+
+            try:
+                while pending:
+                    done, _ = wait(pending.keys(), return_when = FIRST_COMPLETED)
+
+                    for future in done:
+                        level, state, municipality = pending.pop(future)
+                        catalogue = future.result()
+
+                        if level == "municipalities":
+                            for municipality in catalogue:
+                                if include_neighborhoods:
+                                    child = executor.submit(self.__call, self.__fetch_catalogue, self.scrapper.iter_neighborhood_catalogue, str(state.id), str(municipality.id))
+                                    pending[child] = ("neighborhoods", state, municipality)
+                                else:
+                                    n_records += 1
+                                    yield {
+                                        "state_id": state.id,
+                                        "state_name": state.name,
+                                        "mun_id": municipality.id,
+                                        "mun_name": municipality.name
+                                    }
+                        else:
+                            for neighborhood in catalogue:
+                                n_records += 1
+                                yield {
+                                    "state_id": state.id,
+                                    "state_name": state.name,
+                                    "mun_id": municipality.id,
+                                    "mun_name": municipality.name,
+                                    "neighborhood_id": neighborhood.id,
+                                    "neighborhood_name": neighborhood.name
+                                }
+            finally:
+                # Don't wait for queued requests if the crawl failed or the consumer stopped iterating
+                for future in pending:
+                    future.cancel()
+
+        logger.info("Catalogue crawl finished! (%s records)", n_records)
+
+    def get_catalogue(self, state_ids: Iterable[str] = None, include_neighborhoods: bool = True) -> list:
+        """Walk the catalogue tree and return the flattened catalogue
+
+        This method is a wrapper around `Crawler.iter_catalogue(...)` that materialises the records in a list.
+
+        Args:
+            state_ids (Iterable[str], optional): Ids of the states to crawl. Defaults to None (all states).
+            include_neighborhoods (bool, optional): Should the crawler descend to the neighborhood level? Defaults to True.
+
+        Returns:
+            list: A list of flattened catalogue records (dicts).
+        """
+
+        return list(self.iter_catalogue(state_ids = state_ids, include_neighborhoods = include_neighborhoods))
+
+    def build_geography_index(self, state_ids: Iterable[str] = None, include_neighborhoods: bool = True) -> GeographyIndex:
+        """Walk the catalogue tree and build a compact geography index (see `GeographyIndex`)
+
+        Args:
+            state_ids (Iterable[str], optional): Ids of the states to crawl. Defaults to None (all states).
+            include_neighborhoods (bool, optional): Should the crawler descend to the neighborhood level? Defaults to True.
+
+        Returns:
+            GeographyIndex: The index. Save it with `GeographyIndex.save(...)`.
+        """
+
+        return GeographyIndex.from_catalogue(self.iter_catalogue(state_ids = state_ids, include_neighborhoods = include_neighborhoods))
+
+    def iter_totals_units(self, level: str = "neighborhood", date_start: str = "", date_end: str = "", state_ids: Iterable[str] = None) -> Iterator[dict]:
+        """Build the units of work of a totals crawl from the catalogue tree
+
+        A unit of work is a dict with the keys `state_id`, `mun_id`, `neighborhood_id`, `date_start` and `date_end`,
+        which are the arguments of `Scrapper.get_totals(...)`. Units can be registered in a job ledger.
+
+        Args:
+            level (str, optional): Geographic level of the units ("state", "municipality" or "neighborhood"). Defaults to "neighborhood".
+            date_start (str, optional): Start date of the query. Defaults to "".
+            date_end (str, optional): End date of the query. Defaults to "".
+            state_ids (Iterable[str], optional): Ids of the states to crawl. Defaults to None (all states).
+
+        Raises:
+            ValueError: If the level is not valid.
+
+        Yields:
+            dict: A unit of work.
+        """
+
+        if level not in ("state", "municipality", "neighborhood"):
+            raise ValueError("The level must be one of state, municipality or neighborhood!")
+
+        if level == "state":
+            records = ({"state_id": state.id, "mun_id": 0, "neighborhood_id": 0} for state in self.__get_states(state_ids))
+        else:
+            records = self.iter_catalogue(state_ids = state_ids, include_neighborhoods = level == "neighborhood")
+
+        for record in records:
+            yield {
+                "state_id": str(record["state_id"]),
+                "mun_id": str(record["mun_id"]),
+                "neighborhood_id": str(record.get("neighborhood_id", 0)),
+                "date_start": date_start,
+                "date_end": date_end
+            }
+
+    def crawl_totals(self, ledger, sink: MongoSink = None, batch_size: int = None, retry_failed: bool = True, claim_timeout: float = None, **kwargs) -> dict:
+        """Fetch the totals of every unfinished unit of work of a job ledger
+
+        Units are claimed from the ledger in batches and fetched concurrently. Units whose request fails are marked as
+        failed and the crawl goes on. If a sink is supplied, it's flushed before the units of a batch are marked as done,
+        so a crash never leaves a unit marked as done without its record stored in the target DB.
+
+        The crawl can be resumed at any time by calling this method again with the same ledger. Units left in flight by an
+        interrupted run are fetched again once their claim is older than `claim_timeout`, so units claimed by other
+        processes sharing a MongoLedger are not fetched twice.
+
+        Args:
+            ledger (SQLiteLedger or MongoLedger): Job ledger with the units of work.
+            sink (MongoSink, optional): Sink where records are written. Defaults to None (records are discarded).
+            batch_size (int, optional): Number of units claimed at once. Defaults to None (16 units per worker).
+            retry_failed (bool, optional): Should units that failed in previous runs be fetched again? Defaults to True.
+            claim_timeout (float, optional): Seconds after which an in-flight unit is considered abandoned (0 to recover every in-flight unit). Defaults to None (the ledger's CLAIM_TIMEOUT: every unit for local ledgers, an hour for MongoLedger).
+            **kwargs: Additional filters passed to `Scrapper.get_totals(...)`. Units with their own filters (see `QueryPlanner`) override them.
+
+        Returns:
+            dict: Number of units done and failed in this run.
+        """
+
+        return self.__crawl_units(ledger, self.scrapper.get_totals, "Totals", sink = sink, batch_size = batch_size, retry_failed = retry_failed, claim_timeout = claim_timeout, **kwargs)
+
+    def crawl_yearly_series(self, ledger, sink: MongoSink = None, batch_size: int = None, retry_failed: bool = True, claim_timeout: float = None, **kwargs) -> dict:
+        """Fetch the series by sex and year of every unfinished unit of work of a job ledger
+
+        Works like `Crawler.crawl_totals(...)`, but each unit is fetched with `Scrapper.get_yearly_series(...)`, a single
+        request per geography, and written as one record with the whole series (see `YearlySeries.as_record()`).
+
+        Args:
+            ledger (SQLiteLedger or MongoLedger): Job ledger with the units of work (e.g. from `Crawler.iter_totals_units(...)`).
+            sink (MongoSink, optional): Sink where records are written. Defaults to None (records are discarded).
+            batch_size (int, optional): Number of units claimed at once. Defaults to None (16 units per worker).
+            retry_failed (bool, optional): Should units that failed in previous runs be fetched again? Defaults to True.
+            claim_timeout (float, optional): Seconds after which an in-flight unit is considered abandoned. Defaults to None (the ledger's CLAIM_TIMEOUT).
+            **kwargs: Additional filters passed to `Scrapper.get_yearly_series(...)`. Units with their own filters override them.
+
+        Returns:
+            dict: Number of units done and failed in this run.
+        """
+
+        return self.__crawl_units(ledger, self.__get_yearly_series_record, "Yearly series", sink = sink, batch_size = batch_size, retry_failed = retry_failed, claim_timeout = claim_timeout, **kwargs)
+
+    def __get_yearly_series_record(self, *args, **kwargs) -> dict:
+
+        return self.scrapper.get_yearly_series(*args, **kwargs).as_record()
+
+    def __crawl_units(self, ledger, getter: Callable, name: str, sink: MongoSink = None, batch_size: int = None, retry_failed: bool = True, claim_timeout: float = None, **kwargs) -> dict:
+
+        batch_size = batch_size if batch_size is not None else self.max_workers * 16
+        claim_timeout = claim_timeout if claim_timeout is not None else getattr(ledger, "CLAIM_TIMEOUT", None)
+
+        # Units left in flight by a previous (interrupted) run must be fetched again, units claimed by live processes must not
+        ledger.reset(statuses = (IN_FLIGHT, FAILED) if retry_failed else (IN_FLIGHT, ), claim_timeout = claim_timeout)
+
+        logger.info("Starting %s crawl (%s)...", name.lower(), ledger.counts())
+
+        n_done = 0
+        n_failed = 0
+
+        with ThreadPoolExecutor(max_workers = self.max_workers) as executor:
+            while True:
+                units = ledger.claim(limit = batch_size)
+
+                if len(units) == 0:
+                    break
+
+                futures = {
+                    executor.submit(
+                        self.__call, getter,
+                        unit["state_id"], unit["mun_id"], unit["neighborhood_id"], unit["date_start"] or "", unit["date_end"] or "", **{**kwargs, **unit_filters(unit)}
+                    ): unit
+                    for unit in units
+                }
+
+                done_units = []
+
+                for future in as_completed(futures):
+                    unit = futures[future]
+
+                    try:
+                        record = future.result()
+                    except (Scrapper.Exceptions.UnsuccessfulRequest, requests.RequestException, ValueError) as e:
+                        logger.warning("Unit of work failed (%s): %s", unit, e)
+                        ledger.mark_failed(unit, error = repr(e))
+                        n_failed += 1
+                        continue
+
+                    # Records of the same geography and window with different filters must not overwrite each other
+                    if FILTERS_FIELD in unit:
+                        record[FILTERS_FIELD] = unit_filters(unit)
+
+                    if sink is not None:
+                        sink.write(record)
+
+                    done_units.append(unit)
+
+                if sink is not None:
+                    sink.flush()
+
+                for unit in done_units:
+                    ledger.mark_done(unit)
+
+                n_done += len(done_units)
+
+        logger.info("%s crawl finished! (done: %s, failed: %s)", name, n_done, n_failed)
+
+        return {"done": n_done, "failed": n_failed}
+
+    def fetch_totals_table(self, units: Iterable[dict], output: str = "arrow", include_percentages: bool = True, backend: str = "auto", **kwargs) -> tuple:
+        """Fetch the totals of units of work concurrently and parse them into a single columnar table
+
+        Responses are decoded by a `TotalsParser` as they arrive and coerced once per column at the end, instead of
+        building one dict per response. Units whose request fails are skipped and returned, so they can be fetched again.
+
+        Args:
+            units (Iterable[dict]): Units of work (see `Crawler.iter_totals_units(...)` and `QueryPlanner`).
+            output (str, optional): "arrow" (a pyarrow.Table), "numpy" (a dict of arrays) or "records" (a list of dicts). Defaults to "arrow".
+            include_percentages (bool, optional): Should the Porcentaje* fields be parsed? Defaults to True.
+            backend (str, optional): JSON decoding backend of the parser ("msgspec", "orjson", "json" or "auto"). Defaults to "auto".
+            **kwargs: Additional filters passed to `Scrapper.request_totals(...)`. Units with their own filters override them.
+
+        Raises:
+            ValueError: If the output is not valid.
+
+        Returns:
+            tuple: The table and the list of failed units.
+        """
+
+        if output not in ("arrow", "numpy", "records"):
+            raise ValueError("The output must be one of arrow, numpy or records!")
+
+        with ThreadPoolExecutor(max_workers = self.max_workers) as executor:
+            parser, failed_units = self.__fetch_totals(executor, units, include_percentages, backend, **kwargs)
+
+        logger.info("Totals fetched! (done: %s, failed: %s)", len(parser), len(failed_units))
+
+        return self.__totals_output(parser, output), failed_units
+
+    def iter_totals_tables(self, units: Iterable[dict], batch_size: int = 10000, output: str = "records", include_percentages: bool = True, backend: str = "auto", **kwargs) -> Iterator[tuple]:
+        """Fetch the totals of units of work batch by batch, yielding the table of each batch
+
+        Works like `Crawler.fetch_totals_table(...)`, but units are consumed lazily, batch_size at a time, so only the
+        responses of one batch are kept in memory (e.g. to stream them to an `RNPDNO.Export.Exporter`).
+
+        Args:
+            units (Iterable[dict]): Units of work (see `Crawler.iter_totals_units(...)` and `QueryPlanner`).
+            batch_size (int, optional): Number of units fetched per batch. Defaults to 10000.
+            output (str, optional): "arrow" (a pyarrow.Table), "numpy" (a dict of arrays) or "records" (a list of dicts). Defaults to "records".
+            include_percentages (bool, optional): Should the Porcentaje* fields be parsed? Defaults to True.
+            backend (str, optional): JSON decoding backend of the parser ("msgspec", "orjson", "json" or "auto"). Defaults to "auto".
+            **kwargs: Additional filters passed to `Scrapper.request_totals(...)`. Units with their own filters override them.
+
+        Raises:
+            ValueError: If the output or the batch size is not valid.
+
+        Yields:
+            tuple: The table and the list of failed units of each batch.
+        """
+
+        if output not in ("arrow", "numpy", "records"):
+            raise ValueError("The output must be one of arrow, numpy or records!")
+
+        if batch_size < 1:
+            raise ValueError("The batch size must be at least 1!")
+
+        units = iter(units)
+        n_done = 0
+        n_failed = 0
+
+        with ThreadPoolExecutor(max_workers = self.max_workers) as executor:
+            while True:
+                batch = list(islice(units, batch_size))
+
+                if len(batch) == 0:
+                    break
+
+                parser, failed_units = self.__fetch_totals(executor, batch, include_percentages, backend, **kwargs)
+                n_done += len(parser)
+                n_failed += len(failed_units)
+
+                yield self.__totals_output(parser, output), failed_units
+
+        logger.info("Totals fetched! (done: %s, failed: %s)", n_done, n_failed)
+
+    def __fetch_totals(self, executor: ThreadPoolExecutor, units: Iterable[dict], include_percentages: bool, backend: str, **kwargs) -> tuple:
+
+        parser = TotalsParser(include_percentages = include_percentages, backend = backend)
+        failed_units = []
+        futures = {}
+
+        for unit in units:
+            future = executor.submit(
+                self.__call, self.scrapper.request_totals,
+                unit["state_id"], unit["mun_id"], unit["neighborhood_id"], unit["date_start"] or "", unit["date_end"] or "", **{**kwargs, **unit_filters(unit)}
+            )
+            futures[future] = unit
+
+        for future in as_completed(futures):
+            unit = futures[future]
+
+            try:
+                r = future.result()
+                # Rows of the same geography and window with different filters must be told apart
+                parser.add(r.content, unit["state_id"], unit["mun_id"], unit["neighborhood_id"], unit["date_start"] or "", unit["date_end"] or "", filters = unit_filters(unit))
+            except (Scrapper.Exceptions.UnsuccessfulRequest, requests.RequestException, ValueError) as e:
+                logger.warning("Unit of work failed (%s): %s", unit, e)
+                failed_units.append(unit)
+
+        return parser, failed_units
+
+    @staticmethod
+    def __totals_output(parser: TotalsParser, output: str):
+
+        if output == "arrow":
+            return parser.to_arrow()
+
+        if output == "numpy":
+            return parser.to_numpy()
+
+        return parser.to_records()
+
+    def fetch_totals_rollup(self, level: str = "municipality", date_start: str = "", date_end: str = "", state_ids: Iterable[str] = None, **kwargs) -> tuple:
+        """Fetch the totals of every geography of a level and compute the totals of the upper levels locally
+
+        One request is sent per leaf (see `Crawler.fetch_totals_table(...)`), none per state or for the whole country.
+        The leaves of the catalogue are used to flag parents with failed leaves as incomplete.
+
+        The server counts persons whose municipality (or neighborhood) is unknown in the totals of the parents only, so
+        parents of municipality or neighborhood leaves are lower bounds of the server's totals, flagged with `lower_bound`
+        (see `TotalsRollup.to_records(...)`). Only totals not flagged as lower bounds replace the parent requests; use
+        `Crawler.audit_totals_rollup(...)` to measure the gap.
+
+        Args:
+            level (str, optional): Geographic level of the leaves ("state", "municipality" or "neighborhood"). Defaults to "municipality".
+            date_start (str, optional): Start date of the queries. Defaults to "".
+            date_end (str, optional): End date of the queries. Defaults to "".
+            state_ids (Iterable[str], optional): Ids of the states to crawl. Defaults to None (all states).
+            **kwargs: Additional filters passed to `Scrapper.request_totals(...)`.
+
+        Returns:
+            tuple: The TotalsRollup and the list of failed units.
+        """
+
+        units = list(self.iter_totals_units(level = level, date_start = date_start, date_end = date_end, state_ids = state_ids))
+        table, failed_units = self.fetch_totals_table(units, output = "numpy", include_percentages = False, **kwargs)
+
+        return TotalsRollup(table, leaf_level = level, catalogue = units), failed_units
+
+    def audit_totals_rollup(self, rollup: TotalsRollup, levels: Iterable[str] = None, sample: int = None, tolerance: int = 0, seed: int = None, **kwargs) -> list:
+        """Fetch the server's totals of computed geographies and flag the ones that differ from the computed totals
+
+        Args:
+            rollup (TotalsRollup): Computed totals (e.g. from `Crawler.fetch_totals_rollup(...)`).
+            levels (Iterable[str], optional): Levels to audit. Defaults to None (every computed level).
+            sample (int, optional): Maximum number of geographies audited per level, picked at random. Defaults to None (all of them).
+            tolerance (int, optional): Largest absolute difference of a field that is not flagged. Defaults to 0.
+            seed (int, optional): Seed of the sample. Defaults to None.
+            **kwargs: Additional filters passed to `Scrapper.request_totals(...)`. Geographies with their own filters override them.
+
+        Returns:
+            list: The flagged geographies (see `TotalsRollup.audit(...)`).
+        """
+
+        rng = random.Random(seed)
+        units = []
+
+        for level in (levels if levels is not None else rollup.levels):
+            level_units = [
+                {
+                    "state_id": record["state_id"],
+                    "mun_id": record["mun_id"],
+                    "neighborhood_id": record["neighborhood_id"],
+                    "date_start": record["date_start"] or "",
+                    "date_end": record["date_end"] or "",
+                    **({FILTERS_FIELD: record[FILTERS_FIELD]} if FILTERS_FIELD in record else {})
+                }
+                for record in rollup.to_records(levels = (level, ))
+            ]
+
+            if sample is not None and len(level_units) > sample:
+                level_units = rng.sample(level_units, sample)
+
+            units.extend(level_units)
+
+        records, failed_units = self.fetch_totals_table(units, output = "records", include_percentages = False, **kwargs)
+
+        if len(failed_units) > 0:
+            logger.warning("%s geographies could not be audited!", len(failed_units))
+
+        mismatches = rollup.audit(records, tolerance = tolerance)
+        logger.info("Roll-up audited! (geographies: %s, mismatches: %s)", len(records), len(mismatches))
+
+        return mismatches
+
+    def fetch_yearly_series(self, geographies: Iterable[dict], output: str = "series", date_start: str = "", date_end: str = "", **kwargs) -> tuple:
+        """Fetch the series by sex and year of many geographies concurrently, one request per geography
+
+        Args:
+            geographies (Iterable[dict]): Dicts with the keys `state_id`, `mun_id` and `neighborhood_id` (e.g. the units of `Crawler.iter_totals_units(...)`).
+            output (str, optional): "series" (a list of YearlySeries, in the order of the geographies) or "numpy" (see `stack_yearly_series(...)`). Defaults to "series".
+            date_start (str, optional): Start date of the queries. Defaults to "".
+            date_end (str, optional): End date of the queries. Defaults to "".
+            **kwargs: Additional filters passed to `Scrapper.get_yearly_series(...)`. Geographies with their own filters override them.
+
+        Raises:
+            ValueError: If the output is not valid.
+
+        Returns:
+            tuple: The series and the list of failed geographies.
+        """
+
+        if output not in ("series", "numpy"):
+            raise ValueError("The output must be one of series or numpy!")
+
+        results = {}
+        failed_geographies = []
+
+        with ThreadPoolExecutor(max_workers = self.max_workers) as executor:
+            futures = {}
+
+            for i, geography in enumerate(geographies):
+                future = executor.submit(
+                    self.__call, self.scrapper.get_yearly_series,
+                    str(geography["state_id"]), str(geography.get("mun_id", 0)), str(geography.get("neighborhood_id", 0)),
+                    geography.get("date_start") or date_start, geography.get("date_end") or date_end, **{**kwargs, **unit_filters(geography)}
+                )
+                futures[future] = (i, geography)
+
+            for future in as_completed(futures):
+                i, geography = futures[future]
+
+                try:
+                    results[i] = future.result()
+                except (Scrapper.Exceptions.UnsuccessfulRequest, requests.RequestException, ValueError) as e:
+                    logger.warning("Geography failed (%s): %s", geography, e)
+                    failed_geographies.append(geography)
+
+        logger.info("Yearly series fetched! (done: %s, failed: %s)", len(results), len(failed_geographies))
+
+        series = [results[i] for i in sorted(results)]
+
+        if output == "numpy":
+            return stack_yearly_series(series), failed_geographies
+
+        return series, failed_geographies
+
+    def crawl_incremental(self, watermarks, geographies: Iterable[dict], until: str = None, frequency: str = "month", backfill_frequency: str = None, sink: MongoSink = None, chunk_size: int = None, filters: dict = None, **kwargs) -> dict:
+        """Fetch the totals of the date windows not yet scrapped for each geography
+
+        For every geography, the range between the day after its watermark and `until` is split into month or year
+        windows, which are fetched concurrently. A geography that has never been scrapped is backfilled from the registry
+        start date up to the end of the last complete period as a single window (or as `backfill_frequency` windows),
+        followed by a window of the last period (see `split_backfill_range(...)`). The watermark is then advanced to the
+        end of the last window of the unbroken run of successful windows, so failed windows are fetched again in the
+        next run.
+
+        Records have one date window each; use `combine_totals(...)` to add up the windows of a geography.
+
+        Args:
+            watermarks (SQLiteWatermarkStore or MongoWatermarkStore): Last scrapped date per geography. Use a different store for each set of filters.
+            geographies (Iterable[dict]): Dicts with the keys `state_id`, `mun_id` and `neighborhood_id` (e.g. the units of `Crawler.iter_totals_units(...)`).
+            until (str, optional): Last day to scrap (dd/mm/yyyy). Defaults to None (yesterday).
+            frequency (str, optional): Window size ("month" or "year"). Defaults to "month".
+            backfill_frequency (str, optional): Window size of the backfill of geographies never scrapped ("month" or "year"). Defaults to None (a single window).
+            sink (MongoSink, optional): Sink where records are written. Defaults to None (records are discarded).
+            chunk_size (int, optional): Number of geographies processed at once. Defaults to None (4 geographies per worker).
+            filters (dict, optional): Additional filters sent with every request and stored in the filters field of the records (e.g. {"idEstatusVictima": "7"}). Defaults to None.
+            **kwargs: Additional arguments passed to `Scrapper.get_totals(...)`.
+
+        Returns:
+            dict: Number of geographies updated, windows fetched and windows failed in this run.
+        """
+
+        until = parse_date(until) if until is not None else date.today() - timedelta(days = 1)
+        chunk_size = chunk_size if chunk_size is not None else self.max_workers * 4
+        filters = unit_filters({FILTERS_FIELD: filters})
+
+        logger.info("Starting incremental crawl until %s (frequency: %s)...", format_date(until), frequency)
+
+        n_geographies = 0
+        n_windows = 0
+        n_failed = 0
+
+        geographies = iter(geographies)
+
+        with ThreadPoolExecutor(max_workers = self.max_workers) as executor:
+            while True:
+                chunk = list(islice(geographies, chunk_size))
+
+                if len(chunk) == 0:
+                    break
+
+                # Map each future to its geography and window position
+                futures = {}
+                windows_by_geography = {}
+
+                for i, geography in enumerate(chunk):
+                    ids = (str(geography["state_id"]), str(geography.get("mun_id", 0)), str(geography.get("neighborhood_id", 0)))
+                    watermark = watermarks.get(*ids)
+
+                    if watermark is None:
+                        windows = split_backfill_range(REGISTRY_START_DATE, until, frequency = frequency, backfill_frequency = backfill_frequency)
+                    else:
+                        window_start = parse_date(watermark) + timedelta(days = 1)
+
+                        if window_start > until:
+                            continue
+
+                        windows = split_date_range(window_start, until, frequency = frequency)
+                    windows_by_geography[i] = (ids, windows)
+
+                    for j, (window_start, window_end) in enumerate(windows):
+                        future = executor.submit(self.__call, self.scrapper.get_totals, *ids, window_start, window_end, **{**kwargs, **filters})
+                        futures[future] = (i, j)
+
+                records = {}
+
+                for future in as_completed(futures):
+                    i, j = futures[future]
+
+                    try:
+                        records[(i, j)] = future.result()
+                    except (Scrapper.Exceptions.UnsuccessfulRequest, requests.RequestException, ValueError) as e:
+                        logger.warning("Window %s of geography %s failed: %s", windows_by_geography[i][1][j], windows_by_geography[i][0], e)
+                        n_failed += 1
+                        continue
+
+                    n_windows += 1
+
+                    # Records of the same geography and window with different filters must not overwrite each other
+                    if filters:
+                        records[(i, j)][FILTERS_FIELD] = filters
+
+                    if sink is not None:
+                        sink.write(records[(i, j)])
+
+                # Records must be stored before the watermarks are advanced
+                if sink is not None:
+                    sink.flush()
+
+                for i, (ids, windows) in windows_by_geography.items():
+                    # Last window of the unbroken run of successful windows
+                    last_window = None
+
+                    for j, window in enumerate(windows):
+                        if (i, j) not in records:
+                            break
+
+                        last_window = window
+
+                    if last_window is not None:
+                        watermarks.set(last_window[1], *ids)
+                        n_geographies += 1
+
+        logger.info("Incremental crawl finished! (geographies: %s, windows: %s, failed: %s)", n_geographies, n_windows, n_failed)
+
+        return {"geographies": n_geographies, "windows": n_windows, "failed": n_failed}
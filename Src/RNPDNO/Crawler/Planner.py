@@ -0,0 +1,269 @@
+from typing import Iterable, Iterator
+
+from RNPDNO.Scrapper import Scrapper
+from RNPDNO.Ledger import DONE, FILTERS_FIELD, unit_key, unit_filters
+from RNPDNO.Scrapper.Windows import parse_date
+
+from itertools import product
+
+import logging
+
+# Init logger
+logger = logging.getLogger(__name__)
+
+class QueryPlan:
+    """Units of work of a fan-out query, with the number of requests they need
+
+    Units are dicts with the keys of a unit of work (see `Crawler.iter_totals_units(...)`) and, if the query has filters,
+    a `filters` dict. Register them in a job ledger and run them with `Crawler.crawl_totals(...)`.
+    """
+
+    def __init__(self, units: list, n_combinations: int, n_duplicated: int, n_completed: int, n_cached: int) -> None:
+
+        self.__units = units
+        self.__n_combinations = n_combinations
+        self.__n_duplicated = n_duplicated
+        self.__n_completed = n_completed
+        self.__n_cached = n_cached
+
+    def __len__(self) -> int:
+        return len(self.__units)
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(self.__units)
+
+    @property
+    def units(self) -> list:
+        return self.__units
+
+    @property
+    def n_requests(self) -> int:
+        """Number of requests that will be sent (units without a fresh cached response)
+        """
+        return len(self.__units) - self.__n_cached
+
+    def estimate_runtime(self, max_workers: int = 8, requests_per_second: float = None, mean_latency: float = 1.0) -> float:
+        """Estimate the run time of the plan
+
+        Throughput is bounded by the number of requests in flight over the mean latency, and by the rate limit.
+
+        Args:
+            max_workers (int, optional): Maximum number of requests in flight. Defaults to 8.
+            requests_per_second (float, optional): Maximum number of requests sent per second. Defaults to None (no limit).
+            mean_latency (float, optional): Mean response time in seconds. Defaults to 1.0.
+
+        Returns:
+            float: Estimated run time in seconds.
+        """
+
+        throughput = max_workers / mean_latency
+
+        if requests_per_second is not None:
+            throughput = min(throughput, requests_per_second)
+
+        return self.n_requests / throughput
+
+    def summary(self, **kwargs) -> dict:
+        """Summarise the plan
+
+        Args:
+            **kwargs: Arguments passed to `QueryPlan.estimate_runtime(...)`.
+
+        Returns:
+            dict: Number of combinations, duplicated, completed and cached units, units and requests to send, and the estimated run time.
+        """
+
+        return {
+            "combinations": self.__n_combinations,
+            "duplicated": self.__n_duplicated,
+            "completed": self.__n_completed,
+            "cached": self.__n_cached,
+            "units": len(self.__units),
+            "requests": self.n_requests,
+            "estimated_seconds": self.estimate_runtime(**kwargs)
+        }
+
+class QueryPlanner:
+    """Planner of fan-out totals queries
+
+    A query is declared as geographies × date windows × filter values (e.g. every state, every year since 2006 and every
+    victim status). The planner builds the Cartesian product as units of work, drops duplicated units and units already
+    done in a job ledger, counts units with a fresh response in the Scrapper's response cache (they don't send a request)
+    and orders the units by geography, date window and filters, so the requests of a geography are sent together.
+    Job ledgers claim units in the order they were added, so the plan's order is kept by `Crawler.crawl_totals(...)`.
+    No request is sent while planning.
+
+    Usage:
+        planner = QueryPlanner(scrapper, ledger = ledger)
+        plan = planner.plan(
+            crawler.iter_totals_units(level = "state"),
+            windows = split_date_range("01/01/2006", "31/12/2021", frequency = "year"),
+            filters = {"idEstatusVictima": ["0", "7"], ("edadInicio", "edadFin"): [("0", "17"), ("18", "120")]}
+        )
+        print(plan.summary(max_workers = 8, requests_per_second = 4))
+        ledger.add_units(plan.units)
+        crawler.crawl_totals(ledger, sink = sink)
+    """
+
+    def __init__(self, scrapper: Scrapper, ledger = None) -> None:
+        """Create a new planner
+
+        Args:
+            scrapper (Scrapper): Scrapper whose request templates and response cache are used.
+            ledger (SQLiteLedger, MongoLedger or MemoryLedger, optional): Job ledger with the completed work. Defaults to None.
+        """
+
+        self.__scrapper = scrapper
+        self.__ledger = ledger
+
+    @property
+    def scrapper(self) -> Scrapper:
+        return self.__scrapper
+
+    @property
+    def ledger(self):
+        return self.__ledger
+
+    @staticmethod
+    def expand_filters(filters: dict = None) -> list:
+        """Build every combination of filter values
+
+        Filters whose values must vary together (e.g. an age range) are declared with a tuple of names and tuples of values.
+
+        Args:
+            filters (dict, optional): Lists of values keyed by filter name (or tuple of names). Defaults to None (no filters).
+
+        Raises:
+            ValueError: If a tuple of names and one of its values don't have the same length.
+
+        Returns:
+            list: A list of filter dicts (a single empty dict if there are no filters).
+        """
+
+        filters = filters or {}
+        names = list(filters.keys())
+        combinations = []
+
+        for values in product(*(filters[name] for name in names)):
+            combination = {}
+
+            for name, value in zip(names, values):
+                if isinstance(name, tuple):
+                    if not isinstance(value, (tuple, list)) or len(value) != len(name):
+                        raise ValueError("The values of the filters {0} must have {1} items!".format(name, len(name)))
+
+                    combination.update(zip(name, value))
+                else:
+                    combination[name] = value
+
+            combinations.append(combination)
+
+        return combinations
+
+    def iter_units(self, geographies: Iterable[dict], windows: Iterable[tuple] = (("", ""), ), filters: dict = None) -> Iterator[dict]:
+        """Build the Cartesian product of a query, without deduplication
+
+        Args:
+            geographies (Iterable[dict]): Dicts with the keys `state_id` and, optionally, `mun_id` and `neighborhood_id` (e.g. units of work).
+            windows (Iterable[tuple], optional): (date_start, date_end) tuples (see `split_date_range(...)`). Defaults to the whole registry.
+            filters (dict, optional): Lists of filter values (see `QueryPlanner.expand_filters(...)`). Defaults to None.
+
+        Yields:
+            dict: A unit of work.
+        """
+
+        windows = list(windows)
+        combinations = self.expand_filters(filters)
+
+        for geography in geographies:
+            for date_start, date_end in windows:
+                for combination in combinations:
+                    unit = {
+                        "state_id": str(geography["state_id"]),
+                        "mun_id": str(geography.get("mun_id", "0")),
+                        "neighborhood_id": str(geography.get("neighborhood_id", "0")),
+                        "date_start": date_start,
+                        "date_end": date_end
+                    }
+
+                    if combination:
+                        unit[FILTERS_FIELD] = unit_filters({FILTERS_FIELD: combination})
+
+                    yield unit
+
+    @staticmethod
+    def __locality_key(unit: dict) -> tuple:
+
+        # Numeric ids sort naturally, dates chronologically and the whole registry ("") first
+        geography = tuple(int(unit[field]) if unit[field].isdigit() else 0 for field in ("state_id", "mun_id", "neighborhood_id"))
+        date_start = parse_date(unit["date_start"]).toordinal() if unit["date_start"] else 0
+
+        return (geography, date_start, unit_key(unit))
+
+    def __count_cached(self, units: list) -> int:
+
+        cache = self.scrapper.response_cache
+
+        if cache is None:
+            return 0
+
+        ttl = cache.get_ttl("sociodemographics", "total")
+
+        if ttl is None:
+            return 0
+
+        template = self.scrapper.get_request_template(api_name = "sociodemographics", end_point = "total")
+        n_cached = 0
+
+        for unit in units:
+            payload = self.scrapper.build_totals_payload(
+                unit["state_id"], unit["mun_id"], unit["neighborhood_id"], unit["date_start"] or "", unit["date_end"] or "", **unit_filters(unit)
+            )
+            _, _, request_payload = self.scrapper.prepare_request_from_template(template, payload)
+
+            if cache.is_fresh(cache.make_key(template["api"], template["endPoint"], request_payload), ttl):
+                n_cached += 1
+
+        return n_cached
+
+    def plan(self, geographies: Iterable[dict], windows: Iterable[tuple] = (("", ""), ), filters: dict = None) -> QueryPlan:
+        """Plan a fan-out query
+
+        Units with a fresh cached response stay in the plan, since their records are still needed, but are not counted
+        as requests.
+
+        Args:
+            geographies (Iterable[dict]): Dicts with the keys `state_id` and, optionally, `mun_id` and `neighborhood_id` (e.g. units of work).
+            windows (Iterable[tuple], optional): (date_start, date_end) tuples (see `split_date_range(...)`). Defaults to the whole registry.
+            filters (dict, optional): Lists of filter values (see `QueryPlanner.expand_filters(...)`). Defaults to None.
+
+        Returns:
+            QueryPlan: The plan.
+        """
+
+        # Drop duplicated units
+        units = {}
+        n_combinations = 0
+
+        for unit in self.iter_units(geographies, windows = windows, filters = filters):
+            units.setdefault(unit_key(unit), unit)
+            n_combinations += 1
+
+        units = list(units.values())
+        n_duplicated = n_combinations - len(units)
+
+        # Drop completed units
+        n_completed = 0
+
+        if self.ledger is not None and len(units) > 0:
+            statuses = self.ledger.get_statuses(units)
+            n_completed = sum(status == DONE for status in statuses)
+            units = [unit for unit, status in zip(units, statuses) if status != DONE]
+
+        units.sort(key = self.__locality_key)
+
+        plan = QueryPlan(units, n_combinations, n_duplicated, n_completed, self.__count_cached(units))
+
+        logger.info("Query planned: %s", plan.summary())
+
+        return plan
@@ -0,0 +1,162 @@
+from typing import Iterable
+
+from RNPDNO.Scrapper import Scrapper
+from RNPDNO.Crawler.Core import Crawler
+from RNPDNO.Ledger import FILTERS_FIELD, unit_filters
+
+import itertools
+import hashlib
+import logging
+import json
+
+# Init logger
+logger = logging.getLogger(__name__)
+
+# Built-in crawl profiles. They can be updated (or new ones added) with the `SCRAPPER_CRAWL_PROFILES` configuration variable.
+PROFILES = {
+    "national-totals": {
+        "description": "Totals of the whole country and of every state.",
+        "mode": "totals",
+        "level": "state",
+        "include_national": True,
+        "sink": "totals_states",
+        "ledger": "ledger_national_totals"
+    },
+    "municipality-neighborhoods": {
+        "description": "Totals of every neighborhood, walking the catalogue municipality by municipality.",
+        "mode": "totals",
+        "level": "neighborhood",
+        "include_national": False,
+        "sink": "totals_neighborhoods",
+        "ledger": "ledger_municipality_neighborhoods"
+    },
+    "nightly": {
+        "description": "Monthly totals of every municipality, from the last scrapped month to yesterday.",
+        "mode": "incremental",
+        "level": "municipality",
+        "frequency": "month",
+        "sink": "totals_monthly",
+        "watermarks": "watermarks_nightly"
+    },
+    "yearly-series": {
+        "description": "Persons by sex and year of the whole country, every state and every municipality, one request per geography.",
+        "mode": "series",
+        "level": "municipality",
+        "include_national": True,
+        "sink": "series_yearly",
+        "ledger": "ledger_yearly_series"
+    }
+}
+
+# Geography of the national totals
+NATIONAL_UNIT = {"state_id": "0", "mun_id": "0", "neighborhood_id": "0"}
+
+def get_profiles(config_profiles: dict = None) -> dict:
+    """Get the crawl profiles
+
+    Args:
+        config_profiles (dict, optional): Profiles updating the built-in ones, by name (e.g. the `SCRAPPER_CRAWL_PROFILES` configuration variable). Defaults to None.
+
+    Returns:
+        dict: The profiles, by name.
+    """
+
+    profiles = {name: dict(profile) for name, profile in PROFILES.items()}
+
+    for name, profile in (config_profiles or {}).items():
+        profiles[name] = {**profiles.get(name, {}), **profile}
+
+    return profiles
+
+def get_profile(name: str, config_profiles: dict = None) -> dict:
+    """Get a crawl profile by name
+
+    Raises:
+        ValueError: If there's no profile with that name.
+    """
+
+    profiles = get_profiles(config_profiles)
+
+    if name not in profiles:
+        raise ValueError("Unknown crawl profile {0}, it must be one of {1}!".format(name, ", ".join(sorted(profiles))))
+
+    return profiles[name]
+
+def run_profile(scrapper: Scrapper, profile: dict, max_workers: int = 8, requests_per_second: float = None, burst: int = 1, sink = None, state_ids: Iterable[str] = None, date_start: str = "", date_end: str = "", until: str = None, ledger_path: str = None, watermarks_path: str = None, **kwargs) -> dict:
+    """Run a crawl profile
+
+    Profiles of the "totals" mode register their units of work in a job ledger and fetch them with `Crawler.crawl_totals(...)`,
+    so an interrupted run is resumed by running the profile again. Profiles of the "series" mode do the same with
+    `Crawler.crawl_yearly_series(...)`, writing one record per geography with its whole series by sex and year. Profiles of
+    the "incremental" mode fetch the date windows not yet scrapped with `Crawler.crawl_incremental(...)`.
+
+    Filters are stored in the units of work (and in the records), so running a profile with other filters registers new
+    units in its ledger instead of finding the unfiltered ones done, and filtered records don't overwrite unfiltered ones
+    in the sink. Incremental profiles keep the watermarks of each set of filters in their own store collection.
+
+    Args:
+        scrapper (Scrapper): A Scrapper ready to send requests (see `bootstrap_scrapper(...)`).
+        profile (dict): A crawl profile (see `get_profile(...)`).
+        max_workers (int, optional): Maximum number of requests in flight. Defaults to 8.
+        requests_per_second (float, optional): Maximum number of requests sent per second. Defaults to None (no limit).
+        burst (int, optional): Number of requests that can be sent at once after an idle period. Defaults to 1.
+        sink (MongoSink or DeltaSink, optional): Sink where records are written. Defaults to None (records are discarded).
+        state_ids (Iterable[str], optional): Ids of the states to crawl. Defaults to None (all states).
+        date_start (str, optional): Start date of the queries of "totals" and "series" profiles. Defaults to "".
+        date_end (str, optional): End date of the queries of "totals" and "series" profiles. Defaults to "".
+        until (str, optional): Last day scrapped by "incremental" profiles (dd/mm/yyyy). Defaults to None (yesterday).
+        ledger_path (str, optional): Path of a local SQLite ledger. Defaults to None (the profile's ledger in the config DB).
+        watermarks_path (str, optional): Path of a local SQLite watermark store. Defaults to None (the profile's store in the config DB).
+        **kwargs: Additional filters sent with every request (e.g. idEstatusVictima = "7").
+
+    Raises:
+        ValueError: If the mode of the profile is not valid.
+
+    Returns:
+        dict: The result of the crawl.
+    """
+
+    mode = profile.get("mode", "totals")
+
+    if mode not in ("totals", "series", "incremental"):
+        raise ValueError("The mode of a crawl profile must be totals, series or incremental!")
+
+    crawler = Crawler(scrapper, max_workers = max_workers, requests_per_second = requests_per_second, burst = burst)
+    level = profile.get("level", "neighborhood")
+    filters = unit_filters({FILTERS_FIELD: kwargs})
+
+    if mode == "incremental":
+        watermarks_name = profile.get("watermarks", "watermarks")
+
+        # Watermarks are kept by geography, each set of filters needs its own store
+        if filters:
+            digest = hashlib.sha1(json.dumps(filters, sort_keys = True).encode("utf-8")).hexdigest()[:12]
+            watermarks_name = "{0}_{1}".format(watermarks_name, digest)
+
+            if watermarks_path is not None:
+                logger.warning("The watermarks at %s must only be used with the filters %s!", watermarks_path, filters)
+
+        watermarks = scrapper.create_watermark_store(watermarks_name, path = watermarks_path)
+        geographies = crawler.iter_totals_units(level = level, state_ids = state_ids)
+
+        return crawler.crawl_incremental(watermarks, geographies, until = until, frequency = profile.get("frequency", "month"), backfill_frequency = profile.get("backfill_frequency"), sink = sink, filters = filters)
+
+    ledger = scrapper.create_ledger(profile.get("ledger", "ledger"), path = ledger_path)
+
+    units = crawler.iter_totals_units(level = level, date_start = date_start, date_end = date_end, state_ids = state_ids)
+
+    # The national totals are not part of the catalogue tree
+    if profile.get("include_national", False) and state_ids is None:
+        units = itertools.chain([{**NATIONAL_UNIT, "date_start": date_start, "date_end": date_end}], units)
+
+    # The filters are part of the key of the units (and of their records)
+    if filters:
+        units = ({**unit, FILTERS_FIELD: filters} for unit in units)
+
+    n_new = ledger.add_units(units)
+    logger.info("%s new units of work registered.", n_new)
+
+    if mode == "series":
+        return crawler.crawl_yearly_series(ledger, sink = sink)
+
+    return crawler.crawl_totals(ledger, sink = sink)
@@ -0,0 +1,412 @@
+from typing import Iterable, Union
+
+import pymongo as pm
+from pymongo import UpdateOne, ReturnDocument
+
+from RNPDNO.Scrapper import Scrapper
+from RNPDNO.Ledger import MemoryLedger, unit_key, FAILED
+from RNPDNO.Crawler.Core import Crawler
+
+import multiprocessing
+import threading
+import hashlib
+import logging
+import socket
+import uuid
+import time
+import os
+
+# Init logger
+logger = logging.getLogger(__name__)
+
+# Shard statuses
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+
+def bootstrap_scrapper(level: int = logging.INFO, **logger_options) -> Scrapper:
+    """Create a Scrapper ready to send requests
+
+    The configuration is loaded from the environment and the config DB, and a new requests session is created and
+    initialized (see `Scrapper.initialize_requests_sessions()`).
+
+    Args:
+        level (int, optional): logging level. Defaults to logging.INFO.
+        **logger_options: Additional arguments of `Scrapper.create_logger(...)` (e.g. json_format or sample_rates).
+
+    Returns:
+        Scrapper: A new Scrapper instance.
+    """
+
+    scrapper = Scrapper()
+    scrapper.create_logger(level, **logger_options)
+    scrapper.load_config()
+    scrapper.set_common_config_variables()
+    scrapper.create_requests_session()
+    scrapper.initialize_requests_sessions()
+
+    return scrapper
+
+class ShardStore:
+    """Shards of a distributed crawl, stored in a MongoDB collection
+
+    Each shard is a list of units of work (see `Crawler.iter_totals_units(...)`). Workers lease shards atomically
+    with `find_one_and_update`; a lease expires unless its worker renews it with heartbeats, so the shards of a dead
+    worker are leased again by the others.
+    """
+
+    def __init__(self, collection: pm.collection.Collection) -> None:
+
+        self.__collection = collection
+        self.__collection.create_index([("status", pm.ASCENDING), ("lease_expires", pm.ASCENDING)])
+
+    @property
+    def collection(self) -> pm.collection.Collection:
+        return self.__collection
+
+    def create_shards(self, units: Iterable[dict], shard_size: int = 50) -> int:
+        """Split units of work into shards
+
+        Units are sorted by key before being split. Shard ids are a hash of the keys of their units, so running this method
+        again with the same units creates no new shards, while units of another crawl (a different window or a changed
+        catalogue) get new shards instead of being merged into the shards of the previous one.
+
+        Args:
+            units (Iterable[dict]): Units of work.
+            shard_size (int, optional): Number of units per shard. Defaults to 50.
+
+        Raises:
+            ValueError: If shard_size is not a positive number.
+
+        Returns:
+            int: Number of new shards.
+        """
+
+        if shard_size < 1:
+            raise ValueError("The shard size must be at least 1!")
+
+        units = sorted(units, key = unit_key)
+        operations = []
+
+        for i in range(0, len(units), shard_size):
+            shard_units = units[i:i + shard_size]
+            digest = hashlib.sha1("\n".join(unit_key(unit) for unit in shard_units).encode("utf-8")).hexdigest()
+
+            document = {
+                "units": shard_units,
+                "status": PENDING,
+                "lease_owner": None,
+                "lease_expires": None,
+                "attempts": 0,
+                "failed_units": [],
+                "updated_at": time.time()
+            }
+
+            operations.append(UpdateOne({"_id": "shard-{0}".format(digest[:20])}, {"$setOnInsert": document}, upsert = True))
+
+        if len(operations) == 0:
+            return 0
+
+        n_new = self.collection.bulk_write(operations, ordered = False).upserted_count
+        logger.info("%s new shards were created (%s units).", n_new, len(units))
+
+        return n_new
+
+    def lease(self, worker_id: str, lease_seconds: float = 300) -> Union[dict, None]:
+        """Atomically lease a pending shard, or a shard whose lease expired
+
+        Args:
+            worker_id (str): Id of the worker.
+            lease_seconds (float, optional): Lease duration in seconds. Defaults to 300.
+
+        Returns:
+            dict: The leased shard.
+            None: If there are no shards left.
+        """
+
+        now = time.time()
+
+        return self.collection.find_one_and_update(
+            {"$or": [{"status": PENDING}, {"status": LEASED, "lease_expires": {"$lt": now}}]},
+            {"$set": {"status": LEASED, "lease_owner": worker_id, "lease_expires": now + lease_seconds, "updated_at": now}, "$inc": {"attempts": 1}},
+            sort = [("_id", pm.ASCENDING)],
+            return_document = ReturnDocument.AFTER
+        )
+
+    def heartbeat(self, shard_id: str, worker_id: str, lease_seconds: float = 300) -> bool:
+        """Renew the lease of a shard
+
+        Returns:
+            bool: Is the shard still leased by the worker?
+        """
+
+        now = time.time()
+        result = self.collection.update_one(
+            {"_id": shard_id, "status": LEASED, "lease_owner": worker_id},
+            {"$set": {"lease_expires": now + lease_seconds, "updated_at": now}}
+        )
+
+        return result.matched_count == 1
+
+    def complete(self, shard_id: str, worker_id: str, failed_units: list = None) -> bool:
+        """Mark a leased shard as done
+
+        Returns:
+            bool: Was the shard still leased by the worker?
+        """
+
+        result = self.collection.update_one(
+            {"_id": shard_id, "status": LEASED, "lease_owner": worker_id},
+            {"$set": {"status": DONE, "lease_owner": None, "lease_expires": None, "failed_units": failed_units or [], "updated_at": time.time()}}
+        )
+
+        return result.matched_count == 1
+
+    def release(self, shard_id: str, worker_id: str) -> bool:
+        """Return a leased shard to pending (e.g. when a worker is stopped)
+
+        Returns:
+            bool: Was the shard still leased by the worker?
+        """
+
+        result = self.collection.update_one(
+            {"_id": shard_id, "status": LEASED, "lease_owner": worker_id},
+            {"$set": {"status": PENDING, "lease_owner": None, "lease_expires": None, "updated_at": time.time()}}
+        )
+
+        return result.matched_count == 1
+
+    def requeue_failed(self) -> int:
+        """Return done shards with failed units to pending, keeping only their failed units
+
+        Returns:
+            int: Number of shards returned to pending.
+        """
+
+        result = self.collection.update_many(
+            {"status": DONE, "failed_units.0": {"$exists": True}},
+            [{"$set": {"status": PENDING, "units": "$failed_units", "failed_units": [], "updated_at": time.time()}}]
+        )
+
+        return result.modified_count
+
+    def counts(self) -> dict:
+        """Number of shards by status
+        """
+
+        rows = self.collection.aggregate([{"$group": {"_id": "$status", "n": {"$sum": 1}}}])
+
+        return {PENDING: 0, LEASED: 0, DONE: 0, **{row["_id"]: row["n"] for row in rows}}
+
+class _LeasedLedger(MemoryLedger):
+    """Ledger of the units of a leased shard, no units are claimed once the lease is lost
+    """
+
+    def __init__(self, units: Iterable[dict], lease_lost: threading.Event) -> None:
+
+        super().__init__(units)
+        self.__lease_lost = lease_lost
+
+    def claim(self, limit: int = 1) -> list:
+
+        if self.__lease_lost.is_set():
+            return []
+
+        return super().claim(limit)
+
+class _LeasedSink:
+    """Sink wrapper that only writes the records of a shard while its lease is held
+
+    Records are held back until the next flush, where the lease is checked (and renewed) before passing them to the
+    sink. Once the lease is lost, the records are dropped, so units are only written and marked as done while the shard
+    is still leased by the worker.
+    """
+
+    def __init__(self, sink, store: ShardStore, shard_id: str, worker_id: str, lease_seconds: float, lease_lost: threading.Event) -> None:
+
+        self.__sink = sink
+        self.__store = store
+        self.__shard_id = shard_id
+        self.__worker_id = worker_id
+        self.__lease_seconds = lease_seconds
+        self.__lease_lost = lease_lost
+
+        self.__records = []
+        self.__lock = threading.Lock()
+
+    def write(self, record: dict) -> None:
+
+        with self.__lock:
+            self.__records.append(record)
+
+    def write_many(self, records: Iterable[dict]) -> None:
+
+        for record in records:
+            self.write(record)
+
+    def flush(self) -> None:
+
+        with self.__lock:
+            records = self.__records
+            self.__records = []
+
+        if self.__lease_lost.is_set() or not self.__store.heartbeat(self.__shard_id, self.__worker_id, self.__lease_seconds):
+            self.__lease_lost.set()
+            return
+
+        self.__sink.write_many(records)
+        self.__sink.flush()
+
+class ShardWorker:
+    """Worker of a distributed crawl
+
+    The worker leases shards from a ShardStore until there are none left, fetching the totals of the units of each shard
+    with a Crawler. The lease is renewed by a heartbeat thread while the shard is being crawled. Once the lease is lost
+    (e.g. the worker stalled and another worker took the shard), the worker stops claiming units, drops their records
+    and leaves the shard to its new owner.
+    Start as many workers as needed, in one or many hosts, on the same shard store.
+    """
+
+    def __init__(self, scrapper: Scrapper, store: ShardStore, sink = None, worker_id: str = None, lease_seconds: float = 300, max_workers: int = 8, requests_per_second: float = None, **kwargs) -> None:
+        """Create a new worker
+
+        Args:
+            scrapper (Scrapper): A Scrapper ready to send requests (see `bootstrap_scrapper(...)`).
+            store (ShardStore): Shard store.
+            sink (MongoSink, optional): Sink where records are written. Defaults to None (records are discarded).
+            worker_id (str, optional): Id of the worker. Defaults to None (host name, process id and a random suffix).
+            lease_seconds (float, optional): Lease duration in seconds. Defaults to 300.
+            max_workers (int, optional): Maximum number of requests in flight. Defaults to 8.
+            requests_per_second (float, optional): Maximum number of requests sent per second. Defaults to None (no limit).
+            **kwargs: Additional filters passed to `Scrapper.get_totals(...)`.
+        """
+
+        self.__scrapper = scrapper
+        self.__store = store
+        self.__sink = sink
+        self.__worker_id = worker_id if worker_id is not None else "{0}:{1}:{2}".format(socket.gethostname(), os.getpid(), uuid.uuid4().hex[:6])
+        self.__lease_seconds = lease_seconds
+        self.__crawler = Crawler(scrapper, max_workers = max_workers, requests_per_second = requests_per_second)
+        self.__kwargs = kwargs
+
+    @property
+    def worker_id(self) -> str:
+        return self.__worker_id
+
+    def __heartbeat(self, shard_id: str, stop: threading.Event, lease_lost: threading.Event) -> None:
+
+        # Renew the lease three times per lease period
+        while not stop.wait(self.__lease_seconds / 3):
+            if not self.__store.heartbeat(shard_id, self.worker_id, self.__lease_seconds):
+                lease_lost.set()
+                return
+
+    def run(self, max_shards: int = None) -> dict:
+        """Lease and crawl shards until there are none left
+
+        Args:
+            max_shards (int, optional): Maximum number of shards to crawl. Defaults to None (no limit).
+
+        Returns:
+            dict: Number of shards, units done and units failed by this worker.
+        """
+
+        logger.info("Starting worker %s...", self.worker_id)
+
+        n_shards = 0
+        n_done = 0
+        n_failed = 0
+
+        while max_shards is None or n_shards < max_shards:
+            shard = self.__store.lease(self.worker_id, self.__lease_seconds)
+
+            if shard is None:
+                break
+
+            logger.info("Worker %s leased %s (%s units).", self.worker_id, shard["_id"], len(shard["units"]))
+
+            stop = threading.Event()
+            lease_lost = threading.Event()
+            heartbeat = threading.Thread(target = self.__heartbeat, args = (shard["_id"], stop, lease_lost), daemon = True)
+            heartbeat.start()
+
+            # Records are only written, and units marked as done, while the shard is leased by this worker
+            ledger = _LeasedLedger(shard["units"], lease_lost)
+            sink = None
+
+            if self.__sink is not None:
+                sink = _LeasedSink(self.__sink, self.__store, shard["_id"], self.worker_id, self.__lease_seconds, lease_lost)
+
+            try:
+                result = self.__crawler.crawl_totals(ledger, sink = sink, **self.__kwargs)
+            except BaseException:
+                # Let other workers take the shard right away
+                self.__store.release(shard["_id"], self.worker_id)
+                raise
+            finally:
+                stop.set()
+                heartbeat.join()
+
+            if lease_lost.is_set():
+                logger.warning("Worker %s lost the lease of %s, its results were dropped.", self.worker_id, shard["_id"])
+                continue
+
+            failed_units = [{key: value for key, value in unit.items() if key != "error"} for unit in ledger.units(FAILED)]
+
+            if not self.__store.complete(shard["_id"], self.worker_id, failed_units = failed_units):
+                logger.warning("Worker %s finished %s after losing its lease.", self.worker_id, shard["_id"])
+                continue
+
+            n_shards += 1
+            n_done += result["done"]
+            n_failed += result["failed"]
+
+        logger.info("Worker %s finished! (shards: %s, done: %s, failed: %s)", self.worker_id, n_shards, n_done, n_failed)
+
+        return {"shards": n_shards, "done": n_done, "failed": n_failed}
+
+def run_worker_process(store_name: str, sink_collection: str = None, level: int = logging.INFO, **kwargs) -> dict:
+    """Bootstrap a Scrapper and run a ShardWorker until there are no shards left
+
+    This function is the entry point of each worker process: every process has its own Scrapper, requests session
+    and session cookie.
+
+    Args:
+        store_name (str): Name of the shard store collection in the config DB.
+        sink_collection (str, optional): Name of the target DB collection where records are written. Defaults to None (records are discarded).
+        level (int, optional): logging level. Defaults to logging.INFO.
+        **kwargs: Additional arguments passed to `ShardWorker(...)`.
+
+    Returns:
+        dict: Number of shards, units done and units failed by the worker.
+    """
+
+    scrapper = bootstrap_scrapper(level = level)
+    store = ShardStore(scrapper.config_db[store_name])
+
+    if sink_collection is None:
+        return ShardWorker(scrapper, store, **kwargs).run()
+
+    with scrapper.create_sink(sink_collection) as sink:
+        return ShardWorker(scrapper, store, sink = sink, **kwargs).run()
+
+def run_local_workers(n_processes: int, store_name: str, sink_collection: str = None, **kwargs) -> list:
+    """Run several worker processes on the current host
+
+    Args:
+        n_processes (int): Number of worker processes.
+        store_name (str): Name of the shard store collection in the config DB.
+        sink_collection (str, optional): Name of the target DB collection where records are written. Defaults to None.
+        **kwargs: Additional arguments passed to `run_worker_process(...)`.
+
+    Returns:
+        list: The results of each worker.
+    """
+
+    # Each process opens its own connections, never share clients or sessions across a fork
+    context = multiprocessing.get_context("spawn")
+
+    with context.Pool(processes = n_processes) as pool:
+        results = [pool.apply_async(run_worker_process, (store_name, sink_collection), kwargs) for _ in range(n_processes)]
+
+        return [result.get() for result in results]
@@ -0,0 +1,4 @@
+from .Core import Crawler
+from .Shards import ShardStore, ShardWorker, bootstrap_scrapper, run_worker_process, run_local_workers
+from .Planner import QueryPlanner, QueryPlan
+from .Profiles import PROFILES, get_profiles, get_profile, run_profile
@@ -0,0 +1,384 @@
+from typing import Iterable, Union
+from collections import OrderedDict
+
+from RNPDNO.Scrapper.Windows import TOTALS_FIELDS
+from RNPDNO.Scrapper.Totals import PERCENTAGE_FIELDS
+from RNPDNO.Ledger import FILTERS_FIELD
+
+import logging
+import json
+import csv
+import os
+
+# Init logger
+logger = logging.getLogger(__name__)
+
+# Integer columns of scrapped records
+INTEGER_FIELDS = TOTALS_FIELDS
+
+# Float columns of scrapped records
+FLOAT_FIELDS = PERCENTAGE_FIELDS
+
+# Id columns, always exported as strings
+ID_FIELDS = ("state_id", "mun_id", "neighborhood_id")
+
+# Date columns (dd/mm/yyyy), exported as strings
+DATE_FIELDS = ("date_start", "date_end")
+
+# Columns whose values are dicts with varying keys (e.g. the filters of a unit of work), exported as JSON strings
+JSON_FIELDS = (FILTERS_FIELD, )
+
+def chunk_columns(records: list) -> list:
+    """Get the columns of a chunk of records, in order of appearance
+
+    Totals records only have a filters field if their unit of work had filters, so chunks of totals always get a
+    filters column (e.g. when their first chunk has no filtered records).
+
+    Returns:
+        list: The names of the columns.
+    """
+
+    columns = list(dict.fromkeys(field for record in records for field in record))
+
+    if FILTERS_FIELD not in columns and any(field in INTEGER_FIELDS for field in columns):
+        columns.append(FILTERS_FIELD)
+
+    return columns
+
+def encode_json_fields(records: list) -> list:
+    """Copy records with the values of the JSON_FIELDS encoded as JSON strings
+    """
+
+    return [
+        {field: json.dumps(value, ensure_ascii = False, sort_keys = True) if field in JSON_FIELDS and value is not None else value for field, value in record.items()}
+        for record in records
+    ]
+
+class _ColumnsChecker:
+    """Warns once about each field of a later chunk that has no column (the columns are fixed by the first chunk)
+    """
+
+    def __init__(self, path: str, columns: list) -> None:
+
+        self.__path = path
+        self.__columns = set(columns)
+
+    def check(self, records: list) -> None:
+
+        dropped_fields = {field for record in records for field in record} - self.__columns
+
+        for field in sorted(dropped_fields):
+            logger.warning("The field %s has no column in %s (it's not in the first chunk), its values are not exported!", field, self.__path)
+
+        self.__columns |= dropped_fields
+
+class NDJSONWriter:
+    """Writes records as newline-delimited JSON
+    """
+
+    extension = "ndjson"
+
+    def __init__(self, path: str) -> None:
+
+        self.__file = open(path, "w", encoding = "utf-8")
+
+    def write_chunk(self, records: list) -> None:
+
+        self.__file.writelines(json.dumps(record, ensure_ascii = False) + "\n" for record in records)
+
+    def close(self) -> None:
+
+        self.__file.close()
+
+class CSVWriter:
+    """Writes records as CSV
+
+    The columns are taken from the first chunk (see `chunk_columns(...)`). Fields missing from a record are left empty;
+    fields that first appear in a later chunk are not written, with a warning. Filters are written as JSON.
+    """
+
+    extension = "csv"
+
+    def __init__(self, path: str) -> None:
+
+        self.__path = path
+        self.__file = open(path, "w", encoding = "utf-8", newline = "")
+        self.__writer = None
+        self.__checker = None
+
+    def write_chunk(self, records: list) -> None:
+
+        if self.__writer is None:
+            columns = chunk_columns(records)
+            self.__writer = csv.DictWriter(self.__file, fieldnames = columns, extrasaction = "ignore")
+            self.__writer.writeheader()
+            self.__checker = _ColumnsChecker(self.__path, columns)
+
+        self.__checker.check(records)
+        self.__writer.writerows(encode_json_fields(records))
+
+    def close(self) -> None:
+
+        self.__file.close()
+
+class ParquetWriter:
+    """Writes records as Parquet, one row group per chunk
+
+    The columns are taken from the first chunk (see `chunk_columns(...)`); fields that first appear in a later chunk are
+    not written, with a warning. Known fields have fixed types (the totals as 64-bit integers, the percentages as
+    64-bit floats, the ids, dates and filters as strings, the filters encoded as JSON), whatever the values of the first
+    chunk; the type of other fields is inferred from the first chunk (as strings if all their values are null), and
+    values of later chunks are cast to it. Requires pyarrow.
+    """
+
+    extension = "parquet"
+
+    def __init__(self, path: str, compression: str = "zstd") -> None:
+
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Exporting to Parquet requires pyarrow (pip install pyarrow)!") from e
+
+        self.__pa = pa
+        self.__pq = pq
+        self.__path = path
+        self.__compression = compression
+        self.__schema = None
+        self.__writer = None
+        self.__checker = None
+
+    def __infer_schema(self, records: list):
+
+        pa = self.__pa
+        fields = []
+
+        for name in chunk_columns(records):
+            if name in INTEGER_FIELDS:
+                field_type = pa.int64()
+            elif name in FLOAT_FIELDS:
+                field_type = pa.float64()
+            elif name in ID_FIELDS or name in DATE_FIELDS or name in JSON_FIELDS:
+                field_type = pa.string()
+            else:
+                field_type = pa.array([record.get(name) for record in records]).type
+
+                if pa.types.is_null(field_type):
+                    field_type = pa.string()
+
+            fields.append(pa.field(name, field_type))
+
+        return pa.schema(fields)
+
+    def write_chunk(self, records: list) -> None:
+
+        pa = self.__pa
+
+        if self.__writer is None:
+            self.__schema = self.__infer_schema(records)
+            self.__writer = self.__pq.ParquetWriter(self.__path, self.__schema, compression = self.__compression)
+            self.__checker = _ColumnsChecker(self.__path, self.__schema.names)
+
+        self.__checker.check(records)
+        records = encode_json_fields(records)
+
+        # Ids may come as ints or strings depending on the getter
+        columns = {}
+
+        for field in self.__schema:
+            values = [record.get(field.name) for record in records]
+
+            if field.name in ID_FIELDS:
+                values = [str(value) if value is not None else None for value in values]
+
+            columns[field.name] = self.__to_array(field, values)
+
+        self.__writer.write_table(pa.Table.from_pydict(columns, schema = self.__schema))
+
+    def __to_array(self, field, values: list):
+
+        pa = self.__pa
+
+        try:
+            return pa.array(values, type = field.type)
+        except (pa.ArrowTypeError, pa.ArrowInvalid):
+            pass
+
+        # Values of another type than the first chunk's (e.g. floats in a column that was all null), cast them
+        try:
+            return pa.array(values).cast(field.type)
+        except (pa.ArrowTypeError, pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+            raise ValueError("The values of the column {0} can't be written as {1}!".format(field.name, field.type)) from e
+
+    def close(self) -> None:
+
+        if self.__writer is not None:
+            self.__writer.close()
+
+WRITERS = {
+    "ndjson": NDJSONWriter,
+    "csv": CSVWriter,
+    "parquet": ParquetWriter,
+}
+
+class Exporter:
+    """Streaming exporter of scrapped records
+
+    Records are consumed from any iterable (e.g. a generator of `Scrapper.get_totals(...)` results or
+    `Crawler.iter_catalogue(...)`) and written in chunks, so memory use is bounded by the chunk size (times the number
+    of partitions), not by the number of records. Records can be partitioned by a field (e.g. `state_id`) into a
+    Hive-style directory layout (`<path>/state_id=9/part-0.parquet`), in which case the field is not written in the files.
+
+    At most `max_open_files` partition files are kept open. When a chunk of another partition must be written, the least
+    recently written file is closed, and the next chunk of its partition goes to a new part file (`part-1.parquet`, ...).
+    """
+
+    def __init__(self, path: str, format: str = "parquet", chunk_size: int = 10000, partition_by: str = None, max_open_files: int = 64) -> None:
+        """Create a new exporter
+
+        Args:
+            path (str): Output file, or output directory if partition_by is supplied.
+            format (str, optional): Output format ("parquet", "csv" or "ndjson"). Defaults to "parquet".
+            chunk_size (int, optional): Number of records buffered per file before writing (a Parquet row group). Defaults to 10000.
+            partition_by (str, optional): Field used to partition the records. Defaults to None (a single file).
+            max_open_files (int, optional): Maximum number of partition files open at once. Defaults to 64.
+
+        Raises:
+            ValueError: If the format is not supported, or chunk_size or max_open_files are not positive numbers.
+        """
+
+        if format not in WRITERS:
+            raise ValueError("The format must be one of {0}!".format(", ".join(WRITERS)))
+
+        if chunk_size < 1:
+            raise ValueError("The chunk size must be at least 1!")
+
+        if max_open_files < 1:
+            raise ValueError("At least one file must be open!")
+
+        self.__path = path
+        self.__format = format
+        self.__chunk_size = chunk_size
+        self.__partition_by = partition_by
+        self.__max_open_files = max_open_files
+
+        # Open writers (least recently written first), buffers and number of part files by partition value
+        self.__writers = OrderedDict()
+        self.__buffers = {}
+        self.__n_parts = {}
+        self.__n_records = 0
+
+    def __enter__(self) -> "Exporter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    @property
+    def n_records(self) -> int:
+        return self.__n_records
+
+    def __partition_path(self, partition: Union[str, None], part: int) -> str:
+
+        if self.__partition_by is None:
+            return self.__path
+
+        directory = os.path.join(self.__path, "{0}={1}".format(self.__partition_by, partition))
+        os.makedirs(directory, exist_ok = True)
+
+        return os.path.join(directory, "part-{0}.{1}".format(part, WRITERS[self.__format].extension))
+
+    def __get_writer(self, partition: Union[str, None]):
+
+        if partition in self.__writers:
+            self.__writers.move_to_end(partition)
+            return self.__writers[partition]
+
+        # Close the least recently written file
+        if len(self.__writers) >= self.__max_open_files:
+            _, writer = self.__writers.popitem(last = False)
+            writer.close()
+
+        part = self.__n_parts.get(partition, 0)
+        self.__n_parts[partition] = part + 1
+        self.__writers[partition] = WRITERS[self.__format](self.__partition_path(partition, part))
+
+        return self.__writers[partition]
+
+    def __flush_partition(self, partition: Union[str, None]) -> None:
+
+        records = self.__buffers.get(partition)
+
+        if not records:
+            return
+
+        writer = self.__get_writer(partition)
+
+        # The partition value is encoded in the directory name
+        if self.__partition_by is not None:
+            records = [{key: value for key, value in record.items() if key != self.__partition_by} for record in records]
+
+        writer.write_chunk(records)
+        self.__buffers[partition] = []
+
+    def write(self, record: dict) -> None:
+        """Buffer a record, writing its partition's chunk if it's full
+        """
+
+        partition = str(record.get(self.__partition_by)) if self.__partition_by is not None else None
+
+        self.__buffers.setdefault(partition, []).append(record)
+        self.__n_records += 1
+
+        if len(self.__buffers[partition]) >= self.__chunk_size:
+            self.__flush_partition(partition)
+
+    def write_many(self, records: Iterable[dict]) -> int:
+        """Consume an iterable of records
+
+        Returns:
+            int: Number of records consumed.
+        """
+
+        n_records = 0
+
+        for record in records:
+            self.write(record)
+            n_records += 1
+
+        return n_records
+
+    def close(self) -> None:
+        """Write the remaining records and close the output files
+        """
+
+        for partition in list(self.__buffers):
+            self.__flush_partition(partition)
+
+        for writer in self.__writers.values():
+            writer.close()
+
+        self.__writers.clear()
+
+        logger.info("%s records exported to %s.", self.__n_records, self.__path)
+
+def export_records(records: Iterable[dict], path: str, format: str = "parquet", chunk_size: int = 10000, partition_by: str = None, max_open_files: int = 64) -> int:
+    """Export scrapped records to a file (or a partitioned directory) with bounded memory
+
+    This function is a wrapper around `Exporter`.
+
+    Args:
+        records (Iterable[dict]): Records to export (e.g. a generator).
+        path (str): Output file, or output directory if partition_by is supplied.
+        format (str, optional): Output format ("parquet", "csv" or "ndjson"). Defaults to "parquet".
+        chunk_size (int, optional): Number of records buffered per file before writing. Defaults to 10000.
+        partition_by (str, optional): Field used to partition the records. Defaults to None (a single file).
+        max_open_files (int, optional): Maximum number of partition files open at once. Defaults to 64.
+
+    Returns:
+        int: Number of exported records.
+    """
+
+    with Exporter(path, format = format, chunk_size = chunk_size, partition_by = partition_by, max_open_files = max_open_files) as exporter:
+        return exporter.write_many(records)
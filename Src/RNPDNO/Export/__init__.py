@@ -0,0 +1 @@
+from .Core import Exporter, export_records, ParquetWriter, CSVWriter, NDJSONWriter
@@ -0,0 +1,521 @@
+from typing import Iterable, NamedTuple, Union
+
+from array import array
+
+import unicodedata
+import logging
+import struct
+import mmap
+import json
+import sys
+
+# Init logger
+logger = logging.getLogger(__name__)
+
+# Geographic levels of the nodes
+STATE = 0
+MUNICIPALITY = 1
+NEIGHBORHOOD = 2
+
+LEVEL_NAMES = ("state", "municipality", "neighborhood")
+
+# File layout: magic, header size, JSON header, then the sections aligned to 8 bytes
+MAGIC = b"RNPDNOGI"
+FORMAT_VERSION = 1
+ALIGNMENT = 8
+
+# Sections of the index: name, array typecode (4 byte ints, "B" for UTF-8 blobs)
+SECTIONS = (
+    ("levels", "B"),
+    ("state_ids", "i"),
+    ("mun_ids", "i"),
+    ("neighborhood_ids", "i"),
+    ("parents", "i"),
+    ("first_children", "i"),
+    ("n_children", "i"),
+    ("name_offsets", "I"),
+    ("names", "B"),
+    ("key_offsets", "I"),
+    ("keys", "B"),
+    ("sorted_nodes", "i"),
+    ("slots", "i")
+)
+
+def normalize_name(name: str) -> str:
+    """Normalize a place name for searching: accents removed, case folded and whitespace collapsed (e.g. "Abalá " -> "abala")
+    """
+
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(character for character in decomposed if not unicodedata.combining(character))
+
+    return " ".join(stripped.casefold().split())
+
+def hash_ids(state_id: int, mun_id: int, neighborhood_id: int) -> int:
+    """Hash the ids of a geography into a 64 bit int
+    """
+
+    value = 0xcbf29ce484222325
+
+    for item in (state_id, mun_id, neighborhood_id):
+        value = ((value ^ (item & 0xffffffff)) * 0x100000001b3) & 0xffffffffffffffff
+
+    return value ^ (value >> 29)
+
+class Geography(NamedTuple):
+    """A geography of the catalogue. Ids below its level are 0 (e.g. the neighborhood id of a municipality).
+    """
+
+    level: str
+    state_id: int
+    mun_id: int
+    neighborhood_id: int
+    name: str
+
+class GeographyIndex:
+    """Compact, array-backed index of the catalogue tree
+
+    Nodes (states, then municipalities grouped by state, then neighborhoods grouped by municipality) are stored as
+    parallel arrays of 4 byte ints, so the children of a node are a contiguous range. Names are UTF-8 blobs. An
+    open-addressing hash table maps ids to nodes in O(1), and the nodes sorted by normalized name (see
+    `normalize_name(...)`) answer accent and case insensitive prefix searches with a binary search.
+
+    Indexes saved with `GeographyIndex.save(...)` are memory-mapped by `GeographyIndex.load(...)`: nothing is parsed
+    or copied when loading, pages are read on demand.
+
+    Usage:
+        index = GeographyIndex.from_catalogue(crawler.iter_catalogue())
+        index.save("geography.idx")
+
+        with GeographyIndex.load("geography.idx") as index:
+            municipalities = index.search("iztapa", level = "municipality")
+            neighborhoods = index.children(municipalities[0])
+    """
+
+    def __init__(self, sections: dict, buffer: mmap.mmap = None) -> None:
+        """Wrap the sections of an index (use `GeographyIndex.from_catalogue(...)` or `GeographyIndex.load(...)`)
+
+        Args:
+            sections (dict): Memoryviews of the sections, by name.
+            buffer (mmap.mmap, optional): Memory map backing the sections, closed by `GeographyIndex.close()`. Defaults to None.
+        """
+
+        self.__sections = sections
+        self.__buffer = buffer
+
+        self.__levels = sections["levels"]
+        self.__state_ids = sections["state_ids"]
+        self.__mun_ids = sections["mun_ids"]
+        self.__neighborhood_ids = sections["neighborhood_ids"]
+        self.__parents = sections["parents"]
+        self.__first_children = sections["first_children"]
+        self.__n_children = sections["n_children"]
+        self.__name_offsets = sections["name_offsets"]
+        self.__names = sections["names"]
+        self.__key_offsets = sections["key_offsets"]
+        self.__keys = sections["keys"]
+        self.__sorted_nodes = sections["sorted_nodes"]
+        self.__slots = sections["slots"]
+
+        self.__mask = len(self.__slots) - 1
+        # The states are the first nodes
+        self.__n_states = self.__first_of_level(MUNICIPALITY)
+
+    def __enter__(self) -> "GeographyIndex":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.__levels)
+
+    def __contains__(self, ids: tuple) -> bool:
+        return self.__find(*ids) >= 0
+
+    @property
+    def counts(self) -> dict:
+        """Number of nodes by level
+        """
+
+        first_neighborhood = self.__first_of_level(NEIGHBORHOOD)
+
+        return {
+            "state": self.__n_states,
+            "municipality": first_neighborhood - self.__n_states,
+            "neighborhood": len(self) - first_neighborhood
+        }
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the index in bytes
+        """
+
+        return sum(section.nbytes for section in self.__sections.values())
+
+    @classmethod
+    def from_catalogue(cls, records: Iterable[dict]) -> "GeographyIndex":
+        """Build an index from flattened catalogue records
+
+        Args:
+            records (Iterable[dict]): Records of `Crawler.iter_catalogue(...)`, with the keys `state_id`, `state_name`,
+                `mun_id` and `mun_name`, plus `neighborhood_id` and `neighborhood_name` for neighborhood records.
+
+        Returns:
+            GeographyIndex: The index, kept in memory (see `GeographyIndex.save(...)`).
+        """
+
+        states = {}
+        municipalities = {}
+        neighborhoods = {}
+
+        for record in records:
+            state_id = int(record["state_id"])
+            states.setdefault(state_id, record["state_name"])
+
+            if "mun_id" not in record:
+                continue
+
+            mun_id = int(record["mun_id"])
+            municipalities.setdefault((state_id, mun_id), record["mun_name"])
+
+            if record.get("neighborhood_id") is not None:
+                neighborhoods.setdefault((state_id, mun_id, int(record["neighborhood_id"])), record["neighborhood_name"])
+
+        # Nodes in level order, children grouped by parent
+        nodes = [(STATE, (state_id, 0, 0), states[state_id]) for state_id in sorted(states)]
+        nodes += [(MUNICIPALITY, (*key, 0), municipalities[key]) for key in sorted(municipalities)]
+        nodes += [(NEIGHBORHOOD, key, neighborhoods[key]) for key in sorted(neighborhoods)]
+
+        positions = {ids: i for i, (_, ids, _) in enumerate(nodes)}
+
+        columns = {name: array(typecode) for name, typecode in SECTIONS if typecode != "B"}
+        levels = bytearray()
+        names = bytearray()
+        keys = bytearray()
+
+        columns["first_children"].extend([-1] * len(nodes))
+        columns["n_children"].extend([0] * len(nodes))
+
+        for i, (level, ids, name) in enumerate(nodes):
+            levels.append(level)
+            columns["state_ids"].append(ids[0])
+            columns["mun_ids"].append(ids[1])
+            columns["neighborhood_ids"].append(ids[2])
+
+            # Parents are listed before their children, so the first child seen starts the range
+            if level == STATE:
+                parent = -1
+            elif level == MUNICIPALITY:
+                parent = positions[(ids[0], 0, 0)]
+            else:
+                parent = positions[(ids[0], ids[1], 0)]
+
+            columns["parents"].append(parent)
+
+            if parent >= 0:
+                if columns["first_children"][parent] < 0:
+                    columns["first_children"][parent] = i
+
+                columns["n_children"][parent] += 1
+
+            columns["name_offsets"].append(len(names))
+            names += name.encode("utf-8")
+
+            columns["key_offsets"].append(len(keys))
+            keys += normalize_name(name).encode("utf-8")
+
+        columns["name_offsets"].append(len(names))
+        columns["key_offsets"].append(len(keys))
+
+        # Nodes sorted by normalized name, then by level and ids
+        columns["sorted_nodes"].extend(sorted(range(len(nodes)), key = lambda i: (normalize_name(nodes[i][2]), nodes[i][0], nodes[i][1])))
+
+        # Open-addressing hash table with linear probing, at most half full
+        n_slots = 1
+
+        while n_slots < 2 * max(len(nodes), 1):
+            n_slots *= 2
+
+        slots = columns["slots"]
+        slots.extend([-1] * n_slots)
+
+        for i, (_, ids, _) in enumerate(nodes):
+            slot = hash_ids(*ids) & (n_slots - 1)
+
+            while slots[slot] >= 0:
+                slot = (slot + 1) & (n_slots - 1)
+
+            slots[slot] = i
+
+        sections = {}
+
+        for name, typecode in SECTIONS:
+            if typecode == "B":
+                data = {"levels": levels, "names": names, "keys": keys}[name]
+                sections[name] = memoryview(bytes(data))
+            else:
+                sections[name] = memoryview(columns[name])
+
+        index = cls(sections)
+        logger.info("Geography index built! (%s)", index.counts)
+
+        return index
+
+    @classmethod
+    def load(cls, path: str) -> "GeographyIndex":
+        """Memory-map an index saved with `GeographyIndex.save(...)`
+
+        Raises:
+            ValueError: If the file is not a geography index, or was saved by a machine with a different byte order.
+        """
+
+        with open(path, "rb") as file:
+            buffer = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+
+        try:
+            if buffer[:len(MAGIC)] != MAGIC:
+                raise ValueError("{0} is not a geography index!".format(path))
+
+            header_size, = struct.unpack_from("<I", buffer, len(MAGIC))
+            header = json.loads(bytes(buffer[len(MAGIC) + 4:len(MAGIC) + 4 + header_size]))
+
+            if header["version"] != FORMAT_VERSION:
+                raise ValueError("Unsupported geography index version {0}!".format(header["version"]))
+
+            if header["byteorder"] != sys.byteorder:
+                raise ValueError("The geography index was saved with a different byte order, build it again!")
+
+            view = memoryview(buffer)
+            sections = {}
+
+            for name, typecode in SECTIONS:
+                offset, size = header["sections"][name]
+                sections[name] = view[offset:offset + size].cast(typecode)
+
+            view.release()
+        except Exception:
+            buffer.close()
+            raise
+
+        return cls(sections, buffer = buffer)
+
+    def save(self, path: str) -> None:
+        """Save the index to a file that can be memory-mapped with `GeographyIndex.load(...)`
+        """
+
+        layout = {}
+        offset = 0
+
+        for name, _ in SECTIONS:
+            layout[name] = [offset, self.__sections[name].nbytes]
+            offset += -(-self.__sections[name].nbytes // ALIGNMENT) * ALIGNMENT
+
+        # The header size depends on the section offsets, which depend on the header size
+        header = {"version": FORMAT_VERSION, "byteorder": sys.byteorder, "sections": layout}
+        header_size = len(json.dumps(header)) + 64
+        start = -(-(len(MAGIC) + 4 + header_size) // ALIGNMENT) * ALIGNMENT
+
+        header["sections"] = {name: [section_offset + start, size] for name, (section_offset, size) in layout.items()}
+        header_bytes = json.dumps(header).encode("utf-8").ljust(start - len(MAGIC) - 4)
+
+        with open(path, "wb") as file:
+            file.write(MAGIC)
+            file.write(struct.pack("<I", len(header_bytes)))
+            file.write(header_bytes)
+
+            for name, _ in SECTIONS:
+                section = self.__sections[name]
+                file.write(section.cast("B") if section.format != "B" else section)
+                file.write(b"\0" * (-section.nbytes % ALIGNMENT))
+
+    def close(self) -> None:
+        """Release the memory map of a loaded index
+        """
+
+        if self.__buffer is None:
+            return
+
+        for section in self.__sections.values():
+            section.release()
+
+        self.__buffer.close()
+        self.__buffer = None
+
+    def __first_of_level(self, level: int) -> int:
+
+        # Nodes are sorted by level, binary search the first node of the level
+        low = 0
+        high = len(self)
+
+        while low < high:
+            middle = (low + high) // 2
+
+            if self.__levels[middle] < level:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def __find(self, state_id: int, mun_id: int = 0, neighborhood_id: int = 0) -> int:
+
+        state_id, mun_id, neighborhood_id = int(state_id), int(mun_id), int(neighborhood_id)
+        slot = hash_ids(state_id, mun_id, neighborhood_id) & self.__mask
+
+        while True:
+            node = self.__slots[slot]
+
+            if node < 0:
+                return -1
+
+            if self.__state_ids[node] == state_id and self.__mun_ids[node] == mun_id and self.__neighborhood_ids[node] == neighborhood_id:
+                return node
+
+            slot = (slot + 1) & self.__mask
+
+    def __node(self, node: int) -> Geography:
+
+        return Geography(
+            level = LEVEL_NAMES[self.__levels[node]],
+            state_id = self.__state_ids[node],
+            mun_id = self.__mun_ids[node],
+            neighborhood_id = self.__neighborhood_ids[node],
+            name = bytes(self.__names[self.__name_offsets[node]:self.__name_offsets[node + 1]]).decode("utf-8")
+        )
+
+    def __key(self, node: int) -> str:
+        return bytes(self.__keys[self.__key_offsets[node]:self.__key_offsets[node + 1]]).decode("utf-8")
+
+    def get(self, state_id: int, mun_id: int = 0, neighborhood_id: int = 0) -> Union[Geography, None]:
+        """Get a geography by its ids in O(1)
+
+        Returns:
+            Geography: The geography, or None if it's not in the index.
+        """
+
+        node = self.__find(state_id, mun_id, neighborhood_id)
+
+        return self.__node(node) if node >= 0 else None
+
+    def parent(self, geography: Geography) -> Union[Geography, None]:
+        """Get the parent of a geography (None for states)
+
+        Raises:
+            KeyError: If the geography is not in the index.
+        """
+
+        node = self.__require(geography)
+        parent = self.__parents[node]
+
+        return self.__node(parent) if parent >= 0 else None
+
+    def children(self, geography: Geography = None) -> list:
+        """Get the children of a geography (the states if geography is None)
+
+        Raises:
+            KeyError: If the geography is not in the index.
+        """
+
+        if geography is None:
+            return [self.__node(node) for node in range(self.__n_states)]
+
+        node = self.__require(geography)
+        first = self.__first_children[node]
+
+        if first < 0:
+            return []
+
+        return [self.__node(child) for child in range(first, first + self.__n_children[node])]
+
+    def __require(self, geography: Geography) -> int:
+
+        node = self.__find(geography.state_id, geography.mun_id, geography.neighborhood_id)
+
+        if node < 0:
+            raise KeyError((geography.state_id, geography.mun_id, geography.neighborhood_id))
+
+        return node
+
+    def search(self, prefix: str, level: str = None, within: Geography = None, limit: int = 20) -> list:
+        """Find the geographies whose name starts with a prefix, ignoring accents and case
+
+        Args:
+            prefix (str): Prefix of the name (e.g. "iztapa" or "ABALA").
+            level (str, optional): Level of the geographies ("state", "municipality" or "neighborhood"). Defaults to None (any level).
+            within (Geography, optional): Only return descendants of this geography. Defaults to None.
+            limit (int, optional): Maximum number of results. Defaults to 20 (None for no limit).
+
+        Raises:
+            ValueError: If the level is not valid.
+
+        Returns:
+            list: The geographies, sorted by name.
+        """
+
+        return self.__scan(normalize_name(prefix), level, within, limit, exact = False)
+
+    def resolve(self, name: str, level: str = None, within: Geography = None) -> list:
+        """Find the geographies with a name, ignoring accents and case (e.g. the municipalities named "Abalá")
+
+        Several geographies can share a name (e.g. neighborhoods named "Centro"), use `within` to narrow the results.
+
+        Returns:
+            list: The geographies, sorted by level and ids.
+        """
+
+        return self.__scan(normalize_name(name), level, within, None, exact = True)
+
+    def __scan(self, key: str, level: Union[str, None], within: Union[Geography, None], limit: Union[int, None], exact: bool) -> list:
+
+        if level is not None and level not in LEVEL_NAMES:
+            raise ValueError("The level must be one of state, municipality or neighborhood!")
+
+        level_code = LEVEL_NAMES.index(level) if level is not None else None
+
+        # Binary search the first name greater or equal than the key
+        low = 0
+        high = len(self)
+
+        while low < high:
+            middle = (low + high) // 2
+
+            if self.__key(self.__sorted_nodes[middle]) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        results = []
+
+        for position in range(low, len(self)):
+            node = self.__sorted_nodes[position]
+            node_key = self.__key(node)
+
+            if not node_key.startswith(key) or (exact and node_key != key):
+                break
+
+            if level_code is not None and self.__levels[node] != level_code:
+                continue
+
+            if within is not None and not self.__is_within(node, within):
+                continue
+
+            results.append(self.__node(node))
+
+            if limit is not None and len(results) >= limit:
+                break
+
+        return results
+
+    def __is_within(self, node: int, ancestor: Geography) -> bool:
+
+        if self.__state_ids[node] != ancestor.state_id:
+            return False
+
+        if ancestor.mun_id != 0 and self.__mun_ids[node] != ancestor.mun_id:
+            return False
+
+        if ancestor.neighborhood_id != 0 and self.__neighborhood_ids[node] != ancestor.neighborhood_id:
+            return False
+
+        # A geography is not within itself
+        return self.__levels[node] > LEVEL_NAMES.index(ancestor.level)
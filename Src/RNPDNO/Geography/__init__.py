@@ -0,0 +1 @@
+from .Core import GeographyIndex, Geography, normalize_name, LEVEL_NAMES
@@ -0,0 +1,557 @@
+from typing import Iterable
+
+import pymongo as pm
+from pymongo import UpdateOne
+
+import threading
+import sqlite3
+import json
+import logging
+import time
+import uuid
+
+# Init logger
+logger = logging.getLogger(__name__)
+
+# Unit of work statuses
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+# Fields that identify a unit of work
+UNIT_FIELDS = ("state_id", "mun_id", "neighborhood_id", "date_start", "date_end")
+
+# Optional field with the additional filters of a unit of work (e.g. {"idEstatusVictima": "7"})
+FILTERS_FIELD = "filters"
+
+# Field with the id of the claim holding a unit of work of a MongoLedger
+CLAIM_FIELD = "claim_id"
+
+def unit_filters(unit: dict) -> dict:
+    """Get the additional filters of a unit of work
+
+    Filter values are coerced as strings, since they are sent as form data, and sorted by name.
+
+    Returns:
+        dict: The filters (empty if the unit has none).
+    """
+
+    filters = unit.get(FILTERS_FIELD) or {}
+
+    return {str(name): str(filters[name]) for name in sorted(filters)}
+
+def unit_document(unit: dict) -> dict:
+    """Copy the fields that identify a unit of work. The filters field is only copied if the unit has filters.
+    """
+
+    document = {field: unit.get(field) for field in UNIT_FIELDS}
+    filters = unit_filters(unit)
+
+    if filters:
+        document[FILTERS_FIELD] = filters
+
+    return document
+
+def unit_key(unit: dict) -> str:
+    """Build the key of a unit of work
+
+    Args:
+        unit (dict): A unit of work (a dict with the UNIT_FIELDS keys and, optionally, the filters field).
+
+    Returns:
+        str: The unit key.
+    """
+
+    key = "|".join("" if unit.get(field) is None else str(unit[field]) for field in UNIT_FIELDS)
+    filters = unit_filters(unit)
+
+    # Units without filters keep the same key they had before filters were supported
+    if filters:
+        key += "|" + json.dumps(filters, sort_keys = True, separators = (",", ":"))
+
+    return key
+
+class SQLiteLedger:
+    """Job ledger stored in a local SQLite file
+
+    The ledger records every unit of work of a crawl (a state, municipality, neighborhood and date range)
+    as pending, in-flight, done or failed, so an interrupted crawl can be resumed.
+    """
+
+    # Seconds after which a claim is considered abandoned by `Crawler.crawl_totals(...)`. None: the ledger is used by a
+    # single process, so units in flight when a crawl starts were left by an interrupted run.
+    CLAIM_TIMEOUT = None
+
+    def __init__(self, path: str) -> None:
+
+        self.__path = path
+        self.__lock = threading.Lock()
+
+        # The connection is shared by all threads, access is serialized with the lock
+        self.__conn = sqlite3.connect(path, check_same_thread = False)
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute(
+            "CREATE TABLE IF NOT EXISTS units ("
+            "key TEXT PRIMARY KEY, "
+            "state_id TEXT, "
+            "mun_id TEXT, "
+            "neighborhood_id TEXT, "
+            "date_start TEXT, "
+            "date_end TEXT, "
+            "filters TEXT, "
+            "status TEXT, "
+            "attempts INTEGER DEFAULT 0, "
+            "error TEXT, "
+            "updated_at REAL, "
+            "position INTEGER)"
+        )
+        self.__conn.execute("CREATE INDEX IF NOT EXISTS units_status ON units (status)")
+
+        # Ledgers created before filters (or positions) were supported
+        columns = [row[1] for row in self.__conn.execute("PRAGMA table_info(units)")]
+
+        if "filters" not in columns:
+            self.__conn.execute("ALTER TABLE units ADD COLUMN filters TEXT")
+
+        if "position" not in columns:
+            self.__conn.execute("ALTER TABLE units ADD COLUMN position INTEGER")
+
+        self.__conn.execute("CREATE INDEX IF NOT EXISTS units_status_position ON units (status, position)")
+        self.__conn.commit()
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    def add_units(self, units: Iterable[dict]) -> int:
+        """Register units of work as pending. Units already in the ledger are left untouched.
+
+        Units are claimed in the order they are added (e.g. the order of a `QueryPlan`).
+
+        Args:
+            units (Iterable[dict]): Units of work.
+
+        Returns:
+            int: Number of new units.
+        """
+
+        now = time.time()
+        rows = []
+
+        for unit in units:
+            filters = unit_filters(unit)
+            rows.append((unit_key(unit), *[unit.get(field) for field in UNIT_FIELDS], json.dumps(filters) if filters else None, PENDING, now))
+
+        with self.__lock:
+            # New units go after the units already in the ledger
+            position = self.__conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM units").fetchone()[0]
+
+            n_before = self.__conn.total_changes
+            self.__conn.executemany(
+                "INSERT OR IGNORE INTO units (key, state_id, mun_id, neighborhood_id, date_start, date_end, filters, status, updated_at, position) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(*row, position + i) for i, row in enumerate(rows)]
+            )
+            self.__conn.commit()
+
+            return self.__conn.total_changes - n_before
+
+    def claim(self, limit: int = 1) -> list:
+        """Mark pending units as in-flight and return them, in the order they were added
+
+        Args:
+            limit (int, optional): Maximum number of units to claim. Defaults to 1.
+
+        Returns:
+            list: The claimed units of work.
+        """
+
+        with self.__lock:
+            rows = self.__conn.execute(
+                "SELECT key, state_id, mun_id, neighborhood_id, date_start, date_end, filters FROM units WHERE status = ? ORDER BY position, key LIMIT ?",
+                (PENDING, limit)
+            ).fetchall()
+
+            self.__conn.executemany(
+                "UPDATE units SET status = ?, attempts = attempts + 1, updated_at = ? WHERE key = ?",
+                [(IN_FLIGHT, time.time(), row[0]) for row in rows]
+            )
+            self.__conn.commit()
+
+        return [self.__row_to_unit(row) for row in rows]
+
+    @staticmethod
+    def __row_to_unit(row: tuple) -> dict:
+
+        unit = dict(zip(UNIT_FIELDS, row[1:6]))
+
+        if row[6] is not None:
+            unit[FILTERS_FIELD] = json.loads(row[6])
+
+        return unit
+
+    def get_statuses(self, units: Iterable[dict]) -> list:
+        """Look up the status of units of work
+
+        Args:
+            units (Iterable[dict]): Units of work.
+
+        Returns:
+            list: The status of each unit, or None if the unit is not in the ledger.
+        """
+
+        keys = [unit_key(unit) for unit in units]
+        statuses = {}
+
+        with self.__lock:
+            # Stay below SQLite's limit of host parameters
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = self.__conn.execute(
+                    "SELECT key, status FROM units WHERE key IN ({0})".format(", ".join("?" for _ in chunk)),
+                    chunk
+                ).fetchall()
+                statuses.update(rows)
+
+        return [statuses.get(key) for key in keys]
+
+    def mark_done(self, unit: dict) -> None:
+
+        with self.__lock:
+            self.__conn.execute("UPDATE units SET status = ?, error = NULL, updated_at = ? WHERE key = ?", (DONE, time.time(), unit_key(unit)))
+            self.__conn.commit()
+
+    def mark_failed(self, unit: dict, error: str = None) -> None:
+
+        with self.__lock:
+            self.__conn.execute("UPDATE units SET status = ?, error = ?, updated_at = ? WHERE key = ?", (FAILED, error, time.time(), unit_key(unit)))
+            self.__conn.commit()
+
+    def reset(self, statuses: Iterable[str] = (IN_FLIGHT, FAILED), claim_timeout: float = None) -> int:
+        """Return units to pending, e.g. in-flight units after a crash or failed units to retry them
+
+        Args:
+            statuses (Iterable[str], optional): Statuses of the units to reset. Defaults to in-flight and failed.
+            claim_timeout (float, optional): Only reset in-flight units claimed more than this number of seconds ago. Defaults to None (all of them).
+
+        Returns:
+            int: Number of units returned to pending.
+        """
+
+        now = time.time()
+        statuses = tuple(statuses)
+        other_statuses = tuple(status for status in statuses if status != IN_FLIGHT)
+        n_reset = 0
+
+        with self.__lock:
+            if len(other_statuses) > 0:
+                cursor = self.__conn.execute(
+                    "UPDATE units SET status = ?, updated_at = ? WHERE status IN ({0})".format(", ".join("?" for _ in other_statuses)),
+                    (PENDING, now, *other_statuses)
+                )
+                n_reset += cursor.rowcount
+
+            if IN_FLIGHT in statuses:
+                # updated_at of an in-flight unit is the time it was claimed
+                cursor = self.__conn.execute(
+                    "UPDATE units SET status = ?, updated_at = ? WHERE status = ? AND updated_at < ?",
+                    (PENDING, now, IN_FLIGHT, now - claim_timeout if claim_timeout is not None else float("inf"))
+                )
+                n_reset += cursor.rowcount
+
+            self.__conn.commit()
+
+        return n_reset
+
+    def counts(self) -> dict:
+        """Number of units by status
+        """
+
+        with self.__lock:
+            rows = self.__conn.execute("SELECT status, COUNT(*) FROM units GROUP BY status").fetchall()
+
+        return {PENDING: 0, IN_FLIGHT: 0, DONE: 0, FAILED: 0, **dict(rows)}
+
+    def close(self) -> None:
+
+        with self.__lock:
+            self.__conn.close()
+
+class MemoryLedger:
+    """Job ledger kept in memory
+
+    Same interface as SQLiteLedger. Used to run a small, self-contained list of units of work (e.g. a shard)
+    through `Crawler.crawl_totals(...)`. Units are claimed in the order they were added.
+    """
+
+    CLAIM_TIMEOUT = None
+
+    def __init__(self, units: Iterable[dict] = ()) -> None:
+
+        self.__lock = threading.Lock()
+        self.__units = {}
+        self.__statuses = {}
+        self.__errors = {}
+        self.__claimed_at = {}
+
+        self.add_units(units)
+
+    def add_units(self, units: Iterable[dict]) -> int:
+
+        n_new = 0
+
+        with self.__lock:
+            for unit in units:
+                key = unit_key(unit)
+
+                if key not in self.__units:
+                    self.__units[key] = unit_document(unit)
+                    self.__statuses[key] = PENDING
+                    n_new += 1
+
+        return n_new
+
+    def claim(self, limit: int = 1) -> list:
+
+        with self.__lock:
+            keys = [key for key, status in self.__statuses.items() if status == PENDING][:limit]
+            now = time.time()
+
+            for key in keys:
+                self.__statuses[key] = IN_FLIGHT
+                self.__claimed_at[key] = now
+
+            return [dict(self.__units[key]) for key in keys]
+
+    def get_statuses(self, units: Iterable[dict]) -> list:
+
+        with self.__lock:
+            return [self.__statuses.get(unit_key(unit)) for unit in units]
+
+    def mark_done(self, unit: dict) -> None:
+
+        with self.__lock:
+            self.__statuses[unit_key(unit)] = DONE
+
+    def mark_failed(self, unit: dict, error: str = None) -> None:
+
+        with self.__lock:
+            self.__statuses[unit_key(unit)] = FAILED
+            self.__errors[unit_key(unit)] = error
+
+    def reset(self, statuses: Iterable[str] = (IN_FLIGHT, FAILED), claim_timeout: float = None) -> int:
+
+        statuses = tuple(statuses)
+        claimed_before = time.time() - claim_timeout if claim_timeout is not None else float("inf")
+
+        with self.__lock:
+            keys = [
+                key for key, status in self.__statuses.items()
+                if status in statuses and (status != IN_FLIGHT or self.__claimed_at.get(key, 0) < claimed_before)
+            ]
+
+            for key in keys:
+                self.__statuses[key] = PENDING
+
+            return len(keys)
+
+    def counts(self) -> dict:
+
+        counts = {PENDING: 0, IN_FLIGHT: 0, DONE: 0, FAILED: 0}
+
+        with self.__lock:
+            for status in self.__statuses.values():
+                counts[status] += 1
+
+        return counts
+
+    def units(self, status: str) -> list:
+        """Units of work with a given status
+        """
+
+        with self.__lock:
+            return [dict(self.__units[key], error = self.__errors.get(key)) for key, unit_status in self.__statuses.items() if unit_status == status]
+
+class MongoLedger:
+    """Job ledger stored in a MongoDB collection
+
+    Same interface as SQLiteLedger. Units are claimed atomically (a conditional `update_many` tagging the units with a
+    claim id), so several processes can share the same ledger.
+    """
+
+    # Units claimed by other processes are in flight while they run, only claims older than an hour are abandoned
+    CLAIM_TIMEOUT = 3600.0
+
+    def __init__(self, collection: pm.collection.Collection) -> None:
+
+        self.__collection = collection
+        self.__collection.create_index([("status", pm.ASCENDING), ("position", pm.ASCENDING)])
+        self.__collection.create_index(CLAIM_FIELD, sparse = True)
+
+    @property
+    def collection(self) -> pm.collection.Collection:
+        return self.__collection
+
+    def add_units(self, units: Iterable[dict], batch_size: int = 1000) -> int:
+        """Register units of work as pending. Units already in the ledger are left untouched.
+
+        Units are claimed in the order they are added (e.g. the order of a `QueryPlan`). Units added at the same time by
+        several processes are interleaved.
+
+        Args:
+            units (Iterable[dict]): Units of work.
+            batch_size (int, optional): Number of units sent per bulk write. Defaults to 1000.
+
+        Returns:
+            int: Number of new units.
+        """
+
+        n_new = 0
+        operations = []
+
+        # New units go after the units already in the ledger
+        last = self.collection.find_one({"position": {"$ne": None}}, {"position": 1}, sort = [("position", pm.DESCENDING)])
+        position = last["position"] + 1 if last is not None else 0
+
+        for unit in units:
+            document = unit_document(unit)
+            document.update({"status": PENDING, "attempts": 0, "error": None, "updated_at": time.time(), "position": position})
+            position += 1
+
+            operations.append(UpdateOne({"_id": unit_key(unit)}, {"$setOnInsert": document}, upsert = True))
+
+            if len(operations) >= batch_size:
+                n_new += self.collection.bulk_write(operations, ordered = False).upserted_count
+                operations = []
+
+        if len(operations) > 0:
+            n_new += self.collection.bulk_write(operations, ordered = False).upserted_count
+
+        return n_new
+
+    def claim(self, limit: int = 1) -> list:
+        """Atomically mark pending units as in-flight and return them, in the order they were added
+
+        Candidate units are read, then claimed with a single `update_many` conditioned on them still being pending, which
+        tags them with a new claim id. Units claimed by another process in between are skipped, so fewer than `limit`
+        units may be returned. If every candidate was taken by another process, new candidates are read, so no units
+        are only returned when none are pending.
+
+        Args:
+            limit (int, optional): Maximum number of units to claim. Defaults to 1.
+
+        Returns:
+            list: The claimed units of work (empty if there are no pending units).
+        """
+
+        while True:
+            keys = [document["_id"] for document in self.collection.find({"status": PENDING}, {"_id": 1}, sort = [("position", pm.ASCENDING), ("_id", pm.ASCENDING)], limit = limit)]
+
+            if len(keys) == 0:
+                return []
+
+            claim_id = uuid.uuid4().hex
+
+            result = self.collection.update_many(
+                {"_id": {"$in": keys}, "status": PENDING},
+                {"$set": {"status": IN_FLIGHT, CLAIM_FIELD: claim_id, "updated_at": time.time()}, "$inc": {"attempts": 1}}
+            )
+
+            # Every candidate was claimed by another process, each retry means other processes made progress
+            if result.modified_count == 0:
+                logger.debug("The %s units read were claimed by another process, claiming again...", len(keys))
+                continue
+
+            # The claim id travels with the units, so only this claim can mark them as done or failed
+            return [{**unit_document(document), CLAIM_FIELD: claim_id} for document in self.collection.find({CLAIM_FIELD: claim_id}, sort = [("position", pm.ASCENDING), ("_id", pm.ASCENDING)])]
+
+    def get_statuses(self, units: Iterable[dict]) -> list:
+        """Look up the status of units of work
+
+        Args:
+            units (Iterable[dict]): Units of work.
+
+        Returns:
+            list: The status of each unit, or None if the unit is not in the ledger.
+        """
+
+        keys = [unit_key(unit) for unit in units]
+        statuses = {}
+
+        for i in range(0, len(keys), 1000):
+            for document in self.collection.find({"_id": {"$in": keys[i:i + 1000]}}, {"status": 1}):
+                statuses[document["_id"]] = document["status"]
+
+        return [statuses.get(key) for key in keys]
+
+    def mark_done(self, unit: dict) -> bool:
+        """Mark a unit of work as done
+
+        Units returned by `MongoLedger.claim(...)` are only updated while they are still held by that claim, so a worker
+        whose claim was requeued (see `MongoLedger.reset(...)`) doesn't overwrite the status set by the new claimant.
+
+        Returns:
+            bool: Was the unit updated?
+        """
+
+        return self.__mark(unit, {"status": DONE, "error": None, "updated_at": time.time()})
+
+    def mark_failed(self, unit: dict, error: str = None) -> bool:
+        """Mark a unit of work as failed, see `MongoLedger.mark_done(...)`
+        """
+
+        return self.__mark(unit, {"status": FAILED, "error": error, "updated_at": time.time()})
+
+    def __mark(self, unit: dict, update: dict) -> bool:
+
+        query = {"_id": unit_key(unit)}
+
+        if unit.get(CLAIM_FIELD) is not None:
+            query[CLAIM_FIELD] = unit[CLAIM_FIELD]
+
+        if self.collection.update_one(query, {"$set": update}).matched_count == 1:
+            return True
+
+        logger.warning("The claim of the unit of work %s was lost, its status was not updated.", query["_id"])
+
+        return False
+
+    def reset(self, statuses: Iterable[str] = (IN_FLIGHT, FAILED), claim_timeout: float = None) -> int:
+        """Return units to pending, e.g. in-flight units after a crash or failed units to retry them
+
+        Args:
+            statuses (Iterable[str], optional): Statuses of the units to reset. Defaults to in-flight and failed.
+            claim_timeout (float, optional): Only reset in-flight units claimed more than this number of seconds ago. Defaults to None (all of them).
+
+        Returns:
+            int: Number of units returned to pending.
+        """
+
+        now = time.time()
+        statuses = list(statuses)
+        conditions = []
+
+        if any(status != IN_FLIGHT for status in statuses):
+            conditions.append({"status": {"$in": [status for status in statuses if status != IN_FLIGHT]}})
+
+        if IN_FLIGHT in statuses:
+            # updated_at of an in-flight unit is the time it was claimed
+            if claim_timeout is None:
+                conditions.append({"status": IN_FLIGHT})
+            else:
+                conditions.append({"status": IN_FLIGHT, "updated_at": {"$lt": now - claim_timeout}})
+
+        if len(conditions) == 0:
+            return 0
+
+        result = self.collection.update_many({"$or": conditions}, {"$set": {"status": PENDING, "updated_at": now}, "$unset": {CLAIM_FIELD: ""}})
+
+        return result.modified_count
+
+    def counts(self) -> dict:
+        """Number of units by status
+        """
+
+        rows = self.collection.aggregate([{"$group": {"_id": "$status", "n": {"$sum": 1}}}])
+
+        return {PENDING: 0, IN_FLIGHT: 0, DONE: 0, FAILED: 0, **{row["_id"]: row["n"] for row in rows}}
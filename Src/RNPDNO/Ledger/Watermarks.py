@@ -0,0 +1,91 @@
+from typing import Union
+
+import pymongo as pm
+
+import threading
+import sqlite3
+import time
+
+def geography_key(state_id: str, mun_id: str = "0", neighborhood_id: str = "0") -> str:
+    """Build the key of a geography
+    """
+
+    return "{0}|{1}|{2}".format(state_id, mun_id, neighborhood_id)
+
+class SQLiteWatermarkStore:
+    """Last scrapped date per geography, stored in a local SQLite file
+
+    The watermark of a geography is the last day of the last date window scrapped for it.
+    Use a different store (file) for each set of `get_totals(...)` filters.
+    """
+
+    def __init__(self, path: str) -> None:
+
+        self.__path = path
+        self.__lock = threading.Lock()
+
+        # The connection is shared by all threads, access is serialized with the lock
+        self.__conn = sqlite3.connect(path, check_same_thread = False)
+        self.__conn.execute("CREATE TABLE IF NOT EXISTS watermarks (key TEXT PRIMARY KEY, date_end TEXT, updated_at REAL)")
+        self.__conn.commit()
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    def get(self, state_id: str, mun_id: str = "0", neighborhood_id: str = "0") -> Union[str, None]:
+        """Get the watermark of a geography
+
+        Returns:
+            str: Last scrapped date (dd/mm/yyyy).
+            None: If the geography has never been scrapped.
+        """
+
+        with self.__lock:
+            row = self.__conn.execute("SELECT date_end FROM watermarks WHERE key = ?", (geography_key(state_id, mun_id, neighborhood_id), )).fetchone()
+
+        return row[0] if row is not None else None
+
+    def set(self, date_end: str, state_id: str, mun_id: str = "0", neighborhood_id: str = "0") -> None:
+        """Set the watermark of a geography
+        """
+
+        with self.__lock:
+            self.__conn.execute(
+                "INSERT OR REPLACE INTO watermarks (key, date_end, updated_at) VALUES (?, ?, ?)",
+                (geography_key(state_id, mun_id, neighborhood_id), date_end, time.time())
+            )
+            self.__conn.commit()
+
+    def close(self) -> None:
+
+        with self.__lock:
+            self.__conn.close()
+
+class MongoWatermarkStore:
+    """Last scrapped date per geography, stored in a MongoDB collection
+
+    Same interface as SQLiteWatermarkStore.
+    """
+
+    def __init__(self, collection: pm.collection.Collection) -> None:
+
+        self.__collection = collection
+
+    @property
+    def collection(self) -> pm.collection.Collection:
+        return self.__collection
+
+    def get(self, state_id: str, mun_id: str = "0", neighborhood_id: str = "0") -> Union[str, None]:
+
+        document = self.collection.find_one({"_id": geography_key(state_id, mun_id, neighborhood_id)}, {"date_end": 1})
+
+        return document["date_end"] if document is not None else None
+
+    def set(self, date_end: str, state_id: str, mun_id: str = "0", neighborhood_id: str = "0") -> None:
+
+        self.collection.update_one(
+            {"_id": geography_key(state_id, mun_id, neighborhood_id)},
+            {"$set": {"date_end": date_end, "updated_at": time.time()}},
+            upsert = True
+        )
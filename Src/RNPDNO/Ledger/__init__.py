@@ -0,0 +1,2 @@
+from .Core import SQLiteLedger, MemoryLedger, MongoLedger, unit_key, unit_filters, UNIT_FIELDS, FILTERS_FIELD, CLAIM_FIELD, PENDING, IN_FLIGHT, DONE, FAILED
+from .Watermarks import SQLiteWatermarkStore, MongoWatermarkStore
@@ -0,0 +1,249 @@
+from typing import Iterable, Union
+from logging.handlers import QueueHandler, QueueListener
+
+import itertools
+import threading
+import logging
+import atexit
+import queue
+import json
+
+LOG_FORMAT = "%(asctime)s | %(levelname)7s @ %(filename)s : %(message)s"
+LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Attribute of the log records with the end-point label of a request (see `RNPDNO.Metrics.label_from_url`)
+ENDPOINT_FIELD = "endpoint"
+
+# Attributes every log record has, the other ones were passed with `extra`
+RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+class JSONFormatter(logging.Formatter):
+    """Formats log records as JSON documents, one per line
+
+    Documents have the keys `time`, `level`, `logger`, `message` and `exception` (if any), plus the fields passed
+    with `extra` (e.g. `endpoint`).
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+
+        document = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and not key.startswith("_"):
+                document[key] = value
+
+        if record.exc_info:
+            document["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(document, default = str, ensure_ascii = False)
+
+class EndpointSampler(logging.Filter):
+    """Keeps one in every N records of each end-point
+
+    Only records with an `endpoint` attribute below the WARNING level are sampled, warnings and errors are always kept.
+    Sampling is deterministic (a counter per end-point), so no lock or random number is needed.
+    """
+
+    def __init__(self, rates: dict = None, default_rate: float = 1.0) -> None:
+        """Create a new sampler
+
+        Args:
+            rates (dict, optional): Fraction of the records kept (between 0 and 1), by end-point label (e.g. {"/Sociodemograficos/Totales": 0.01}). Defaults to None.
+            default_rate (float, optional): Fraction of the records kept for other end-points. Defaults to 1.0 (all).
+        """
+
+        super().__init__()
+
+        self.__periods = {endpoint: self.__period(rate) for endpoint, rate in (rates or {}).items()}
+        self.__default_period = self.__period(default_rate)
+        self.__counters = {}
+
+    @staticmethod
+    def __period(rate: float) -> int:
+
+        # 0 means every record is dropped
+        if rate <= 0:
+            return 0
+
+        return max(1, round(1 / min(rate, 1.0)))
+
+    def filter(self, record: logging.LogRecord) -> bool:
+
+        endpoint = getattr(record, ENDPOINT_FIELD, None)
+
+        if endpoint is None or record.levelno >= logging.WARNING:
+            return True
+
+        period = self.__periods.get(endpoint, self.__default_period)
+
+        if period == 1:
+            return True
+
+        if period == 0:
+            return False
+
+        counter = self.__counters.get(endpoint)
+
+        if counter is None:
+            counter = self.__counters.setdefault(endpoint, itertools.count())
+
+        # next() on itertools.count is atomic
+        return next(counter) % period == 0
+
+class LazyQueueHandler(QueueHandler):
+    """Queue handler that leaves the formatting of messages to the listener thread
+
+    `QueueHandler` formats every message before enqueuing it, so records can be sent to another process. Records of a
+    `LogPipeline` stay in the process, so only messages with mutable arguments (which could change before the listener
+    formats them) are formatted by the logging thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+
+        args = record.args
+
+        if args:
+            values = args.values() if isinstance(args, dict) else args
+
+            if any(isinstance(value, (dict, list, set, bytearray)) for value in values):
+                record.msg = record.getMessage()
+                record.args = None
+
+        return record
+
+class LogPipeline:
+    """Loggers whose records are written by a background thread
+
+    A `LazyQueueHandler` is attached to every logger of the pipeline, so logging a record costs an append to a queue.
+    A `QueueListener` thread formats the records and writes them with the pipeline's handlers.
+    """
+
+    def __init__(self, handlers: Iterable[logging.Handler], sampler: EndpointSampler = None) -> None:
+
+        self.__queue = queue.SimpleQueue()
+        self.__handler = LazyQueueHandler(self.__queue)
+        self.__listener = QueueListener(self.__queue, *handlers, respect_handler_level = True)
+        self.__names = set()
+        self.__running = False
+
+        if sampler is not None:
+            self.__handler.addFilter(sampler)
+
+    @property
+    def names(self) -> frozenset:
+        """Names of the loggers of the pipeline
+        """
+        return frozenset(self.__names)
+
+    @property
+    def handlers(self) -> tuple:
+        return self.__listener.handlers
+
+    def start(self) -> None:
+
+        if not self.__running:
+            self.__listener.start()
+            self.__running = True
+
+    def attach(self, name: str) -> None:
+
+        logging.getLogger(name).addHandler(self.__handler)
+        self.__names.add(name)
+
+    def detach(self, name: str) -> None:
+
+        logging.getLogger(name).removeHandler(self.__handler)
+        self.__names.discard(name)
+
+    def stop(self) -> None:
+        """Detach the loggers and write the queued records
+        """
+
+        for name in list(self.__names):
+            self.detach(name)
+
+        if self.__running:
+            self.__listener.stop()
+            self.__running = False
+
+# Pipeline of each logger name
+_pipelines = {}
+_pipelines_lock = threading.Lock()
+
+def setup_logging(names: Union[str, Iterable[str]] = "RNPDNO", level: int = logging.INFO, json_format: bool = False, format: str = LOG_FORMAT, date_format: str = LOG_DATE_FORMAT, sample_rates: dict = None, default_sample_rate: float = 1.0, handlers: Iterable[logging.Handler] = None) -> LogPipeline:
+    """Write the records of loggers from a background thread
+
+    Loggers that already belonged to a pipeline are moved to the new one (pipelines left without loggers are stopped),
+    so calling this function again doesn't duplicate records. The loggers don't propagate their records to their parents.
+
+    Args:
+        names (str or Iterable[str], optional): Names of the loggers. Defaults to "RNPDNO" (every module of the package).
+        level (int, optional): Logging level of the loggers. Defaults to logging.INFO.
+        json_format (bool, optional): Should records be written as JSON documents (see `JSONFormatter`)? Defaults to False.
+        format (str, optional): Format of the records, if they are not written as JSON. Defaults to LOG_FORMAT.
+        date_format (str, optional): Format of the dates. Defaults to LOG_DATE_FORMAT.
+        sample_rates (dict, optional): Fraction of the records kept by end-point label (see `EndpointSampler`). Defaults to None.
+        default_sample_rate (float, optional): Fraction of the records kept for other end-points. Defaults to 1.0 (all).
+        handlers (Iterable[logging.Handler], optional): Handlers writing the records. Defaults to None (a handler writing to stderr).
+
+    Returns:
+        LogPipeline: The pipeline, stopped at exit.
+    """
+
+    names = [names] if isinstance(names, str) else list(names)
+
+    if json_format:
+        formatter = JSONFormatter(datefmt = date_format)
+    else:
+        formatter = logging.Formatter(fmt = format, datefmt = date_format)
+
+    handlers = list(handlers) if handlers is not None else [logging.StreamHandler()]
+
+    for handler in handlers:
+        if handler.formatter is None:
+            handler.setFormatter(formatter)
+
+    sampler = None
+
+    if sample_rates or default_sample_rate < 1:
+        sampler = EndpointSampler(sample_rates, default_rate = default_sample_rate)
+
+    pipeline = LogPipeline(handlers, sampler = sampler)
+    pipeline.start()
+
+    with _pipelines_lock:
+        for name in names:
+            previous = _pipelines.pop(name, None)
+
+            if previous is not None:
+                previous.detach(name)
+
+                if len(previous.names) == 0:
+                    previous.stop()
+
+            logger = logging.getLogger(name)
+            logger.setLevel(level)
+            logger.propagate = False
+
+            pipeline.attach(name)
+            _pipelines[name] = pipeline
+
+    return pipeline
+
+def stop_logging() -> None:
+    """Stop every pipeline, writing the queued records
+    """
+
+    with _pipelines_lock:
+        pipelines = set(_pipelines.values())
+        _pipelines.clear()
+
+    for pipeline in pipelines:
+        pipeline.stop()
+
+atexit.register(stop_logging)
@@ -0,0 +1 @@
+from .Core import setup_logging, stop_logging, LogPipeline, LazyQueueHandler, JSONFormatter, EndpointSampler, LOG_FORMAT, LOG_DATE_FORMAT, ENDPOINT_FIELD
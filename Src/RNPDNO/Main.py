@@ -0,0 +1,331 @@
+"""Command-line entry point of the RNPDNO Scrapper
+
+    rnpdno crawl nightly --workers 16 --rate-limit 20 --cache-dir /var/cache/rnpdno
+    rnpdno export totals totals.parquet --level municipality --partition-by state_id
+    rnpdno bench --latency 0.05 --output benchmarks.ndjson
+    rnpdno index geography.idx --search "iztapalapa"
+
+Only the standard library is imported at startup. The Scrapper (and requests, pymongo, pyarrow...) is imported by
+the command that needs it, so `rnpdno --help` and argument errors are instant, which matters for cron jobs and containers.
+"""
+
+from typing import Union
+
+import argparse
+import logging
+import json
+import sys
+import os
+
+# Init logger
+logger = logging.getLogger("RNPDNO")
+
+def parse_states(value: str) -> list:
+    """Parse a comma separated list of state ids (e.g. "9,15")
+    """
+
+    return [state_id.strip() for state_id in value.split(",") if state_id.strip()]
+
+def parse_filter(value: str) -> tuple:
+    """Parse a NAME=VALUE filter
+    """
+
+    name, separator, filter_value = value.partition("=")
+
+    if separator == "" or name == "":
+        raise argparse.ArgumentTypeError("Filters must be written as NAME=VALUE!")
+
+    return name, filter_value
+
+def parse_sample_rate(value: str) -> tuple:
+    """Parse an ENDPOINT=RATE log sampling rate (e.g. "/Sociodemograficos/Totales=0.01")
+    """
+
+    endpoint, separator, rate = value.rpartition("=")
+
+    try:
+        rate = float(rate)
+    except ValueError:
+        rate = None
+
+    if separator == "" or endpoint == "" or rate is None or not 0 <= rate <= 1:
+        raise argparse.ArgumentTypeError("Sampling rates must be written as ENDPOINT=RATE, with a rate between 0 and 1!")
+
+    return endpoint, rate
+
+def add_scrapper_arguments(parser: argparse.ArgumentParser) -> None:
+
+    group = parser.add_argument_group("parallelism")
+    group.add_argument("-w", "--workers", type = int, default = 8, help = "Maximum number of requests in flight (default: 8).")
+    group.add_argument("--rate-limit", type = float, default = None, metavar = "RPS", help = "Maximum number of requests per second (default: no limit).")
+    group.add_argument("--burst", type = int, default = 1, help = "Number of requests sent at once after an idle period (default: 1).")
+    group.add_argument("--sessions", type = int, default = None, help = "Number of pre-warmed sessions, re-initialized in the background when their cookie expires (default: a single session).")
+
+    group = parser.add_argument_group("requests")
+    group.add_argument("--cache-dir", default = None, help = "Directory of a persistent response cache (default: no cache).")
+    group.add_argument("--cache-entries", type = int, default = 100000, help = "Maximum number of cached responses (default: 100000).")
+    group.add_argument("--metrics-port", type = int, default = None, help = "Serve Prometheus metrics on this port (default: disabled).")
+
+    group = parser.add_argument_group("queries")
+    group.add_argument("--states", type = parse_states, default = None, help = "Comma separated ids of the states to crawl (default: all).")
+    group.add_argument("--date-start", default = "", help = "Start date of the queries (dd/mm/yyyy).")
+    group.add_argument("--date-end", default = "", help = "End date of the queries (dd/mm/yyyy).")
+    group.add_argument("--filter", dest = "filters", type = parse_filter, action = "append", default = [], metavar = "NAME=VALUE", help = "Additional filter sent with every query (e.g. idEstatusVictima=7). Can be repeated.")
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the parser of the command-line arguments
+    """
+
+    parser = argparse.ArgumentParser(prog = "rnpdno", description = "Scrapper of the public version of the RNPDNO.")
+    parser.add_argument("--log-level", default = "INFO", choices = ("DEBUG", "INFO", "WARNING", "ERROR"), help = "Logging level (default: INFO).")
+    parser.add_argument("--log-json", action = "store_true", help = "Write log records as JSON documents.")
+    parser.add_argument("--log-sample", dest = "log_sample_rates", type = parse_sample_rate, action = "append", default = [], metavar = "ENDPOINT=RATE", help = "Fraction of the request log records kept for an end-point (e.g. /Sociodemograficos/Totales=0.01). Can be repeated.")
+    parser.add_argument("--log-sample-rate", type = float, default = 1.0, metavar = "RATE", help = "Fraction of the request log records kept for the other end-points (default: 1).")
+
+    commands = parser.add_subparsers(dest = "command", metavar = "COMMAND")
+    commands.required = True
+
+    # rnpdno crawl
+    crawl = commands.add_parser("crawl", help = "Run a crawl profile, writing records to the target DB.", description = "Run a crawl profile (national-totals, municipality-neighborhoods, nightly, yearly-series or one defined in SCRAPPER_CRAWL_PROFILES).")
+    crawl.add_argument("profile", nargs = "?", default = None, help = "Name of the crawl profile.")
+    crawl.add_argument("--list-profiles", action = "store_true", help = "List the crawl profiles and exit.")
+    add_scrapper_arguments(crawl)
+
+    group = crawl.add_argument_group("storage")
+    group.add_argument("--sink", default = None, metavar = "COLLECTION", help = "Target DB collection (default: the profile's collection).")
+    group.add_argument("--no-sink", action = "store_true", help = "Discard the records (e.g. to warm a response cache).")
+    group.add_argument("--delta", action = "store_true", help = "Write only new or changed records, as versions.")
+    group.add_argument("--batch-size", type = int, default = None, help = "Number of records written at once (default: SCRAPPER_SINK_BATCH_SIZE, or 1000).")
+    group.add_argument("--ledger-path", default = None, help = "Local SQLite job ledger (default: the profile's ledger in the config DB).")
+    group.add_argument("--watermarks-path", default = None, help = "Local SQLite watermark store of incremental profiles (default: the profile's store in the config DB).")
+    group.add_argument("--until", default = None, help = "Last day scrapped by incremental profiles (dd/mm/yyyy, default: yesterday).")
+
+    # rnpdno export
+    export = commands.add_parser("export", help = "Export the catalogue, live totals or a target DB collection to a file.")
+    export.add_argument("source", choices = ("catalogue", "totals", "collection"), help = "What to export.")
+    export.add_argument("path", help = "Output file, or output directory if --partition-by is supplied.")
+    export.add_argument("--collection", default = None, help = "Target DB collection exported by the collection source.")
+    export.add_argument("--format", default = None, choices = ("parquet", "csv", "ndjson"), help = "Output format (default: inferred from the path, or parquet).")
+    export.add_argument("--partition-by", default = None, help = "Field used to partition the records (e.g. state_id).")
+    export.add_argument("--max-open-files", type = int, default = 64, help = "Maximum number of partition files open at once (default: 64).")
+    export.add_argument("--chunk-size", type = int, default = 10000, help = "Number of records written at once (default: 10000).")
+    export.add_argument("--level", default = "municipality", choices = ("state", "municipality", "neighborhood"), help = "Geographic level of the catalogue and totals sources (default: municipality).")
+    export.add_argument("--percentages", action = "store_true", help = "Add the percentages to the totals source.")
+    add_scrapper_arguments(export)
+
+    # rnpdno index
+    index = commands.add_parser("index", help = "Build a geography index from the catalogue, or search a saved one.")
+    index.add_argument("path", help = "Index file.")
+    index.add_argument("--search", default = None, metavar = "NAME", help = "Search the saved index by name prefix (accent and case insensitive) instead of building it.")
+    index.add_argument("--level", default = None, choices = ("state", "municipality", "neighborhood"), help = "Level of the searched geographies (default: any). When building, municipality skips the neighborhoods.")
+    index.add_argument("--limit", type = int, default = 20, help = "Maximum number of search results (default: 20).")
+    add_scrapper_arguments(index)
+
+    # rnpdno bench
+    bench = commands.add_parser("bench", help = "Run the offline benchmarks against a fake RNPDNO server.")
+    bench.add_argument("--states", type = int, default = 32, help = "Number of states of the fake catalogue (default: 32).")
+    bench.add_argument("--municipalities", type = int, default = 10, help = "Number of municipalities per state (default: 10).")
+    bench.add_argument("--neighborhoods", type = int, default = 20, help = "Number of neighborhoods per municipality (default: 20).")
+    bench.add_argument("--latency", type = float, default = 0.0, help = "Latency of the fake server in seconds (default: 0).")
+    bench.add_argument("--error-rate", type = float, default = 0.0, help = "Error rate of the fake server (default: 0).")
+    bench.add_argument("-w", "--workers", type = int, default = 8, help = "Maximum number of requests in flight (default: 8).")
+    bench.add_argument("--level", default = "municipality", choices = ("state", "municipality", "neighborhood"), help = "Geographic level of the totals crawl (default: municipality).")
+    bench.add_argument("--no-memory", action = "store_true", help = "Don't measure the peak memory of the crawls.")
+    bench.add_argument("--output", default = None, help = "Append the results to this newline-delimited JSON file.")
+
+    return parser
+
+def logging_options(args: argparse.Namespace) -> dict:
+    """Build the logging arguments of `Scrapper.create_logger(...)` and `RNPDNO.Log.setup_logging(...)`
+    """
+
+    return {
+        "json_format": args.log_json,
+        "sample_rates": dict(args.log_sample_rates),
+        "default_sample_rate": args.log_sample_rate
+    }
+
+def create_scrapper(args: argparse.Namespace):
+    """Bootstrap a Scrapper with the session pool, response cache and metrics of the arguments
+
+    The retry policy and rate limiter are set from the configuration variables by `Scrapper.load_config()`.
+    """
+
+    from RNPDNO.Crawler import bootstrap_scrapper
+
+    scrapper = bootstrap_scrapper(level = getattr(logging, args.log_level), **logging_options(args))
+
+    if args.sessions is not None:
+        scrapper.create_session_pool(size = args.sessions, max_workers = args.workers)
+
+    if args.cache_dir is not None:
+        os.makedirs(args.cache_dir, exist_ok = True)
+        scrapper.create_response_cache(path = os.path.join(args.cache_dir, "responses.sqlite"), max_entries = args.cache_entries)
+
+    if args.metrics_port is not None:
+        scrapper.enable_metrics().serve(port = args.metrics_port)
+
+    return scrapper
+
+def run_crawl(args: argparse.Namespace) -> dict:
+
+    from RNPDNO.Crawler.Profiles import get_profiles, get_profile, run_profile
+
+    if args.list_profiles or args.profile is None:
+        # Built-in profiles only, listing them doesn't need the config DB
+        for name, profile in get_profiles().items():
+            print("{0:<28} {1}".format(name, profile.get("description", "")))
+
+        return {}
+
+    scrapper = create_scrapper(args)
+    profile = get_profile(args.profile, scrapper.config.get("SCRAPPER_CRAWL_PROFILES"))
+
+    options = {
+        "max_workers": args.workers,
+        "requests_per_second": args.rate_limit,
+        "burst": args.burst,
+        "state_ids": args.states,
+        "date_start": args.date_start,
+        "date_end": args.date_end,
+        "until": args.until,
+        "ledger_path": args.ledger_path,
+        "watermarks_path": args.watermarks_path,
+        **dict(args.filters)
+    }
+
+    if args.no_sink:
+        return run_profile(scrapper, profile, **options)
+
+    collection = args.sink if args.sink is not None else profile.get("sink", "totals")
+
+    if args.delta:
+        sink = scrapper.create_delta_sink(collection, batch_size = args.batch_size)
+    else:
+        sink = scrapper.create_sink(collection, batch_size = args.batch_size)
+
+    with sink:
+        return {**run_profile(scrapper, profile, sink = sink, **options), "sink": sink.stats}
+
+def infer_format(path: str, format: Union[str, None]) -> str:
+    """Infer the export format from the extension of the path (parquet if it's unknown)
+    """
+
+    if format is not None:
+        return format
+
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+
+    return {"csv": "csv", "ndjson": "ndjson", "jsonl": "ndjson"}.get(extension, "parquet")
+
+def run_export(args: argparse.Namespace) -> dict:
+
+    from RNPDNO.Export import export_records
+    from RNPDNO.Crawler import Crawler
+
+    if args.source == "collection" and args.collection is None:
+        raise ValueError("The collection source requires --collection!")
+
+    scrapper = create_scrapper(args)
+
+    if args.source == "collection":
+        records = scrapper.target_db_conn[scrapper.TARGETDB_NAME][args.collection].find({}, {"_id": 0})
+    else:
+        crawler = Crawler(scrapper, max_workers = args.workers, requests_per_second = args.rate_limit, burst = args.burst)
+
+        if args.source == "catalogue":
+            records = crawler.iter_catalogue(state_ids = args.states, include_neighborhoods = args.level == "neighborhood")
+        else:
+            units = crawler.iter_totals_units(level = args.level, date_start = args.date_start, date_end = args.date_end, state_ids = args.states)
+            tables = crawler.iter_totals_tables(units, batch_size = args.chunk_size, output = "records", include_percentages = args.percentages, **dict(args.filters))
+            failed_units = []
+
+            def iter_records():
+                # Stream the records of each batch to the exporter, only one batch is kept in memory
+                for batch_records, batch_failed_units in tables:
+                    failed_units.extend(batch_failed_units)
+                    yield from batch_records
+
+            records = iter_records()
+
+    n_records = export_records(records, args.path, format = infer_format(args.path, args.format), chunk_size = args.chunk_size, partition_by = args.partition_by, max_open_files = args.max_open_files)
+
+    if args.source == "totals" and len(failed_units) > 0:
+        logger.warning("%s units of work failed and were not exported!", len(failed_units))
+
+    return {"exported": n_records, "path": args.path}
+
+def run_index(args: argparse.Namespace) -> dict:
+
+    from RNPDNO.Geography import GeographyIndex
+
+    if args.search is not None:
+        with GeographyIndex.load(args.path) as index:
+            return {"results": [geography._asdict() for geography in index.search(args.search, level = args.level, limit = args.limit)]}
+
+    from RNPDNO.Crawler import Crawler
+
+    scrapper = create_scrapper(args)
+    crawler = Crawler(scrapper, max_workers = args.workers, requests_per_second = args.rate_limit, burst = args.burst)
+
+    index = crawler.build_geography_index(state_ids = args.states, include_neighborhoods = args.level != "municipality")
+    index.save(args.path)
+
+    return {"path": args.path, "bytes": os.path.getsize(args.path), **index.counts}
+
+def run_bench(args: argparse.Namespace) -> dict:
+
+    from RNPDNO.Bench import run_benchmarks, append_results
+
+    results = run_benchmarks(
+        n_states = args.states,
+        n_municipalities = args.municipalities,
+        n_neighborhoods = args.neighborhoods,
+        latency = args.latency,
+        error_rate = args.error_rate,
+        max_workers = args.workers,
+        level = args.level,
+        trace_memory = not args.no_memory
+    )
+
+    if args.output is not None:
+        append_results(args.output, results)
+
+    return results
+
+COMMANDS = {"crawl": run_crawl, "export": run_export, "index": run_index, "bench": run_bench}
+
+def main(argv: list = None) -> int:
+    """Run the command-line interface
+
+    Args:
+        argv (list, optional): Command-line arguments. Defaults to None (sys.argv).
+
+    Returns:
+        int: Exit status.
+    """
+
+    args = build_parser().parse_args(argv)
+
+    from RNPDNO.Log import setup_logging, LOG_FORMAT, LOG_DATE_FORMAT
+
+    # Records of the package are written by a background thread, other libraries log through the root logger
+    logging.basicConfig(level = getattr(logging, args.log_level), format = LOG_FORMAT, datefmt = LOG_DATE_FORMAT)
+    setup_logging("RNPDNO", level = getattr(logging, args.log_level), **logging_options(args))
+
+    try:
+        result = COMMANDS[args.command](args)
+    except KeyboardInterrupt:
+        logger.warning("Interrupted!")
+        return 130
+    except Exception as e:
+        logger.error("The %s command failed: %s", args.command, e, exc_info = args.log_level == "DEBUG")
+        return 1
+
+    if result:
+        print(json.dumps(result, indent = 2, default = str))
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
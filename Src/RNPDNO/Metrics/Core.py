@@ -0,0 +1,269 @@
+from typing import Union
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from bisect import bisect_left
+
+import threading
+import logging
+import json
+import math
+import time
+import os
+
+# Init logger
+logger = logging.getLogger(__name__)
+
+# Upper bounds (in seconds) of the latency histogram buckets
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Type, label names and help string of each metric
+METRICS = {
+    "rnpdno_requests_total": ("counter", ("endpoint", "status"), "Responses received."),
+    "rnpdno_request_retries_total": ("counter", ("endpoint", ), "Retried requests."),
+    "rnpdno_request_errors_total": ("counter", ("endpoint", "error"), "Requests that failed without a response."),
+    "rnpdno_coalesced_requests_total": ("counter", ("endpoint", ), "Requests answered by an identical request in flight."),
+    "rnpdno_request_bytes_total": ("counter", ("endpoint", ), "Bytes sent in request bodies."),
+    "rnpdno_response_bytes_total": ("counter", ("endpoint", ), "Bytes received in response bodies."),
+    "rnpdno_requests_in_flight": ("gauge", ("endpoint", ), "Requests waiting for a response."),
+    "rnpdno_request_duration_seconds": ("histogram", ("endpoint", ), "Request latency in seconds."),
+    "rnpdno_json_decode_seconds": ("histogram", ("endpoint", ), "JSON decoding time of responses in seconds."),
+    "rnpdno_sink_flush_seconds": ("histogram", ("collection", ), "Sink flush time in seconds."),
+    "rnpdno_sink_records_total": ("counter", ("collection", ), "Records written by sinks."),
+}
+
+class Histogram:
+    """Cumulative histogram with fixed buckets
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple) -> None:
+
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self) -> dict:
+
+        cumulative = []
+        total = 0
+
+        for upper_bound, count in zip((*self.buckets, math.inf), self.counts):
+            total += count
+            cumulative.append([upper_bound if upper_bound != math.inf else "+Inf", total])
+
+        return {"buckets": cumulative, "sum": self.sum, "count": self.count}
+
+class Metrics:
+    """Registry of the metrics of a crawl
+
+    Counters, gauges and histograms are keyed by name and label values (see METRICS), e.g. the end-point path.
+    Updates are thread-safe. The registry can be exported in the Prometheus text format (see `Metrics.serve(...)`) or
+    as a JSON snapshot (see `Metrics.write_snapshots(...)`).
+
+    Metrics are enabled with `Scrapper.enable_metrics(...)`. Until then, the Scrapper and the sinks it creates skip every
+    measurement.
+    """
+
+    def __init__(self, latency_buckets: tuple = DEFAULT_LATENCY_BUCKETS) -> None:
+        """Create a new registry
+
+        Args:
+            latency_buckets (tuple, optional): Sorted upper bounds (in seconds) of the histogram buckets. Defaults to DEFAULT_LATENCY_BUCKETS.
+        """
+
+        self.__latency_buckets = tuple(latency_buckets)
+        self.__counters = {}
+        self.__gauges = {}
+        self.__histograms = {}
+        self.__lock = threading.Lock()
+        self.__started_at = time.time()
+
+    def inc(self, name: str, labels: tuple, value: float = 1) -> None:
+        """Increase a counter
+        """
+
+        key = (name, labels)
+
+        with self.__lock:
+            self.__counters[key] = self.__counters.get(key, 0) + value
+
+    def add(self, name: str, labels: tuple, value: float) -> None:
+        """Add a (possibly negative) value to a gauge
+        """
+
+        key = (name, labels)
+
+        with self.__lock:
+            self.__gauges[key] = self.__gauges.get(key, 0) + value
+
+    def observe(self, name: str, labels: tuple, value: float) -> None:
+        """Record a value in a histogram
+        """
+
+        key = (name, labels)
+
+        with self.__lock:
+            histogram = self.__histograms.get(key)
+
+            if histogram is None:
+                histogram = self.__histograms[key] = Histogram(self.__latency_buckets)
+
+            histogram.observe(value)
+
+    def reset(self) -> None:
+
+        with self.__lock:
+            self.__counters.clear()
+            self.__gauges.clear()
+            self.__histograms.clear()
+            self.__started_at = time.time()
+
+    def snapshot(self) -> dict:
+        """Take a snapshot of every metric
+
+        Returns:
+            dict: Metric values by name and label values (joined with "|"), plus the snapshot time and the time the
+                registry was started (or reset).
+        """
+
+        snapshot = {"timestamp": time.time()}
+
+        with self.__lock:
+            snapshot["started_at"] = self.__started_at
+
+            for (name, labels), value in self.__counters.items():
+                snapshot.setdefault(name, {})["|".join(labels)] = value
+
+            for (name, labels), value in self.__gauges.items():
+                snapshot.setdefault(name, {})["|".join(labels)] = value
+
+            for (name, labels), histogram in self.__histograms.items():
+                snapshot.setdefault(name, {})["|".join(labels)] = histogram.snapshot()
+
+        return snapshot
+
+    @staticmethod
+    def __format_labels(label_names: tuple, labels: str) -> str:
+
+        values = [value.replace("\\", "\\\\").replace("\"", "\\\"") for value in labels.split("|")]
+
+        return ",".join("{0}=\"{1}\"".format(name, value) for name, value in zip(label_names, values))
+
+    def to_prometheus(self) -> str:
+        """Export every metric in the Prometheus text format
+        """
+
+        snapshot = self.snapshot()
+        lines = []
+
+        for name, (metric_type, label_names, help_text) in METRICS.items():
+            if name not in snapshot:
+                continue
+
+            lines.append("# HELP {0} {1}".format(name, help_text))
+            lines.append("# TYPE {0} {1}".format(name, metric_type))
+
+            for label, value in snapshot[name].items():
+                labels = self.__format_labels(label_names, label)
+
+                if metric_type != "histogram":
+                    lines.append("{0}{{{1}}} {2}".format(name, labels, value))
+                    continue
+
+                for upper_bound, count in value["buckets"]:
+                    lines.append("{0}_bucket{{{1},le=\"{2}\"}} {3}".format(name, labels, upper_bound, count))
+
+                lines.append("{0}_sum{{{1}}} {2}".format(name, labels, value["sum"]))
+                lines.append("{0}_count{{{1}}} {2}".format(name, labels, value["count"]))
+
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int = 9100, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Serve the metrics in the Prometheus text format (at any path) from a daemon thread
+
+        Args:
+            port (int, optional): Port. Defaults to 9100.
+            host (str, optional): Address to bind. Defaults to "127.0.0.1".
+
+        Returns:
+            ThreadingHTTPServer: The server. Call `shutdown()` to stop it.
+        """
+
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+
+            def do_GET(self) -> None:
+
+                body = metrics.to_prometheus().encode("utf-8")
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                logger.debug(format, *args)
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target = server.serve_forever, daemon = True).start()
+
+        logger.info("Serving metrics at http://%s:%s/metrics", host, server.server_port)
+
+        return server
+
+    def write_snapshot(self, path: str) -> None:
+        """Write a JSON snapshot atomically (readers never see a partial file)
+        """
+
+        tmp_path = path + ".tmp"
+
+        with open(tmp_path, "w", encoding = "utf-8") as f:
+            json.dump(self.snapshot(), f)
+
+        os.replace(tmp_path, path)
+
+    def write_snapshots(self, path: str, interval: float = 60.0) -> threading.Event:
+        """Write a JSON snapshot every `interval` seconds from a daemon thread
+
+        Args:
+            path (str): Snapshot file, overwritten by every snapshot.
+            interval (float, optional): Seconds between snapshots. Defaults to 60.0.
+
+        Returns:
+            threading.Event: Set it to stop the thread (a last snapshot is written).
+        """
+
+        stop = threading.Event()
+
+        def run() -> None:
+
+            while not stop.wait(interval):
+                self.write_snapshot(path)
+
+            self.write_snapshot(path)
+
+        threading.Thread(target = run, daemon = True).start()
+
+        return stop
+
+def label_from_url(url: Union[str, None]) -> str:
+    """Use the path of a URL as the end-point label (e.g. "/Sociodemograficos/Totales")
+    """
+
+    if not url:
+        return ""
+
+    # Drop the scheme and host without the cost of a full URL parse
+    _, _, rest = url.partition("://")
+    path = "/" + rest.partition("/")[2] if rest else url
+
+    return path.partition("?")[0]
@@ -0,0 +1 @@
+from .Core import Metrics, Histogram, METRICS, DEFAULT_LATENCY_BUCKETS, label_from_url
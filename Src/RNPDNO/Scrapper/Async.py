@@ -0,0 +1,273 @@
+from urllib.parse import urlsplit
+
+from RNPDNO.Scrapper.Core import Scrapper
+
+import aiohttp
+import asyncio
+
+class AsyncScrapper:
+    """Asyncio transport for a Scrapper
+
+    The AsyncScrapper offers awaitable versions of the request methods of a `Scrapper`, so a single event loop
+    can have many requests in flight. Configuration, request templates, response formatting and logging are taken
+    from the wrapped `Scrapper`, which must have its configuration loaded.
+
+    Usage:
+        async with AsyncScrapper(scrapper) as async_scrapper:
+            await async_scrapper.initialize_requests_sessions()
+            totals = await asyncio.gather(*[async_scrapper.get_totals(state_id = str(i)) for i in range(1, 33)])
+    """
+
+    Exceptions = Scrapper.Exceptions
+
+    def __init__(self, scrapper: Scrapper, max_requests_per_host: int = 100, keepalive_timeout: float = 30.0, timeout: float = 60.0) -> None:
+        """Create a new async transport
+
+        Args:
+            scrapper (Scrapper): A Scrapper instance with its configuration loaded.
+            max_requests_per_host (int, optional): Maximum number of requests in flight per host. Defaults to 100.
+            keepalive_timeout (float, optional): Seconds an idle connection is kept open for reuse. Defaults to 30.0.
+            timeout (float, optional): Total timeout of each request in seconds. Defaults to 60.0.
+
+        Raises:
+            ValueError: If max_requests_per_host is not a positive number.
+        """
+
+        if max_requests_per_host < 1:
+            raise ValueError("The number of requests per host must be at least 1!")
+
+        self.__scrapper = scrapper
+        self.__max_requests_per_host = max_requests_per_host
+        self.__keepalive_timeout = keepalive_timeout
+        self.__timeout = timeout
+
+        self.__session = None
+        self.__session_created = False
+        self.__host_semaphores = {}
+
+    async def __aenter__(self) -> "AsyncScrapper":
+
+        await self.create_requests_session()
+
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+
+        await self.close()
+
+    @property
+    def scrapper(self) -> Scrapper:
+        """Wrapped Scrapper
+        """
+        return self.__scrapper
+
+    @property
+    def logger(self):
+
+        return self.scrapper.logger
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """AsyncScrapper aiohttp session
+
+        Returns:
+            aiohttp.ClientSession: AsyncScrapper aiohttp session.
+        """
+
+        self.check_session_created()
+
+        return self.__session
+
+    def check_session_created(self, error: bool = True) -> bool:
+        """Check if instance aiohttp session has been created
+
+        Args:
+            error (bool, optional): Should an exception be raised if the aiohttp session has not been created?. Defaults to True.
+
+        Raises:
+            Scrapper.Exceptions.SessionNotCreated: If the aiohttp session is not created and error is set to True.
+
+        Returns:
+            bool: aiohttp session has been created?
+        """
+
+        if self.__session_created:
+            return True
+        elif error:
+            raise self.Exceptions.SessionNotCreated("The aiohttp session must be created first via the create_requests_session method!")
+        else:
+            return False
+
+    def __before_request_checks(self) -> None:
+
+        self.scrapper.check_config_loaded()
+        self.check_session_created()
+
+    def __get_host_semaphore(self, url: str) -> asyncio.Semaphore:
+
+        host = urlsplit(url).netloc
+
+        if host not in self.__host_semaphores:
+            self.__host_semaphores[host] = asyncio.Semaphore(self.__max_requests_per_host)
+
+        return self.__host_semaphores[host]
+
+    async def create_requests_session(self) -> None:
+        """Create an aiohttp session.
+
+        The session keeps connections alive between requests and stores the cookies set by the server.
+        It must be created from within a running event loop.
+        """
+
+        self.logger.info("Creating new aiohttp session...")
+
+        connector = aiohttp.TCPConnector(limit_per_host = self.__max_requests_per_host, keepalive_timeout = self.__keepalive_timeout)
+        self.__session = aiohttp.ClientSession(connector = connector, timeout = aiohttp.ClientTimeout(total = self.__timeout))
+        self.__session_created = True
+
+        self.logger.info("Session created!")
+
+    async def close(self) -> None:
+        """Close the aiohttp session and its connections.
+        """
+
+        if self.__session is not None:
+            await self.__session.close()
+
+        self.__session = None
+        self.__session_created = False
+        self.__host_semaphores = {}
+
+    async def send_request(self, method: str, url: str, **kwargs) -> aiohttp.ClientResponse:
+        """Send a request.
+
+        This method is the awaitable version of `Scrapper.send_request(...)`. The response body is read before
+        returning, so the connection is released to the pool and `await response.json(...)` can be called later.
+
+        Additional arguments can be passed to `ClientSession.request(...)`.
+
+        Args:
+            method (str): HTTP method to be used.
+            url (str): Target URL of the request.
+
+        Raises:
+            Scrapper.Exceptions.UnsuccessfulRequest: If the server responded with a status code different from a successful response.
+
+        Returns:
+            aiohttp.ClientResponse: Response object generated by the request.
+        """
+
+        self.logger.info("Sending %s request to %s...", method, url)
+
+        self.check_session_created()
+
+        async with self.__get_host_semaphore(url):
+            async with self.session.request(method = method, url = url, **kwargs) as r:
+                await r.read()
+
+        if r.status >= 400:
+            msg = "The server responded with an HTTP status code different from a successful response ({0})".format(r.status)
+            raise self.Exceptions.UnsuccessfulRequest(msg)
+
+        return r
+
+    async def send_request_from_template(self, template: dict, payload: dict = None) -> aiohttp.ClientResponse:
+        """Send a request using a request template
+
+        This method is the awaitable version of `Scrapper.send_request_from_template(...)`.
+
+        Args:
+            template (dict): A request template (as a python dict).
+            payload (dict, optional): A python dict used to update the template's payload object. Defaults to None.
+
+        Raises:
+            Scrapper.Exceptions.InvalidTemplate: If the user suplied an invalid template.
+            Scrapper.Exceptions.UnsuccessfulRequest: If the server responded with a status code different from a successful response.
+
+        Returns:
+            aiohttp.ClientResponse: Response object generated by the request.
+        """
+
+        request_method, request_url, request_payload = self.scrapper.prepare_request_from_template(template, payload)
+
+        r = await self.send_request(method = request_method, url = request_url, data = request_payload)
+
+        return r
+
+    async def initialize_requests_sessions(self) -> None:
+        """Initializes the AsyncScrapper's aiohttp session
+
+        See `Scrapper.initialize_requests_sessions()`. The dashboard index and home are requested in order,
+        so the session cookie is stored in the session's cookie jar before any other request is sent.
+        """
+
+        self.logger.info("Initializing aiohttp session...")
+        self.check_session_created()
+
+        template_index = self.scrapper.get_request_template(api_name = "dashboard", end_point = "index")
+        template_home = self.scrapper.get_request_template(api_name = "dashboard", end_point = "home")
+
+        # Send request to index page
+        self.logger.info("Requesting dashboard index...")
+        await self.send_request_from_template(template_index)
+        # Send request to home page
+        self.logger.info("Requesting dashboard home...")
+        await self.send_request_from_template(template_home)
+
+        self.logger.info("aiohttp session initialized!")
+
+    async def get_states_catalogue(self, drop_all: bool = False) -> list:
+
+        self.logger.info("Requesting states catalogue...")
+        self.__before_request_checks()
+
+        template = self.scrapper.get_request_template(api_name = "catalogue", end_point = "states")
+
+        r = await self.send_request_from_template(template)
+
+        # Get JSON
+        r_content_as_dict = await r.json(content_type = None)
+
+        return self.scrapper.format_catalogue(r_content_as_dict, drop_all = drop_all)
+
+    async def get_municipalities_catalogue(self, state_id: str, drop_all: bool = False) -> list:
+
+        self.logger.info("Requesting municipalities catalogue for the state id %s...", state_id)
+        self.__before_request_checks()
+
+        template = self.scrapper.get_request_template(api_name = "catalogue", end_point = "municipalities")
+
+        r = await self.send_request_from_template(template, payload = {"idEstado": state_id})
+
+        # Get JSON
+        r_content_as_dict = await r.json(content_type = None)
+
+        return self.scrapper.format_catalogue(r_content_as_dict, drop_all = drop_all)
+
+    async def get_neighborhood_catalogue(self, state_id: str, mun_id: str, drop_all: bool = False) -> list:
+
+        self.logger.info("Requesting neighborhood catalogue for the state id %s and municipality id %s...", state_id, mun_id)
+        self.__before_request_checks()
+
+        template = self.scrapper.get_request_template(api_name = "catalogue", end_point = "neighborhoods")
+
+        r = await self.send_request_from_template(template, payload = {"idEstado": state_id, "idMunicipio": mun_id})
+
+        # Get JSON
+        r_content_as_dict = await r.json(content_type = None)
+
+        return self.scrapper.format_catalogue(r_content_as_dict, drop_all = drop_all)
+
+    async def get_totals(self, state_id: str = "0", mun_id: str = "0", neighborhood_id: str = "0", date_start: str = "", date_end: str = "", **kwargs) -> dict:
+
+        self.logger.info("Requesting totals (state: %s, municipality: %s, neighborhood: %s)...", state_id, mun_id, neighborhood_id)
+        self.__before_request_checks()
+
+        template = self.scrapper.get_request_template(api_name = "sociodemographics", end_point = "total")
+
+        r = await self.send_request_from_template(template, payload = {"idEstado": state_id, "idMunicipio": mun_id, "idColonia": neighborhood_id, "fechaInicio": date_start, "fechaFin": date_end, **kwargs})
+
+        # Get JSON
+        r_content_as_dict = await r.json(content_type = None)
+
+        return self.scrapper.format_totals(r_content_as_dict, state_id = state_id, mun_id = mun_id, neighborhood_id = neighborhood_id, date_start = date_start, date_end = date_end)
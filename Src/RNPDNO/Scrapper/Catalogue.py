@@ -0,0 +1,41 @@
+from typing import Iterable, Iterator, NamedTuple
+
+# Names the API uses for the "All" option (Value 0) of a catalogue
+ALL_NAMES = frozenset(("--TODOS--", "--TODAS--"))
+
+# Id of the "All" option
+ALL_ID = 0
+
+class CatalogueItem(NamedTuple):
+    """A catalogue option (a state, a municipality or a neighborhood)
+
+    A tuple is much lighter than a dict, which matters when walking the ~100k neighborhoods of the catalogue.
+    """
+
+    id: int
+    name: str
+
+    def as_dict(self) -> dict:
+        return {"id": self.id, "name": self.name}
+
+def iter_catalogue_items(content: Iterable[dict], drop_all: bool = False) -> Iterator[CatalogueItem]:
+    """Decode the content of a catalogue response lazily
+
+    Args:
+        content (Iterable[dict]): Decoded JSON content of a catalogue response (objects with `Value` and `Text` fields).
+        drop_all (bool, optional): Should the "All" option (id 0) be skipped? Defaults to False.
+
+    Yields:
+        CatalogueItem: A catalogue option. The "All" option is named "All".
+    """
+
+    for obj in content:
+        item_id = int(obj["Value"])
+
+        if item_id == ALL_ID or obj["Text"] in ALL_NAMES:
+            if drop_all:
+                continue
+
+            yield CatalogueItem(item_id, "All")
+        else:
+            yield CatalogueItem(item_id, obj["Text"])
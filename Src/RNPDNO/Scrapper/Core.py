@@ -1,10 +1,30 @@
-from typing import Union
+from typing import Iterator, Union
+from types import MappingProxyType
 
 from RNPDNO.Config import ConfigReader
-
+from RNPDNO.Cache import ResponseCache, MemoryCacheBackend, SQLiteCacheBackend, DEFAULT_MAX_ENTRIES
+from RNPDNO.Sink import MongoSink
+from RNPDNO.Snapshot import MongoSnapshotStore, DeltaSink
+from RNPDNO.Ledger import SQLiteLedger, MongoLedger, SQLiteWatermarkStore, MongoWatermarkStore
+from RNPDNO.Scrapper.RateLimiter import AdaptiveRateLimiter
+from RNPDNO.Scrapper.Retry import RetryPolicy
+from RNPDNO.Scrapper.Catalogue import CatalogueItem, iter_catalogue_items
+from RNPDNO.Scrapper.Sessions import SessionPool, SessionLease, create_pooled_session, is_disclaimer_response
+from RNPDNO.Scrapper.Totals import TOTALS_RESPONSE_FIELDS, PERCENTAGE_RESPONSE_FIELDS, parse_int, parse_percentage, json_loads
+from RNPDNO.Scrapper.Series import YearlySeries
+from RNPDNO.Scrapper.SingleFlight import SingleFlight, request_key
+from RNPDNO.Metrics import Metrics, label_from_url
+from RNPDNO.Log import setup_logging, LOG_FORMAT, LOG_DATE_FORMAT, ENDPOINT_FIELD
+
+from urllib.parse import quote_plus
+
+import pymongo as pm
 import requests
 
+import threading
 import logging
+import time
+import re
 
 class Scrapper:
 
@@ -28,6 +48,18 @@ class Scrapper:
         class UnsuccessfulRequest(Exception):
             pass
 
+        class SessionExpired(UnsuccessfulRequest):
+            pass
+
+        class TruncatedChart(ValueError):
+            pass
+
+    # Templates of the dashboard pages (HTML), used to get the session cookie
+    SESSION_API = "dashboard"
+
+    # BarChartSexoColonia only charts the neighborhoods with the most records
+    MAX_CHART_NEIGHBORHOODS = 30
+
     def __init__(self) -> None:
         
         self.__config_loaded = False
@@ -35,6 +67,17 @@ class Scrapper:
 
         self.__session = None
         self.__config_reader = None
+        self.__response_cache = None
+        self.__request_templates = None
+        self.__request_templates_index = {}
+        self.__target_db_conn = None
+        self.__retry_policy = RetryPolicy(max_attempts = 1)
+        self.__rate_limiter = None
+        self.__metrics = None
+        self.__session_pool = None
+        self.__session_lock = threading.Lock()
+        self.__session_generation = 0
+        self.__single_flight = SingleFlight()
 
     def __before_request_checks(self) -> None:
 
@@ -44,25 +87,173 @@ class Scrapper:
     @staticmethod
     def formatted_str_as_int(string: str) -> int:
 
-        # Trim and remove any commas
-        string = string.strip()
-        string = string.replace(",", "")
-
-        return int(string)
+        # Remove any commas (int() already trims)
+        return parse_int(string)
 
     @staticmethod
     def validate_request_template(template: dict) -> bool:
 
-        list_of_expected_keys = ["api", "endpoint", "url", "host", "method", "payloadTemplate"]
+        list_of_expected_keys = ["api", "url", "host", "method"]
         list_of_actual_keys =template.keys()
 
         list_of_missing_keys = [key for key in list_of_expected_keys if key not in list_of_actual_keys]
 
+        # Templates may spell the end-point and payload keys differently
+        if "endPoint" not in list_of_actual_keys and "endpoint" not in list_of_actual_keys:
+            list_of_missing_keys.append("endPoint")
+
+        if "payloadTemplate" not in list_of_actual_keys and "payload" not in list_of_actual_keys:
+            list_of_missing_keys.append("payloadTemplate")
+
         if len(list_of_missing_keys) > 0:
             return False
         else:
             return True
 
+    @classmethod
+    def compile_request_template(cls, template: dict) -> dict:
+        """Validate and normalise a request template
+
+        The compiled template is a copy of the template with normalised `endPoint` and `payload` keys, the full URL of the
+        request pre-built in `fullUrl` and a read-only payload. Compiled templates are used as-is by
+        `Scrapper.prepare_request_from_template(...)`.
+
+        Args:
+            template (dict): A request template (as a python dict).
+
+        Raises:
+            Scrapper.Exceptions.InvalidTemplate: If the template is not valid.
+
+        Returns:
+            dict: The compiled template.
+        """
+
+        if "fullUrl" in template:
+            return template
+
+        if not cls.validate_request_template(template):
+            raise cls.Exceptions.InvalidTemplate("The supplied template is not valid! (api: {0}, end_point: {1})".format(template.get("api"), template.get("endPoint", template.get("endpoint"))))
+
+        payload = template["payloadTemplate"] if "payloadTemplate" in template else template["payload"]
+
+        compiled_template = dict(template)
+        compiled_template.update({
+            "endPoint": template["endPoint"] if "endPoint" in template else template["endpoint"],
+            "payload": MappingProxyType(dict(payload)) if payload is not None else None,
+            "fullUrl": "{0}/{1}".format(template["host"].rstrip("/"), template["url"].lstrip("/"))
+        })
+
+        return compiled_template
+
+    def __index_request_templates(self, templates: list) -> None:
+
+        self.logger.info("Indexing %s request templates...", len(templates))
+
+        index = {}
+
+        for template in templates:
+            compiled_template = self.compile_request_template(template)
+            key = (compiled_template["api"], compiled_template["endPoint"])
+
+            if key in index:
+                raise self.Exceptions.MultipleTemplatesFound("There's more than one template for the same end-point (api: {0}, end_point: {1})".format(*key))
+
+            index[key] = compiled_template
+
+        self.__request_templates = list(index.values())
+        self.__request_templates_index = index
+
+    @staticmethod
+    def format_catalogue(content: list, drop_all: bool = False) -> list:
+        """Format the content of a catalogue response
+
+        Args:
+            content (list): Decoded JSON content of a catalogue response (a list of objects with `Value` and `Text` fields).
+            drop_all (bool, optional): Should the "All" option (id 0) be skipped? Defaults to False.
+
+        Returns:
+            list: A list of dicts with `id` and `name` keys. The "--TODOS--" and "--TODAS--" options are renamed to "All".
+        """
+
+        return [item.as_dict() for item in iter_catalogue_items(content, drop_all = drop_all)]
+
+    @classmethod
+    def format_totals(cls, content: dict, state_id: str = "0", mun_id: str = "0", neighborhood_id: str = "0", date_start: str = "", date_end: str = "", include_percentages: bool = False) -> dict:
+        """Format the content of a totals response
+
+        To parse many responses at once, see `RNPDNO.Scrapper.TotalsParser`.
+
+        Args:
+            content (dict): Decoded JSON content of a totals response.
+            state_id (str, optional): Id of the queried state. Defaults to "0".
+            mun_id (str, optional): Id of the queried municipality. Defaults to "0".
+            neighborhood_id (str, optional): Id of the queried neighborhood. Defaults to "0".
+            date_start (str, optional): Start date of the query. Defaults to "".
+            date_end (str, optional): End date of the query. Defaults to "".
+            include_percentages (bool, optional): Should the percentages be added (as floats)? Defaults to False.
+
+        Returns:
+            dict: The totals as ints, plus the query identifiers.
+        """
+
+        # Get information, coerced as int
+        return_dict = {field: cls.formatted_str_as_int(content[response_field]) for field, response_field in TOTALS_RESPONSE_FIELDS.items()}
+
+        if include_percentages:
+            return_dict.update({field: parse_percentage(content.get(response_field)) for field, response_field in PERCENTAGE_RESPONSE_FIELDS.items()})
+
+        return_dict.update({
+            "state_id": state_id,
+            "mun_id": mun_id, 
+            "neighborhood_id": neighborhood_id,
+            "date_start": date_start if date_start != "" else None,
+            "date_end": date_end if date_end != "" else None,
+        })
+
+        return return_dict
+
+    @classmethod
+    def format_chart_series(cls, content: dict) -> tuple:
+        """Format the content of a chart response (e.g. BarChartSexoColonia)
+
+        Args:
+            content (dict): Decoded JSON content of a chart response, with `XAxisCategories` and `Series` fields.
+
+        Returns:
+            tuple: The list of categories (x axis labels) and a dict mapping each series name to its list of ints.
+        """
+
+        categories = content["XAxisCategories"] or []
+        series = {}
+
+        for obj in content["Series"] or []:
+            series[obj["name"]] = [value if isinstance(value, int) else cls.formatted_str_as_int(str(value)) for value in obj["data"]]
+
+        return categories, series
+
+    @classmethod
+    def format_chart_table(cls, content: dict) -> dict:
+        """Format the table of a chart response (e.g. BarChartSexoColonia)
+
+        The table holds the totals of every series over all the categories, including the ones left out of the chart, and
+        over the records without a category (e.g. persons whose neighborhood is unknown).
+
+        Args:
+            content (dict): Decoded JSON content of a chart response, with a `TableValues` field.
+
+        Returns:
+            dict: A dict mapping each row name (series names and "Total") to its int value. Empty if the response has no table.
+        """
+
+        table = {}
+
+        for obj in content.get("TableValues") or []:
+            # Row names may be wrapped in HTML tags (e.g. <strong>Total</strong>)
+            name = re.sub(r"<[^>]+>", "", obj["text"]).strip()
+            table[name] = cls.formatted_str_as_int(str(obj["value"]))
+
+        return table
+
     def validate_response_status(self, response: requests.Response, error: bool = True) -> bool:
         """Validate the response's status
 
@@ -127,31 +318,35 @@ class Scrapper:
         else:
             return False
 
-    def create_logger(self, level: int, name:str = "Scrapper.logger", format:str = "%(asctime)s | %(levelname)7s @ %(filename)s : %(message)s", date_format = "%Y-%m-%d %H:%M:%S"):
+    def create_logger(self, level: int, name:str = "Scrapper.logger", format:str = LOG_FORMAT, date_format:str = LOG_DATE_FORMAT, json_format: bool = False, sample_rates: dict = None, default_sample_rate: float = 1.0):
         """Create a logger object for the current class instance
 
+        Records of the Scrapper and of the configuration reader are written to stderr by a background thread (see
+        `RNPDNO.Log.setup_logging(...)`), so logging never blocks the workers on I/O.
+
         Args:
             level (int): logging level.
             name (str, optional): Name of the logger. Defaults to "Scrapper.logger".
             format (str, optional): String template for the logger message formatter. Defaults to "%(asctime)s | %(levelname)7s @ %(filename)s : %(message)s".
             date_format (str, optional): String template for the datetime formatter used in the logger.. Defaults to "%Y-%m-%d %H:%M:%S".
+            json_format (bool, optional): Should records be written as JSON documents, with the end-point of requests as a field? Defaults to False.
+            sample_rates (dict, optional): Fraction of the request records kept, by end-point (e.g. {"/Sociodemograficos/Totales": 0.01}). Defaults to None.
+            default_sample_rate (float, optional): Fraction of the request records kept for other end-points. Defaults to 1.0 (all).
         """
 
-        logging.info("Creating new logger instance at Scrapper instance...")
-
         # Create logger
         self.__logger = logging.getLogger(name)
 
-        # Create a console handler
-        self.__logger_stream_handler = logging.StreamHandler()
-        # Set level
-        self.__logger_stream_handler.setLevel(level)
-
-        # Create a log formatter
-        self.__logger_stream_formatter = logging.Formatter(fmt = format, datefmt = date_format)
-        
-        # Assign stream formatter to stream handler
-        self.__logger_stream_handler.setFormatter(self.__logger_stream_formatter)
+        # Attach a queue handler, records are formatted and written by a listener thread
+        self.__log_pipeline = setup_logging(
+            (name, ConfigReader.__module__),
+            level = level,
+            json_format = json_format,
+            format = format,
+            date_format = date_format,
+            sample_rates = sample_rates,
+            default_sample_rate = default_sample_rate
+        )
 
         self.logger.info("Logger instance created!")
 
@@ -171,6 +366,23 @@ class Scrapper:
         """
         return self.__config_reader
 
+    @property
+    def config_db(self) -> pm.database.Database:
+        """Config MongoDB
+
+        The config DB stores the app configuration, as well as the state of long crawls (job ledgers, watermarks and shards).
+
+        Raises:
+            ValueError: If app configuration is not loaded before calling this property.
+
+        Returns:
+            pm.database.Database: Config MongoDB, using the config reader's client.
+        """
+
+        self.check_config_loaded()
+
+        return self.config.config_db_conn[self.env_vars["SCRAPPER_MONGO_CONFIGDB_NAME"]]
+
     @property
     def env_vars(self) -> dict:
         """Environment variables
@@ -204,6 +416,45 @@ class Scrapper:
 
         return self.__session
 
+    @property
+    def session_pool(self) -> Union[SessionPool, None]:
+        """Pool of pre-warmed sessions used by `Scrapper.send_request_from_template(...)` (None if there's no pool, see `Scrapper.create_session_pool(...)`)
+        """
+        return self.__session_pool
+
+    @property
+    def response_cache(self) -> Union[ResponseCache, None]:
+        """Response cache
+
+        Returns:
+            ResponseCache: The cache used by `Scrapper.send_request_from_template(...)`, or None if responses are not cached.
+        """
+        return self.__response_cache
+
+    @property
+    def retry_policy(self) -> RetryPolicy:
+        """Retry policy used by `Scrapper.send_request(...)`
+        """
+        return self.__retry_policy
+
+    @property
+    def rate_limiter(self) -> Union[AdaptiveRateLimiter, None]:
+        """Adaptive rate limiter used by `Scrapper.send_request(...)` (None if requests are not rate limited)
+        """
+        return self.__rate_limiter
+
+    @property
+    def single_flight(self) -> Union[SingleFlight, None]:
+        """Coalescer of identical template requests in flight (None if requests are not coalesced, see `Scrapper.disable_single_flight()`)
+        """
+        return self.__single_flight
+
+    @property
+    def metrics(self) -> Union[Metrics, None]:
+        """Metrics registry (None if metrics are disabled, see `Scrapper.enable_metrics(...)`)
+        """
+        return self.__metrics
+
     @property
     def TARGETDB_NAME(self) -> str:
         """Target MongoDB name
@@ -251,6 +502,160 @@ class Scrapper:
 
         return self.__target_db_password
 
+    @property
+    def target_db_conn(self) -> pm.MongoClient:
+        """Target MongoDB client
+
+        The client is created on first access and shared by every sink of the Scrapper instance.
+        pymongo clients keep a thread-safe connection pool, so a single client serves all the workers of a crawl.
+
+        Raises:
+            ValueError: If app configuration is not loaded before calling this property.
+
+        Returns:
+            pm.MongoClient: Target MongoDB client.
+        """
+
+        self.check_config_loaded()
+
+        if self.__target_db_conn is None:
+            # Define the mongo uri
+            mongo_uri = "mongodb://{username}:{password}@{host}:{port}/{db}".format(
+                username = quote_plus(self.TARGETDB_USERNAME),
+                password = quote_plus(self.TARGETDB_PASSWORD),
+                host = self.env_vars["SCRAPPER_MONGO_HOST"],
+                port = self.env_vars["SCRAPPER_MONGO_PORT"],
+                db = self.TARGETDB_NAME
+            )
+
+            self.logger.info("Opening new connection to the target DB...")
+            self.__target_db_conn = pm.MongoClient(mongo_uri, maxPoolSize = self.config.get("SCRAPPER_MONGO_TARGETDB_POOL_SIZE", 100))
+
+        return self.__target_db_conn
+
+    def create_sink(self, collection: str, key_fields: tuple = MongoSink.DEFAULT_KEY_FIELDS, batch_size: int = None, flush_interval: float = None, max_buffered: int = None) -> MongoSink:
+        """Create a sink that writes scrapped records into a collection of the target DB
+
+        Args:
+            collection (str): Name of the target collection.
+            key_fields (tuple, optional): Fields that identify a record. Defaults to MongoSink.DEFAULT_KEY_FIELDS.
+            batch_size (int, optional): Number of buffered records that triggers a flush. Defaults to None (the `SCRAPPER_SINK_BATCH_SIZE` configuration variable, or 1000).
+            flush_interval (float, optional): Maximum number of seconds between flushes. Defaults to None (the `SCRAPPER_SINK_FLUSH_INTERVAL` configuration variable, or 10).
+            max_buffered (int, optional): Maximum number of buffered records while writes fail. Defaults to None (the `SCRAPPER_SINK_MAX_BUFFERED` configuration variable, or 10 batches).
+
+        Raises:
+            ValueError: If app configuration is not loaded before calling this method.
+
+        Returns:
+            MongoSink: A new sink.
+        """
+
+        self.check_config_loaded()
+
+        batch_size = batch_size if batch_size is not None else int(self.config.get("SCRAPPER_SINK_BATCH_SIZE", 1000))
+        flush_interval = flush_interval if flush_interval is not None else float(self.config.get("SCRAPPER_SINK_FLUSH_INTERVAL", 10))
+
+        if max_buffered is None and self.config.get("SCRAPPER_SINK_MAX_BUFFERED") is not None:
+            max_buffered = int(self.config["SCRAPPER_SINK_MAX_BUFFERED"])
+
+        self.logger.info("Creating sink for the collection %s (batch size: %s)...", collection, batch_size)
+        target_collection = self.target_db_conn[self.TARGETDB_NAME][collection]
+
+        return MongoSink(target_collection, key_fields = key_fields, batch_size = batch_size, flush_interval = flush_interval, max_buffered = max_buffered, metrics = self.metrics)
+
+    def create_snapshot_store(self, collection: str) -> MongoSnapshotStore:
+        """Open a store of versioned records in a collection of the target DB
+
+        Args:
+            collection (str): Name of the target collection.
+
+        Raises:
+            ValueError: If app configuration is not loaded before calling this method.
+
+        Returns:
+            MongoSnapshotStore: The snapshot store.
+        """
+
+        self.check_config_loaded()
+
+        self.logger.info("Opening snapshot store %s...", collection)
+
+        return MongoSnapshotStore(self.target_db_conn[self.TARGETDB_NAME][collection])
+
+    def create_delta_sink(self, collection: str, batch_size: int = None, flush_interval: float = None, ignore_fields: tuple = ()) -> DeltaSink:
+        """Create a sink that writes only new or changed records, as versions, into a collection of the target DB
+
+        Records are compared with their current version (see `RNPDNO.Snapshot.DeltaSink`), so repeated crawls only
+        write the revisions of the registry. Past snapshots can be queried with `sink.store.as_of(...)`.
+
+        Args:
+            collection (str): Name of the target collection.
+            batch_size (int, optional): Number of buffered records that triggers a flush. Defaults to None (the `SCRAPPER_SINK_BATCH_SIZE` configuration variable, or 1000).
+            flush_interval (float, optional): Maximum number of seconds between flushes. Defaults to None (the `SCRAPPER_SINK_FLUSH_INTERVAL` configuration variable, or 10).
+            ignore_fields (tuple, optional): Value fields left out of the change detection. Defaults to ().
+
+        Raises:
+            ValueError: If app configuration is not loaded before calling this method.
+
+        Returns:
+            DeltaSink: A new sink.
+        """
+
+        self.check_config_loaded()
+
+        batch_size = batch_size if batch_size is not None else int(self.config.get("SCRAPPER_SINK_BATCH_SIZE", 1000))
+        flush_interval = flush_interval if flush_interval is not None else float(self.config.get("SCRAPPER_SINK_FLUSH_INTERVAL", 10))
+
+        store = self.create_snapshot_store(collection)
+
+        return DeltaSink(store, batch_size = batch_size, flush_interval = flush_interval, ignore_fields = ignore_fields, metrics = self.metrics)
+
+    def create_ledger(self, name: str, path: str = None) -> Union[SQLiteLedger, MongoLedger]:
+        """Create (or open) a job ledger for a resumable crawl
+
+        Args:
+            name (str): Name of the ledger collection in the config DB (ignored if path is supplied).
+            path (str, optional): Path of a local SQLite file used as ledger. Defaults to None (the ledger is stored in the config DB).
+
+        Raises:
+            ValueError: If app configuration is not loaded before calling this method.
+
+        Returns:
+            Union[SQLiteLedger, MongoLedger]: The job ledger.
+        """
+
+        self.check_config_loaded()
+
+        if path is not None:
+            self.logger.info("Opening job ledger at %s...", path)
+            return SQLiteLedger(path)
+
+        self.logger.info("Opening job ledger %s in the config DB...", name)
+        return MongoLedger(self.config_db[name])
+
+    def create_watermark_store(self, name: str, path: str = None) -> Union[SQLiteWatermarkStore, MongoWatermarkStore]:
+        """Create (or open) a store of the last scrapped date per geography, used by incremental crawls
+
+        Args:
+            name (str): Name of the store collection in the config DB (ignored if path is supplied).
+            path (str, optional): Path of a local SQLite file used as store. Defaults to None (the store is kept in the config DB).
+
+        Raises:
+            ValueError: If app configuration is not loaded before calling this method.
+
+        Returns:
+            Union[SQLiteWatermarkStore, MongoWatermarkStore]: The watermark store.
+        """
+
+        self.check_config_loaded()
+
+        if path is not None:
+            self.logger.info("Opening watermark store at %s...", path)
+            return SQLiteWatermarkStore(path)
+
+        self.logger.info("Opening watermark store %s in the config DB...", name)
+        return MongoWatermarkStore(self.config_db[name])
+
     def create_requests_session(self) -> None:
         """Create a requests session.
         """
@@ -260,7 +665,52 @@ class Scrapper:
         self.__session_created = True
         self.logger.info("Session created!")
 
-    def send_request(self, method:str, url:str, **kwargs) -> requests.Response:
+    def create_session_pool(self, size: int = 4, max_workers: int = 8, acquire_timeout: float = 60.0) -> SessionPool:
+        """Create a pool of pre-warmed sessions, used instead of the Scrapper session by template requests
+
+        Every session is initialized (see `Scrapper.initialize_requests_sessions()`) before this method returns. Sessions are
+        handed out round-robin, and a session whose cookie expires mid-crawl (the server answers with the disclaimer page)
+        is replaced by a new one initialized in the background, while the other sessions keep serving the workers.
+
+        Args:
+            size (int, optional): Number of sessions. Defaults to 4.
+            max_workers (int, optional): Maximum number of requests in flight (e.g. the workers of a Crawler), used to size the connection pool of each session. Defaults to 8.
+            acquire_timeout (float, optional): Maximum number of seconds a request waits for an initialized session. Defaults to 60.0.
+
+        Raises:
+            ValueError: If app configuration is not loaded before calling this method.
+
+        Returns:
+            SessionPool: The session pool.
+        """
+
+        self.logger.info("Creating session pool (sessions: %s, workers: %s)...", size, max_workers)
+        self.check_config_loaded()
+
+        if self.__session_pool is not None:
+            self.__session_pool.close()
+
+        pool = SessionPool(lambda: create_pooled_session(pool_maxsize = max_workers), self.__initialize_session, size = size, acquire_timeout = acquire_timeout)
+        pool.start()
+
+        self.__session_pool = pool
+
+        # The pool can serve requests on its own
+        if not self.__session_created:
+            self.__session = create_pooled_session(pool_maxsize = max_workers)
+            self.__session_created = True
+
+        self.logger.info("Session pool created!")
+
+        return pool
+
+    def close_session_pool(self) -> None:
+
+        if self.__session_pool is not None:
+            self.__session_pool.close()
+            self.__session_pool = None
+
+    def send_request(self, method:str, url:str, session: requests.Session = None, **kwargs) -> requests.Response:
         """Send a request.
 
         This method sends an HTTP request using the specified method and URL. 
@@ -271,29 +721,166 @@ class Scrapper:
         Args:
             method (str): HTTP method to be used.
             url (str): Target URL of the request.
+            session (requests.Session, optional): Session used to send the request. Defaults to None (a session of the pool, if any, or the Scrapper session).
+
+        Connection errors, timeouts and retryable status codes are retried according to `Scrapper.retry_policy`,
+        and requests are paced by `Scrapper.rate_limiter` (if any). See `Scrapper.set_request_policies(...)`.
 
         Raises:
             Scrapper.Exceptions.UnsuccessfulRequest: If the server responded with a status code different from a successful response.
+            requests.ConnectionError: If the last attempt failed to connect.
+            requests.Timeout: If the last attempt timed out.
 
         Returns:
             requests.Response: Response object generated by the request.
         """
 
-        self.logger.info("Sending {0} request to {1}...".format(method, url))
+        # Don't build the record (nor the end-point label used to sample it) if the level is disabled
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("Sending %s request to %s...", method, url, extra = {ENDPOINT_FIELD: label_from_url(url)})
         
         self.check_session_created()
 
-        r = self.session.request(method = method, url = url, **kwargs)
+        if session is None:
+            session = self.session_pool.acquire().session if self.session_pool is not None else self.session
+
+        kwargs.setdefault("timeout", self.retry_policy.timeout)
+        attempt = 0
+
+        while True:
+            attempt += 1
+
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+
+            try:
+                if self.metrics is not None:
+                    r = self.__send_measured_request(session, method, url, **kwargs)
+                else:
+                    r = session.request(method = method, url = url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.record_failure()
+
+                if attempt >= self.retry_policy.max_attempts:
+                    raise
+
+                if self.metrics is not None:
+                    self.metrics.inc("rnpdno_request_retries_total", (label_from_url(url), ))
+
+                delay = self.retry_policy.compute_delay(attempt)
+                self.logger.warning("Request to %s failed (%s), retrying in %.2f seconds (attempt %s of %s)...", url, e, delay, attempt, self.retry_policy.max_attempts)
+                time.sleep(delay)
+                continue
+
+            if self.retry_policy.should_retry(r.status_code):
+                if self.rate_limiter is not None:
+                    self.rate_limiter.record_failure()
+
+                if attempt < self.retry_policy.max_attempts:
+                    if self.metrics is not None:
+                        self.metrics.inc("rnpdno_request_retries_total", (label_from_url(url), ))
+
+                    delay = self.retry_policy.compute_delay(attempt, r.headers.get("Retry-After"))
+                    self.logger.warning("The server responded with status %s, retrying in %.2f seconds (attempt %s of %s)...", r.status_code, delay, attempt, self.retry_policy.max_attempts)
+                    time.sleep(delay)
+                    continue
+            elif self.rate_limiter is not None:
+                self.rate_limiter.record_success()
+
+            break
+
         self.validate_response_status(r)
 
         return r
 
+    def __send_measured_request(self, session: requests.Session, method: str, url: str, **kwargs) -> requests.Response:
+
+        metrics = self.metrics
+        labels = (label_from_url(url), )
+
+        metrics.add("rnpdno_requests_in_flight", labels, 1)
+        start = time.perf_counter()
+
+        try:
+            r = session.request(method = method, url = url, **kwargs)
+        except requests.RequestException as e:
+            metrics.inc("rnpdno_request_errors_total", (labels[0], type(e).__name__))
+            raise
+        finally:
+            metrics.add("rnpdno_requests_in_flight", labels, -1)
+
+        metrics.observe("rnpdno_request_duration_seconds", labels, time.perf_counter() - start)
+        metrics.inc("rnpdno_requests_total", (labels[0], str(r.status_code)))
+        metrics.inc("rnpdno_response_bytes_total", labels, len(r.content))
+
+        if r.request is not None and r.request.body is not None:
+            metrics.inc("rnpdno_request_bytes_total", labels, len(r.request.body))
+
+        return r
+
+    def decode_json(self, r: requests.Response):
+        """Decode the JSON content of a response, measuring the decoding time if metrics are enabled
+
+        Uses orjson if it's installed.
+        """
+
+        if self.metrics is None:
+            return json_loads(r.content)
+
+        start = time.perf_counter()
+        content = json_loads(r.content)
+        self.metrics.observe("rnpdno_json_decode_seconds", (label_from_url(r.url), ), time.perf_counter() - start)
+
+        return content
+
+    def prepare_request_from_template(self, template: dict, payload: dict = None) -> tuple:
+        """Build the arguments of a request from a request template
+
+        Args:
+            template (dict): A request template (as a python dict).
+            payload (dict, optional): A python dict used to update the template's payload object. Defaults to None.
+
+        Raises:
+            Scrapper.Exceptions.InvalidTemplate: If the user suplied an invalid template.
+
+        Returns:
+            tuple: The HTTP method, the target URL and the request payload.
+        """
+
+        try:
+            template = self.compile_request_template(template)
+        except self.Exceptions.InvalidTemplate as e:
+            self.logger.error(str(e))
+            raise
+
+        # Get request args
+        request_method = template["method"]
+        request_url = template["fullUrl"]
+        request_payload = template["payload"]
+
+        # Check if payload is None
+        if request_payload is not None:
+            request_payload = {**request_payload, **(payload or {})}
+
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("Payload object is not None, therefore contents will update the payload template.")
+                self.logger.debug("Request template: %s", template["payload"])
+                self.logger.debug("User suplied payload: %s", payload)
+                self.logger.debug("Updated payload: %s", request_payload)
+
+        return request_method, request_url, request_payload
+
     def send_request_from_template(self, template: dict, payload: dict = None) -> requests.Response:
         """Send a request using a request template
 
         This function is a wrapper around `Scrapper.send_request(...)` that allows users to send an HTTP request using a request template.
         Request templates contain a predefined url, host, method, and payload (used as the data argument in `Session.request(...)`).
 
+        Unless `Scrapper.disable_single_flight()` was called, identical requests (same method, URL and normalised payload)
+        sent at the same time by several threads are coalesced: only one is sent and every caller gets its response object,
+        which must not be modified.
+
         Args:
             template (dict): A request template (as a python dict).
             payload (dict, optional): A python dict used to update the template's payload object. Defaults to None.
@@ -305,31 +892,109 @@ class Scrapper:
         Returns:
             requests.Response: Response object generated by the request.
         """
-        
-        if not self.validate_request_template(template):
-            msg = "The supplied template is not valid!"
-            self.logger.error(msg)
-            raise self.Exceptions.InvalidTemplate(msg)
 
-        # Get request args
-        request_method = template["method"]
-        request_url = "{0}{1}".format(template["host"], template["url"])
-        request_payload = template["payload"]
+        template = self.compile_request_template(template)
+        request_method, request_url, request_payload = self.prepare_request_from_template(template, payload)
 
-        # Check if payload is None
-        if request_payload is not None:
-            self.logger.debug("Payload object is not None, therefore contents will update the payload template.")
-            self.logger.debug("Request template: {0}".format(request_payload))
-            self.logger.debug("User suplied payload: {0}".format(payload))
+        single_flight = self.single_flight
+
+        if single_flight is None:
+            return self.__send_template_request(template, request_method, request_url, request_payload)
+
+        key = request_key(request_method, request_url, request_payload)
+        r, shared = single_flight.do(key, self.__send_template_request, template, request_method, request_url, request_payload)
 
-            request_payload = {**request_payload, **payload}
+        if shared:
+            self.logger.debug("Using the response of an identical request in flight (api: %s, end_point: %s).", template["api"], template["endPoint"])
 
-            self.logger.debug("Updated payload: {0}".format(request_payload))
+            metrics = self.metrics
 
-        r = self.send_request(method = request_method, url = request_url, data = request_payload)
+            if metrics is not None:
+                metrics.inc("rnpdno_coalesced_requests_total", (label_from_url(request_url), ))
 
         return r
 
+    def __send_template_request(self, template: dict, request_method: str, request_url: str, request_payload: Union[dict, None]) -> requests.Response:
+
+        # Check if the response can be cached
+        cache_ttl = None
+
+        if self.response_cache is not None:
+            cache_ttl = self.response_cache.get_ttl(template["api"], template["endPoint"])
+
+        # The dashboard pages are HTML, only the data end-points reveal an expired session cookie
+        expect_json = template["api"] != self.SESSION_API
+
+        if cache_ttl is None:
+            return self.__send_session_request(request_method, request_url, expect_json, data = request_payload)
+
+        cache_key = self.response_cache.make_key(template["api"], template["endPoint"], request_payload)
+        cache_entry, conditional_headers = self.response_cache.lookup(cache_key, cache_ttl)
+
+        if cache_entry is not None and len(conditional_headers) == 0:
+            self.logger.debug("Using cached response (api: %s, end_point: %s).", template["api"], template["endPoint"])
+            return self.response_cache.build_response(cache_entry)
+
+        r = self.__send_session_request(request_method, request_url, expect_json, data = request_payload, headers = conditional_headers)
+
+        if r.status_code == 304 and cache_entry is not None:
+            self.logger.debug("Cached response revalidated (api: %s, end_point: %s).", template["api"], template["endPoint"])
+            self.response_cache.revalidated(cache_key)
+            return self.response_cache.build_response(cache_entry)
+
+        self.response_cache.store(cache_key, r)
+
+        return r
+
+    def __acquire_session(self) -> SessionLease:
+
+        try:
+            return self.session_pool.acquire()
+        except TimeoutError as e:
+            raise self.Exceptions.SessionExpired(str(e)) from e
+
+    def __send_session_request(self, method: str, url: str, expect_json: bool, **kwargs) -> requests.Response:
+
+        if self.session_pool is not None:
+            lease = self.__acquire_session()
+            r = self.send_request(method, url, session = lease.session, **kwargs)
+            n_attempts = 1
+
+            # Replace the session in the background and send the request again with another one
+            while expect_json and is_disclaimer_response(r) and n_attempts <= self.session_pool.size:
+                self.session_pool.report_expired(lease)
+
+                lease = self.__acquire_session()
+                r = self.send_request(method, url, session = lease.session, **kwargs)
+                n_attempts += 1
+        else:
+            generation = self.__session_generation
+            r = self.send_request(method, url, **kwargs)
+
+            if expect_json and is_disclaimer_response(r):
+                with self.__session_lock:
+                    # Initialize the session once, even if several workers got the disclaimer
+                    if self.__session_generation == generation:
+                        self.logger.warning("The session cookie expired, initializing the session again...")
+                        self.__initialize_session(self.session)
+                        self.__session_generation += 1
+
+                r = self.send_request(method, url, **kwargs)
+
+        if expect_json and is_disclaimer_response(r):
+            raise self.Exceptions.SessionExpired("The server responded with the disclaimer page to {0} {1}!".format(method, url))
+
+        return r
+
+    def __initialize_session(self, session: requests.Session) -> None:
+
+        for end_point in ("index", "home"):
+            template = self.get_request_template(api_name = self.SESSION_API, end_point = end_point)
+            request_method, request_url, request_payload = self.prepare_request_from_template(template)
+
+            self.logger.info("Requesting dashboard %s...", end_point)
+            self.send_request(method = request_method, url = request_url, session = session, data = request_payload)
+
     def initialize_requests_sessions(self) -> None:
         """Initializes the Scrapper's request session
 
@@ -343,15 +1008,8 @@ class Scrapper:
         self.logger.info("Initializing requests session...")
         self.check_session_created()
 
-        template_index = self.get_request_template(api_name = "dashboard", end_point = "index")
-        template_home = self.get_request_template(api_name = "dashboard", end_point = "home")
-
-        # Send request to index page
-        self.logger.info("Requesting dashboard index...")
-        self.send_request_from_template(template_index)
-        # Send request to home page
-        self.logger.info("Requesting dashboard home...")
-        self.send_request_from_template(template_home)
+        # Send requests to the index and home pages
+        self.__initialize_session(self.session)
 
         self.logger.info("Request session initialized!")
 
@@ -369,8 +1027,107 @@ class Scrapper:
         self.__target_db_username = self.config["SCRAPPER_MONGO_TARGETDB_USERNAME"]
         self.__target_db_password = self.config["SCRAPPER_MONGO_TARGETDB_PASSWORD"]
 
+    def create_response_cache(self, path: str = None, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        """Create a response cache for template requests
+
+        Responses are cached by `Scrapper.send_request_from_template(...)` for the end-points that have a TTL.
+        TTLs (in seconds, keyed by "<api>/<end_point>") can be set with the `SCRAPPER_CACHE_TTL` configuration variable,
+        and update the default TTLs of `ResponseCache.DEFAULT_TTLS`.
+
+        Args:
+            path (str, optional): Path of the SQLite file used to persist the cache. Defaults to None (the cache is kept in memory).
+            max_entries (int, optional): Maximum number of cached responses. Least recently used responses are evicted first. Defaults to DEFAULT_MAX_ENTRIES (100000).
+
+        Raises:
+            ValueError: If app configuration is not loaded before calling this method.
+        """
+
+        self.logger.info("Creating response cache...")
+        self.check_config_loaded()
+
+        if path is None:
+            backend = MemoryCacheBackend(max_entries = max_entries)
+        else:
+            backend = SQLiteCacheBackend(path, max_entries = max_entries)
+
+        self.__response_cache = ResponseCache(backend = backend, ttls = self.config.get("SCRAPPER_CACHE_TTL"))
+
+        self.logger.info("Response cache created!")
+
+    def set_request_policies(self, retry_policy: RetryPolicy = None, rate_limiter: AdaptiveRateLimiter = None) -> None:
+        """Set the retry policy and the rate limiter used by `Scrapper.send_request(...)`
+
+        If an argument is not supplied, it's built from the configuration variables: `SCRAPPER_RETRY_POLICY` (a dict with
+        the arguments of `RetryPolicy(...)`, the default policy is used if it's not set) and `SCRAPPER_RATE_LIMIT` (a dict with
+        the arguments of `AdaptiveRateLimiter(...)`, requests are not rate limited if it's not set).
+
+        Args:
+            retry_policy (RetryPolicy, optional): Retry policy. Defaults to None.
+            rate_limiter (AdaptiveRateLimiter, optional): Adaptive rate limiter. Defaults to None.
+
+        Raises:
+            ValueError: If app configuration is not loaded before calling this method.
+        """
+
+        self.logger.info("Setting request policies...")
+        self.check_config_loaded()
+
+        if retry_policy is None:
+            retry_policy = RetryPolicy.from_config(self.config.get("SCRAPPER_RETRY_POLICY"))
+
+        if rate_limiter is None and self.config.get("SCRAPPER_RATE_LIMIT") is not None:
+            rate_limiter = AdaptiveRateLimiter.from_config(self.config["SCRAPPER_RATE_LIMIT"])
+
+        self.__retry_policy = retry_policy
+        self.__rate_limiter = rate_limiter
+
+    def enable_metrics(self, metrics: Metrics = None) -> Metrics:
+        """Start measuring requests, JSON decoding and sink flushes
+
+        Sinks created before calling this method are not measured.
+
+        Args:
+            metrics (Metrics, optional): Metrics registry, e.g. one shared by several Scrapper instances. Defaults to None (a new registry).
+
+        Returns:
+            Metrics: The metrics registry. Export it with `Metrics.serve(...)` or `Metrics.write_snapshots(...)`.
+        """
+
+        self.__metrics = metrics if metrics is not None else Metrics()
+
+        return self.__metrics
+
+    def disable_metrics(self) -> None:
+
+        self.__metrics = None
+
+    def enable_single_flight(self) -> SingleFlight:
+        """Coalesce identical template requests in flight (enabled by default)
+
+        When several workers send the same template request (same method, URL and payload) at the same time, only the
+        first one is sent and the others get its response. See `Scrapper.send_request_from_template(...)`.
+
+        Returns:
+            SingleFlight: The coalescer. Its `stats` count the shared responses (hits) and the requests sent (misses).
+        """
+
+        if self.__single_flight is None:
+            self.__single_flight = SingleFlight()
+
+        return self.__single_flight
+
+    def disable_single_flight(self) -> None:
+
+        self.__single_flight = None
+
     def load_config(self) -> None:
         """Load app configuration
+
+        Request templates are validated and indexed by API and end-point names.
+
+        Raises:
+            Scrapper.Exceptions.InvalidTemplate: If a request template is not valid.
+            Scrapper.Exceptions.MultipleTemplatesFound: If several request templates share the same API and end-point names.
         """
 
         self.logger.info("Initializing new instance of configuration reader object...")
@@ -379,35 +1136,41 @@ class Scrapper:
         self.logger.info("Starting configuration loading routine...")
         # Load environment variables
         self.config.load_env_vars()
-        # Load configuration from db
-        self.config.load_config(collection = "config_vars")
+        # Load configuration and request templates from db
+        request_templates = self.config.load_app_config(vars_collection = "config_vars", templates_collection = "request_templates")
 
-        # Load request templates from DB
-        self.__request_templates = self.config.load_config(collection = "request_templates")
+        # Index request templates
+        self.__index_request_templates(request_templates)
 
         self.__config_loaded = True
 
+        # Set retry policy and rate limiter
+        self.set_request_policies()
+
         self.logger.info("App configuration loaded!")
 
     def get_request_template(self, api_name: str, end_point: str, error: bool = False) -> Union[dict, None]:
         """Get a specific request template by API name and end-point name.
 
+        Templates are indexed when the configuration is loaded, so the lookup doesn't scan the template list.
+        Duplicated templates are detected at load time (see `Scrapper.load_config()`).
+
         Args:
             api_name (str): Name of the API.
             end_point (str): Name of the end-point.
-            error (bool, optional): Should an exception be raised if the query returns more than one template or no template at all?. Defaults to False.
+            error (bool, optional): Should an exception be raised if the query returns no template?. Defaults to False.
 
         Raises:
             Scrapper.Exceptions.TemplateNotFound: Exception raised when no templates match the search query.
-            Scrapper.Exceptions.MultipleTemplatesFound: Exception raised when multiple templates match the search query.
 
         Returns:
-            dict: Request template.
-            None: If no templates or multiple templates are found.
+            dict: Compiled request template (see `Scrapper.compile_request_template(...)`).
+            None: If no templates are found.
         """
         
-        self.logger.info("Looking for request template (api: %s, end_point: %s)...", api_name, end_point)
-        search_result = next( (doc for doc in self.request_templates if doc["api"] == api_name and doc["endPoint"] == end_point), None )
+        self.check_config_loaded()
+
+        search_result = self.__request_templates_index.get((api_name, end_point))
 
         if search_result is None:
             msg = "The request template doesn't exist! (api: {0}, end_point: {1})".format(api_name, end_point)
@@ -417,129 +1180,257 @@ class Scrapper:
                 self.logger.warning(msg)
                 return None
 
-        if len(search_result) > 1:
-            msg = "The search query returned more than one template (api: {0}, end_point: {1})".format(api_name, end_point)
-            if error:
-                raise self.Exceptions.MultipleTemplatesFound(msg)
-            else:
-                self.logger.warning(msg)
-                return None
-
         return search_result
 
-    def get_states_catalogue(self) -> list:
+    def iter_states_catalogue(self, drop_all: bool = False) -> Iterator[CatalogueItem]:
+        """Request the states catalogue and decode it lazily
+
+        The request is sent when this method is called, the items are decoded as they are consumed.
+
+        Args:
+            drop_all (bool, optional): Should the "All" option (id 0) be skipped? Defaults to False.
+
+        Returns:
+            Iterator[CatalogueItem]: The states.
+        """
 
         self.logger.info("Requesting states catalogue...")
         self.__before_request_checks()
 
         template = self.get_request_template(api_name = "catalogue", end_point = "states")
-        
+
         r = self.send_request_from_template(template)
 
-        # Get JSON
-        r_content_as_dict = r.json()
+        return iter_catalogue_items(self.decode_json(r), drop_all = drop_all)
 
-        # Clean 
-        list_of_states = []
-        
-        for obj in r_content_as_dict:
-            id = obj["Value"]
-            name = obj["Text"]
+    def iter_municipalities_catalogue(self, state_id: str, drop_all: bool = False) -> Iterator[CatalogueItem]:
+        """Request the municipalities catalogue of a state and decode it lazily
 
-            name = "All" if name == "--TODOS--" else name
-
-            list_of_states.append({"id": id, "name": name})
+        Args:
+            state_id (str): Id of the state.
+            drop_all (bool, optional): Should the "All" option (id 0) be skipped? Defaults to False.
 
-        return list_of_states
+        Returns:
+            Iterator[CatalogueItem]: The municipalities.
+        """
 
-    def get_municipalities_catalogue(self, state_id: str) -> list:
-        
-        self.logger.info("Requesting municipalities catalogue for the state id {0}...".format(state_id))
+        self.logger.info("Requesting municipalities catalogue for the state id %s...", state_id)
         self.__before_request_checks()
 
         template = self.get_request_template(api_name = "catalogue", end_point = "municipalities")
-        
-        r = self.send_request_from_template(template, payload = {"idEstado": state_id})
 
-        # Get JSON
-        r_content_as_dict = r.json()
+        r = self.send_request_from_template(template, payload = {"idEstado": state_id})
 
-        # Clean 
-        list_of_municipalities = []
-        
-        for obj in r_content_as_dict:
-            id = obj["Value"]
-            name = obj["Text"]
+        return iter_catalogue_items(self.decode_json(r), drop_all = drop_all)
 
-            name = "All" if name == "--TODOS--" else name
+    def iter_neighborhood_catalogue(self, state_id: str, mun_id: str, drop_all: bool = False) -> Iterator[CatalogueItem]:
+        """Request the neighborhood catalogue of a municipality and decode it lazily
 
-            list_of_municipalities.append({"id": id, "name": name})
+        Args:
+            state_id (str): Id of the state.
+            mun_id (str): Id of the municipality.
+            drop_all (bool, optional): Should the "All" option (id 0) be skipped? Defaults to False.
 
-        return list_of_municipalities
+        Returns:
+            Iterator[CatalogueItem]: The neighborhoods.
+        """
 
-    def get_neighborhood_catalogue(self, state_id: str, mun_id: str):
-        
-        self.logger.info("Requesting neighborhood catalogue for the state id {0} and municipality id {1}...".format(state_id, mun_id))
+        self.logger.info("Requesting neighborhood catalogue for the state id %s and municipality id %s...", state_id, mun_id)
         self.__before_request_checks()
 
         template = self.get_request_template(api_name = "catalogue", end_point = "neighborhoods")
-        
+
         r = self.send_request_from_template(template, payload = {"idEstado": state_id, "idMunicipio": mun_id})
 
-        # Get JSON
-        r_content_as_dict = r.json()
+        return iter_catalogue_items(self.decode_json(r), drop_all = drop_all)
 
-        # Clean 
-        list_of_neighborhoods = []
-        
-        for obj in r_content_as_dict:
-            id = obj["Value"]
-            name = obj["Text"]
+    def get_states_catalogue(self, drop_all: bool = False) -> list:
 
-            name = "All" if name == "--TODOS--" else name
+        return [item.as_dict() for item in self.iter_states_catalogue(drop_all = drop_all)]
 
-            list_of_neighborhoods.append({"id": id, "name": name})
+    def get_municipalities_catalogue(self, state_id: str, drop_all: bool = False) -> list:
 
-        return list_of_neighborhoods
+        return [item.as_dict() for item in self.iter_municipalities_catalogue(state_id, drop_all = drop_all)]
 
-    def get_totals(self, state_id: str = "0", mun_id: str = "0", neighborhood_id: str = "0", date_start: str = "", date_end: str = "", **kwargs) -> dict:
-        
-        call_arguments = locals()
+    def get_neighborhood_catalogue(self, state_id: str, mun_id: str, drop_all: bool = False) -> list:
+
+        return [item.as_dict() for item in self.iter_neighborhood_catalogue(state_id, mun_id, drop_all = drop_all)]
+
+    @staticmethod
+    def build_totals_payload(state_id: str = "0", mun_id: str = "0", neighborhood_id: str = "0", date_start: str = "", date_end: str = "", **kwargs) -> dict:
+        """Build the payload of a totals request (see `Scrapper.get_totals(...)`)
+
+        Returns:
+            dict: Payload passed to `Scrapper.send_request_from_template(...)`.
+        """
+
+        return {"idEstado": state_id, "idMunicipio": mun_id, "idColonia": neighborhood_id, "fechaInicio": date_start, "fechaFin": date_end, **kwargs}
+
+    def request_totals(self, state_id: str = "0", mun_id: str = "0", neighborhood_id: str = "0", date_start: str = "", date_end: str = "", **kwargs) -> requests.Response:
+        """Send a totals request, without decoding its response (see `Scrapper.get_totals(...)`)
+
+        Useful to decode many responses at once with a `RNPDNO.Scrapper.TotalsParser`.
+
+        Returns:
+            requests.Response: The response.
+        """
 
-        self.logger.info("Requesting totals for the following query: {0}...".format(call_arguments))
         self.__before_request_checks()
 
         template = self.get_request_template(api_name = "sociodemographics", end_point = "total")
-        
+
+        # The request itself is logged at INFO by `Scrapper.send_request(...)`. Filters are logged as a tuple, records with
+        # dict arguments are formatted on the calling thread by the queue handler
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(
+                "Requesting totals for the state id %s, municipality id %s and neighborhood id %s (from %s to %s, filters: %s)...",
+                state_id, mun_id, neighborhood_id, date_start or None, date_end or None, tuple(sorted(kwargs.items())) or None, extra = {ENDPOINT_FIELD: label_from_url(template["fullUrl"])}
+            )
+
+        return self.send_request_from_template(template, payload = self.build_totals_payload(state_id, mun_id, neighborhood_id, date_start, date_end, **kwargs))
+
+    def get_totals(self, state_id: str = "0", mun_id: str = "0", neighborhood_id: str = "0", date_start: str = "", date_end: str = "", include_percentages: bool = False, **kwargs) -> dict:
+
+        r = self.request_totals(state_id, mun_id, neighborhood_id, date_start, date_end, **kwargs)
+
+        # Get JSON
+        r_content_as_dict = self.decode_json(r)
+
+        return self.format_totals(r_content_as_dict, state_id = state_id, mun_id = mun_id, neighborhood_id = neighborhood_id, date_start = date_start, date_end = date_end, include_percentages = include_percentages)
+
+    def get_missing_by_neighborhood(self, state_id: str, mun_id: str, neighborhood_id: str = "0", date_start: str = "", date_end: str = "", resolve_ids: bool = True, allow_truncated: bool = False, **kwargs) -> list:
+        """Get the number of persons by sex for the neighborhoods of a municipality in a single request
+
+        This method uses the BarChartSexoColonia end-point, which returns the counts of the neighborhoods of a municipality
+        at once, instead of one `Scrapper.get_totals(...)` request per neighborhood.
+
+        The server only charts the 30 neighborhoods with the most records (see `MAX_CHART_NEIGHBORHOODS`), so the chart
+        is not the full breakdown of municipalities with more neighborhoods. A chart with 30 neighborhoods is truncated,
+        unless the municipality has no more neighborhoods in the catalogue (only checked with resolve_ids). Truncated
+        charts raise `TruncatedChart`, unless allow_truncated is True (rows are then flagged with `truncated`).
+
+        The response's table holds the totals by sex of the municipality, including the persons whose neighborhood is
+        unknown. The gap between the table and the sum of the chart is returned as `unattributed` (it also includes the
+        neighborhoods left out of a truncated chart).
+
+        The end-point identifies neighborhoods by name, so with resolve_ids, neighborhood ids are resolved with the
+        neighborhood catalogue, which costs a second request per municipality (cached only if a response cache is set).
+        Names shared by several neighborhoods of the municipality (e.g. "CENTRO") can't be resolved.
+
+        Args:
+            state_id (str): Id of the state.
+            mun_id (str): Id of the municipality.
+            neighborhood_id (str, optional): Id of a neighborhood to filter by. Defaults to "0" (all neighborhoods).
+            date_start (str, optional): Start date of the query. Defaults to "".
+            date_end (str, optional): End date of the query. Defaults to "".
+            resolve_ids (bool, optional): Should neighborhood names be resolved to ids (one more request)? Defaults to True.
+            allow_truncated (bool, optional): Should a truncated chart be returned instead of raising an error? Defaults to False.
+            **kwargs: Additional filters sent in the request payload (e.g. idEstatusVictima).
+
+        Raises:
+            self.Exceptions.TruncatedChart: If the chart leaves out neighborhoods with records and allow_truncated is False.
+
+        Returns:
+            list: A list of dicts (one per neighborhood and sex) with the keys `state_id`, `mun_id`, `neighborhood_id`,
+                `neighborhood_name`, `sex`, `total`, `truncated`, `unattributed`, `date_start` and `date_end`.
+                `neighborhood_id` is None if the name couldn't be resolved (unknown or shared by several neighborhoods)
+                or resolve_ids is False. `unattributed` is the number of persons of the sex not charted in any
+                neighborhood, or None if the response has no table.
+        """
+
+        self.logger.info("Requesting missing persons by neighborhood for the state id %s and municipality id %s...", state_id, mun_id)
+        self.__before_request_checks()
+
+        template = self.get_request_template(api_name = "sociodemographics", end_point = "sex_by_neighborhood")
+
         r = self.send_request_from_template(template, payload = {"idEstado": state_id, "idMunicipio": mun_id, "idColonia": neighborhood_id, "fechaInicio": date_start, "fechaFin": date_end, **kwargs})
 
         # Get JSON
-        r_content_as_dict = r.json()
-
-        # Get information
-        return_dict = {
-            "total": r_content_as_dict["TotalGlobal"],
-            "desaparecidos_y_nolocalizados": r_content_as_dict["TotalDesaparecidos"],
-            "desaparecidos": r_content_as_dict["TotalSoloDesaparecidos"],
-            "nolocalizados": r_content_as_dict["TotalSoloNoLocalizados"],
-            "localizados": r_content_as_dict["TotalLocalizados"],
-            "localizados_sin_vida": r_content_as_dict["TotalLocalizadosSV"],
-            "localizados_con_vida": r_content_as_dict["TotalLocalizadosCV"],
-        }
-
-        # Coerce information as int
-        for key in return_dict.keys():
-            val = return_dict[key]
-            return_dict[key] = self.formatted_str_as_int(val)
+        r_content_as_dict = self.decode_json(r)
 
-        return_dict.update({
-            "state_id": state_id,
-            "mun_id": mun_id, 
-            "date_start": date_start if date_start != "" else None,
-            "date_end": date_end if date_end != "" else None,
-        })
+        categories, series = self.format_chart_series(r_content_as_dict)
+        table = self.format_chart_table(r_content_as_dict)
 
-        return return_dict
+        # Map neighborhood names to ids, names shared by several neighborhoods are mapped to None
+        neighborhood_ids = {}
+        n_neighborhoods = None
+
+        if resolve_ids:
+            n_neighborhoods = 0
+
+            for neighborhood in self.iter_neighborhood_catalogue(state_id, mun_id, drop_all = True):
+                n_neighborhoods += 1
+
+                if neighborhood_ids.get(neighborhood.name, neighborhood.id) != neighborhood.id:
+                    neighborhood_ids[neighborhood.name] = None
+                else:
+                    neighborhood_ids[neighborhood.name] = neighborhood.id
+
+        # A full chart leaves out neighborhoods, unless the catalogue has no more
+        truncated = len(categories) >= self.MAX_CHART_NEIGHBORHOODS and (n_neighborhoods is None or n_neighborhoods > len(categories))
+
+        if truncated:
+            msg = "The chart of the state id {0} and municipality id {1} only has {2} neighborhoods, it leaves out neighborhoods with records!".format(state_id, mun_id, len(categories))
+
+            if not allow_truncated:
+                raise self.Exceptions.TruncatedChart(msg)
+
+            self.logger.warning(msg)
+
+        # Persons of the table not charted in any neighborhood (e.g. unknown neighborhood)
+        unattributed = {sex: table[sex] - sum(data) for sex, data in series.items() if sex in table}
+
+        list_of_rows = []
+
+        for i, name in enumerate(categories):
+            for sex, data in series.items():
+                list_of_rows.append({
+                    "state_id": state_id,
+                    "mun_id": mun_id,
+                    "neighborhood_id": neighborhood_ids.get(name),
+                    "neighborhood_name": name,
+                    "sex": sex,
+                    "total": data[i],
+                    "truncated": truncated,
+                    "unattributed": unattributed.get(sex),
+                    "date_start": date_start if date_start != "" else None,
+                    "date_end": date_end if date_end != "" else None,
+                })
+
+        return list_of_rows
+
+    def get_yearly_series(self, state_id: str = "0", mun_id: str = "0", neighborhood_id: str = "0", date_start: str = "", date_end: str = "", **kwargs) -> YearlySeries:
+        """Get the number of persons by sex and year of a geography in a single request
+
+        This method uses the AreaChartSexoAnio end-point, which returns the counts of every year at once, instead of one
+        `Scrapper.get_totals(...)` request per yearly window.
+
+        Args:
+            state_id (str, optional): Id of the state. Defaults to "0" (the whole country).
+            mun_id (str, optional): Id of the municipality. Defaults to "0" (all municipalities).
+            neighborhood_id (str, optional): Id of the neighborhood. Defaults to "0" (all neighborhoods).
+            date_start (str, optional): Start date of the query. Defaults to "".
+            date_end (str, optional): End date of the query. Defaults to "".
+            **kwargs: Additional filters sent in the request payload (e.g. idEstatusVictima).
+
+        Raises:
+            ValueError: If the response is not a valid chart.
+
+        Returns:
+            YearlySeries: The counts by sex and year (see `YearlySeries.to_records()` and `YearlySeries.as_record()`).
+        """
+
+        self.logger.info("Requesting missing persons by year for the state id %s, municipality id %s and neighborhood id %s...", state_id, mun_id, neighborhood_id)
+        self.__before_request_checks()
+
+        template = self.get_request_template(api_name = "sociodemographics", end_point = "sex_by_year")
+
+        r = self.send_request_from_template(template, payload = {"idEstado": state_id, "idMunicipio": mun_id, "idColonia": neighborhood_id, "fechaInicio": date_start, "fechaFin": date_end, **kwargs})
+
+        # Get JSON
+        r_content_as_dict = self.decode_json(r)
 
-    def get_missing_by_neighborhood(self, state_id: str, mun_id: str, neighborhood_id: str = "0", **kwargs) -> dict:
-        pass
+        try:
+            return YearlySeries.from_chart(r_content_as_dict, state_id, mun_id, neighborhood_id, date_start, date_end)
+        except (KeyError, TypeError, IndexError) as e:
+            raise ValueError("The year series response is not valid: {0}!".format(e)) from e
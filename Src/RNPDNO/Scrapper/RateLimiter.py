@@ -0,0 +1,172 @@
+import threading
+import time
+
+class RateLimiter:
+    """Thread-safe token bucket rate limiter
+
+    The bucket is refilled at `rate` tokens per second and holds at most `burst` tokens.
+    Each call to `acquire(...)` takes one token, blocking the calling thread until a token is available.
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        """Create a new rate limiter
+
+        Args:
+            rate (float): Maximum number of tokens (requests) per second.
+            burst (int, optional): Maximum number of tokens that can be taken at once after an idle period. Defaults to 1.
+
+        Raises:
+            ValueError: If rate or burst are not positive numbers.
+        """
+
+        if rate <= 0:
+            raise ValueError("The rate must be a positive number!")
+
+        if burst < 1:
+            raise ValueError("The burst size must be at least 1!")
+
+        self.__rate = float(rate)
+        self.__burst = int(burst)
+
+        self.__tokens = float(burst)
+        self.__last_refill = time.monotonic()
+        self.__lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        """Current refill rate (tokens per second)
+        """
+        return self.__rate
+
+    @rate.setter
+    def rate(self, value: float) -> None:
+
+        if value <= 0:
+            raise ValueError("The rate must be a positive number!")
+
+        with self.__lock:
+            # Settle the tokens earned at the old rate before switching
+            self.__refill()
+            self.__rate = float(value)
+
+    @property
+    def burst(self) -> int:
+        """Bucket capacity
+        """
+        return self.__burst
+
+    def __refill(self) -> None:
+
+        now = time.monotonic()
+        elapsed = now - self.__last_refill
+
+        self.__tokens = min(self.__burst, self.__tokens + elapsed * self.__rate)
+        self.__last_refill = now
+
+    def acquire(self) -> float:
+        """Take one token from the bucket, waiting if necessary
+
+        Returns:
+            float: Number of seconds the caller was blocked.
+        """
+
+        waited = 0.0
+
+        while True:
+            with self.__lock:
+                self.__refill()
+
+                if self.__tokens >= 1:
+                    self.__tokens -= 1
+                    return waited
+
+                # Time until the next token is available
+                delay = (1 - self.__tokens) / self.__rate
+
+            time.sleep(delay)
+            waited += delay
+
+class AdaptiveRateLimiter(RateLimiter):
+    """Token bucket rate limiter that adapts its rate to the server's health
+
+    The rate is cut by `decrease_factor` every time a request is throttled or fails (additive increase,
+    multiplicative decrease), and raised by `increase_step` tokens per second after every successful request,
+    always within [min_rate, max_rate]. Failures closer than `cooldown` seconds to the last decrease only count once,
+    so a burst of concurrent failures doesn't collapse the rate.
+    """
+
+    def __init__(self, rate: float, min_rate: float = 0.5, max_rate: float = None, burst: int = 1, increase_step: float = 0.1, decrease_factor: float = 0.5, cooldown: float = 1.0) -> None:
+        """Create a new adaptive rate limiter
+
+        Args:
+            rate (float): Initial number of tokens (requests) per second.
+            min_rate (float, optional): Minimum rate. Defaults to 0.5.
+            max_rate (float, optional): Maximum rate. Defaults to None (twice the initial rate).
+            burst (int, optional): Maximum number of tokens that can be taken at once after an idle period. Defaults to 1.
+            increase_step (float, optional): Rate increase after each successful request. Defaults to 0.1.
+            decrease_factor (float, optional): Rate multiplier after a failed request. Defaults to 0.5.
+            cooldown (float, optional): Minimum number of seconds between two decreases. Defaults to 1.0.
+
+        Raises:
+            ValueError: If the rate limits are not consistent.
+        """
+
+        super().__init__(rate, burst)
+
+        max_rate = max_rate if max_rate is not None else 2 * rate
+
+        if not 0 < min_rate <= rate <= max_rate:
+            raise ValueError("The rate limits must satisfy 0 < min_rate <= rate <= max_rate!")
+
+        if not 0 < decrease_factor < 1:
+            raise ValueError("The decrease factor must be between 0 and 1!")
+
+        self.__min_rate = float(min_rate)
+        self.__max_rate = float(max_rate)
+        self.__increase_step = float(increase_step)
+        self.__decrease_factor = float(decrease_factor)
+        self.__cooldown = float(cooldown)
+
+        self.__last_decrease = 0.0
+        self.__feedback_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: dict) -> "AdaptiveRateLimiter":
+        """Create an adaptive rate limiter from a configuration dict (e.g. the `SCRAPPER_RATE_LIMIT` configuration variable)
+
+        Args:
+            config (dict): A dict whose keys are the arguments of `AdaptiveRateLimiter(...)`.
+
+        Returns:
+            AdaptiveRateLimiter: A new rate limiter.
+        """
+
+        return cls(**config)
+
+    @property
+    def min_rate(self) -> float:
+        return self.__min_rate
+
+    @property
+    def max_rate(self) -> float:
+        return self.__max_rate
+
+    def record_success(self) -> None:
+        """Speed up after a successful request
+        """
+
+        with self.__feedback_lock:
+            self.rate = min(self.__max_rate, self.rate + self.__increase_step)
+
+    def record_failure(self) -> None:
+        """Slow down after a throttled or failed request
+        """
+
+        with self.__feedback_lock:
+            now = time.monotonic()
+
+            if now - self.__last_decrease < self.__cooldown:
+                return
+
+            self.__last_decrease = now
+            self.rate = max(self.__min_rate, self.rate * self.__decrease_factor)
@@ -0,0 +1,106 @@
+from typing import Iterable, Union
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+import random
+
+class RetryPolicy:
+    """Retry policy for HTTP requests
+
+    Failed attempts (connection errors, timeouts and responses with a retryable status code) are retried
+    up to `max_attempts` attempts in total, waiting a jittered exponential backoff between attempts. If the server
+    sent a `Retry-After` header, the policy waits at least that long.
+    """
+
+    DEFAULT_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, max_attempts: int = 5, backoff_base: float = 0.5, backoff_max: float = 60.0, retry_statuses: Iterable[int] = DEFAULT_RETRY_STATUSES, timeout: float = 60.0) -> None:
+        """Create a new retry policy
+
+        Args:
+            max_attempts (int, optional): Maximum number of attempts per request (1 disables retries). Defaults to 5.
+            backoff_base (float, optional): Backoff before the second attempt in seconds, doubled on every attempt. Defaults to 0.5.
+            backoff_max (float, optional): Maximum backoff in seconds. Defaults to 60.0.
+            retry_statuses (Iterable[int], optional): HTTP status codes that are retried. Defaults to DEFAULT_RETRY_STATUSES.
+            timeout (float, optional): Timeout of each attempt in seconds. Defaults to 60.0.
+
+        Raises:
+            ValueError: If max_attempts is not a positive number.
+        """
+
+        if max_attempts < 1:
+            raise ValueError("The number of attempts must be at least 1!")
+
+        self.max_attempts = int(max_attempts)
+        self.backoff_base = float(backoff_base)
+        self.backoff_max = float(backoff_max)
+        self.retry_statuses = frozenset(int(status) for status in retry_statuses)
+        self.timeout = timeout
+
+    @classmethod
+    def from_config(cls, config: Union[dict, None]) -> "RetryPolicy":
+        """Create a retry policy from a configuration dict (e.g. the `SCRAPPER_RETRY_POLICY` configuration variable)
+
+        Args:
+            config (Union[dict, None]): A dict whose keys are the arguments of `RetryPolicy(...)`. None returns the default policy.
+
+        Returns:
+            RetryPolicy: A new retry policy.
+        """
+
+        return cls(**(config or {}))
+
+    def should_retry(self, status_code: int) -> bool:
+
+        return status_code in self.retry_statuses
+
+    @staticmethod
+    def parse_retry_after(value: Union[str, None]) -> Union[float, None]:
+        """Parse the value of a `Retry-After` header
+
+        Args:
+            value (Union[str, None]): Header value, in seconds or as an HTTP date.
+
+        Returns:
+            float: Number of seconds to wait.
+            None: If the header is missing or not valid.
+        """
+
+        if value is None:
+            return None
+
+        value = value.strip()
+
+        if value.isdigit():
+            return float(value)
+
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo = timezone.utc)
+
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+    def compute_delay(self, attempt: int, retry_after: Union[str, None] = None) -> float:
+        """Compute the delay before the next attempt
+
+        Args:
+            attempt (int): Number of the attempt that just failed (starting at 1).
+            retry_after (Union[str, None], optional): Value of the `Retry-After` header of the failed response. Defaults to None.
+
+        Returns:
+            float: Delay in seconds.
+        """
+
+        # Full jitter exponential backoff
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+        retry_after = self.parse_retry_after(retry_after)
+
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+
+        return delay
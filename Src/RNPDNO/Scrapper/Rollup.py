@@ -0,0 +1,370 @@
+from typing import Iterable, Union
+
+from RNPDNO.Scrapper.Windows import TOTALS_FIELDS
+
+import json
+
+# Geographic levels, from the leaves to the root
+LEVELS = ("neighborhood", "municipality", "state", "national")
+
+# Id fields of a geography
+GEOGRAPHY_FIELDS = ("state_id", "mun_id", "neighborhood_id")
+
+# Fields that identify a query besides its geography. Leaves of different windows or filters are never added up.
+QUERY_FIELDS = ("date_start", "date_end", "filters")
+
+def geography_level(state_id: str, mun_id: str = "0", neighborhood_id: str = "0") -> str:
+    """Get the geographic level of a geography from its ids ("0" means all the children)
+    """
+
+    if str(neighborhood_id) not in ("0", ""):
+        return "neighborhood"
+
+    if str(mun_id) not in ("0", ""):
+        return "municipality"
+
+    if str(state_id) not in ("0", ""):
+        return "state"
+
+    return "national"
+
+def parent_ids(state_id: str, mun_id: str, neighborhood_id: str, level: str) -> tuple:
+    """Get the ids of the ancestor of a geography at a level
+    """
+
+    if level == "neighborhood":
+        return (str(state_id), str(mun_id), str(neighborhood_id))
+
+    if level == "municipality":
+        return (str(state_id), str(mun_id), "0")
+
+    if level == "state":
+        return (str(state_id), "0", "0")
+
+    return ("0", "0", "0")
+
+def filters_key(filters: Union[dict, str, None]) -> str:
+    """Build a hashable key of the additional filters of a record ("" if it has none)
+
+    Filters may be a dict (records) or a JSON string (`TotalsParser.to_numpy()`). Values are coerced as strings, since
+    they are sent as form data, so {"idEstatusVictima": 7} and '{"idEstatusVictima": "7"}' have the same key.
+    """
+
+    if isinstance(filters, str):
+        filters = json.loads(filters) if filters else None
+
+    if not filters:
+        return ""
+
+    return json.dumps({str(name): str(value) for name, value in filters.items()}, sort_keys = True)
+
+class TotalsRollup:
+    """Parent totals computed locally from leaf totals
+
+    The totals of a municipality, state or the whole country are the sums of the totals of their children, so once the
+    leaves are fetched (e.g. every municipality with `Crawler.fetch_totals_table(...)`), the upper levels don't need
+    their own requests. Leaves are grouped by ancestor, date window and filters with NumPy, sorting the group codes
+    once and adding the rows of each group with `numpy.add.reduceat`.
+
+    If the catalogue is supplied, every parent records how many leaves it has in the catalogue, so parents with missing
+    (e.g. failed) leaves are flagged as incomplete. `TotalsRollup.audit(...)` compares the computed totals with
+    totals sent by the server.
+
+    Note that the server counts persons whose municipality (or neighborhood) is unknown in the totals of the parent
+    only, so rolled-up totals are lower bounds of the server's totals when the leaves are below the state level. Such
+    totals, and the totals of incomplete parents, are flagged with `lower_bound`.
+
+    Usage:
+        table, failed_units = crawler.fetch_totals_table(crawler.iter_totals_units(level = "municipality"), output = "numpy")
+        rollup = TotalsRollup(table, leaf_level = "municipality", catalogue = units)
+        states = rollup.to_records(levels = ("state", "national"))
+    """
+
+    def __init__(self, leaves: Union[dict, Iterable[dict]], leaf_level: str = "municipality", fields: Iterable[str] = TOTALS_FIELDS, catalogue: Iterable[dict] = None) -> None:
+        """Index the leaf totals
+
+        Requires numpy.
+
+        Args:
+            leaves (dict or Iterable[dict]): Leaf totals, as records (see `Scrapper.get_totals(...)`) or as a dict of columns (see `TotalsParser.to_numpy()`).
+            leaf_level (str, optional): Geographic level of the leaves ("neighborhood", "municipality" or "state"). Defaults to "municipality".
+            fields (Iterable[str], optional): Numeric fields added up. Defaults to TOTALS_FIELDS.
+            catalogue (Iterable[dict], optional): Leaf geographies, dicts with the keys `state_id`, `mun_id` and `neighborhood_id` (e.g. from `Crawler.iter_catalogue(...)` or `Crawler.iter_totals_units(...)`). Defaults to None (completeness is not checked).
+
+        Raises:
+            ValueError: If the leaf level is not valid or a leaf is not at the leaf level.
+        """
+
+        try:
+            import numpy as np
+        except ImportError as e:
+            raise ImportError("Rolling up totals requires numpy (pip install numpy)!") from e
+
+        if leaf_level not in LEVELS[:-1]:
+            raise ValueError("The leaf level must be one of neighborhood, municipality or state!")
+
+        self.__np = np
+        self.__leaf_level = leaf_level
+        self.__fields = tuple(fields)
+
+        # Columns of the leaves
+        if isinstance(leaves, dict):
+            columns = leaves
+            n_leaves = len(columns[GEOGRAPHY_FIELDS[0]])
+            self.__values = np.column_stack([np.asarray(columns[field], dtype = np.int64) for field in self.__fields]) if n_leaves > 0 else np.zeros((0, len(self.__fields)), dtype = np.int64)
+        else:
+            leaves = list(leaves)
+            columns = {field: [leaf.get(field) for leaf in leaves] for field in GEOGRAPHY_FIELDS + QUERY_FIELDS}
+            n_leaves = len(leaves)
+            self.__values = np.array([[leaf[field] for field in self.__fields] for leaf in leaves], dtype = np.int64).reshape(n_leaves, len(self.__fields))
+
+        key_columns = [
+            [str(value) for value in columns["state_id"]],
+            [str(value) for value in columns["mun_id"]],
+            [str(value) for value in columns["neighborhood_id"]],
+            [value or "" for value in columns.get("date_start", [""] * n_leaves)],
+            [value or "" for value in columns.get("date_end", [""] * n_leaves)],
+            [filters_key(value) for value in columns.get("filters", [None] * n_leaves)]
+        ]
+
+        # Encode the key columns once as ints (an index into the sorted unique values)
+        self.__uniques = []
+        self.__codes = []
+
+        for column in key_columns:
+            uniques, codes = np.unique(np.array(column, dtype = str), return_inverse = True)
+            self.__uniques.append(uniques.astype(object))
+            self.__codes.append(codes.reshape(-1))
+
+        # The ids of a leaf are "0" above its level and set from its level down
+        level_position = LEVELS.index(leaf_level)
+
+        for i, field in enumerate(GEOGRAPHY_FIELDS):
+            is_set = ~np.isin(self.__uniques[i], ("0", "")).astype(bool)[self.__codes[i]]
+            must_be_set = i <= len(GEOGRAPHY_FIELDS) - 1 - level_position
+
+            if n_leaves > 0 and not (is_set.all() if must_be_set else not is_set.any()):
+                raise ValueError("Every leaf must be at the {0} level, check the {1} field!".format(leaf_level, field))
+
+        # Number of leaves of every geography in the catalogue, by level
+        self.__expected = None
+
+        if catalogue is not None:
+            leaf_ids = {parent_ids(item["state_id"], item.get("mun_id", 0), item.get("neighborhood_id", 0), leaf_level) for item in catalogue}
+            self.__expected = {}
+
+            for ids in leaf_ids:
+                for level in self.levels:
+                    key = (level, parent_ids(*ids, level))
+                    self.__expected[key] = self.__expected.get(key, 0) + 1
+
+        # Aggregates by level, computed on demand
+        self.__aggregates = {}
+
+    def __len__(self) -> int:
+        return len(self.__values)
+
+    @property
+    def leaf_level(self) -> str:
+        return self.__leaf_level
+
+    @property
+    def fields(self) -> tuple:
+        return self.__fields
+
+    @property
+    def levels(self) -> tuple:
+        """Levels above the leaf level
+        """
+        return LEVELS[LEVELS.index(self.leaf_level) + 1:]
+
+    def aggregate(self, level: str) -> dict:
+        """Add up the leaves of every geography of a level
+
+        Args:
+            level (str): A level above the leaf level ("municipality", "state" or "national").
+
+        Raises:
+            ValueError: If the level is not above the leaf level.
+
+        Returns:
+            dict: One item per geography and query: the ids and query fields as object arrays, the totals as int64 arrays,
+                `n_leaves` (number of leaves added up), `n_expected` (number of leaves in the catalogue, -1 if unknown),
+                `complete` (did every leaf of the catalogue have totals?) and `lower_bound` (may the server's totals be
+                higher, because the leaves are below the state level or some are missing?).
+        """
+
+        if level not in self.levels:
+            raise ValueError("The level must be one of {0}!".format(", ".join(self.levels)))
+
+        if level not in self.__aggregates:
+            self.__aggregates[level] = self.__aggregate(level)
+
+        return self.__aggregates[level]
+
+    def __aggregate(self, level: str) -> dict:
+
+        np = self.__np
+
+        # Geography ids kept by the parents of the level (e.g. only the state id for the state level)
+        kept = len(GEOGRAPHY_FIELDS) - LEVELS.index(level)
+        key_positions = list(range(kept)) + list(range(len(GEOGRAPHY_FIELDS), len(self.__codes)))
+
+        # Combine the codes of the key columns into a single group code, kept dense so it never overflows
+        codes = np.zeros(len(self), dtype = np.int64)
+
+        for i in key_positions:
+            codes = np.unique(codes * len(self.__uniques[i]) + self.__codes[i], return_inverse = True)[1].reshape(-1)
+
+        group_codes, group_index = np.unique(codes, return_inverse = True)
+        n_groups = len(group_codes)
+
+        # Sort the leaves by group once and add up the contiguous rows of each group
+        order = np.argsort(group_index, kind = "stable")
+        counts = np.bincount(group_index, minlength = n_groups)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1])) if n_groups > 0 else np.zeros(0, dtype = np.int64)
+        sums = np.add.reduceat(self.__values[order], starts, axis = 0) if n_groups > 0 else np.zeros((0, len(self.fields)), dtype = np.int64)
+
+        # Decode the key columns of every group from the first leaf of the group
+        first = order[starts] if n_groups > 0 else np.zeros(0, dtype = np.int64)
+        columns = {}
+
+        for i, field in enumerate(GEOGRAPHY_FIELDS + QUERY_FIELDS):
+            if i in key_positions:
+                columns[field] = self.__uniques[i][self.__codes[i][first]]
+            else:
+                columns[field] = np.full(n_groups, "0", dtype = object)
+
+        for j, field in enumerate(self.fields):
+            columns[field] = sums[:, j]
+
+        columns["n_leaves"] = counts.astype(np.int64)
+
+        if self.__expected is not None:
+            columns["n_expected"] = np.array([self.__expected.get((level, ids), 0) for ids in zip(*(columns[field] for field in GEOGRAPHY_FIELDS))], dtype = np.int64)
+            columns["complete"] = columns["n_leaves"] >= columns["n_expected"]
+        else:
+            columns["n_expected"] = np.full(n_groups, -1, dtype = np.int64)
+            columns["complete"] = np.ones(n_groups, dtype = bool)
+
+        # Persons with an unknown municipality (or neighborhood) are only counted by the parents on the server
+        columns["lower_bound"] = ~columns["complete"] | (LEVELS.index(self.leaf_level) < LEVELS.index("state"))
+
+        return columns
+
+    def to_records(self, levels: Iterable[str] = None) -> list:
+        """Build one record per computed geography and query, as returned by `Scrapper.get_totals(...)`
+
+        Records have the extra keys `level`, `n_leaves`, `n_expected`, `complete` and `lower_bound`. Records flagged as
+        lower bounds can't replace the server's totals of the geography. Empty dates are None and the filters key is
+        only set for queries with filters.
+
+        Args:
+            levels (Iterable[str], optional): Levels to compute. Defaults to None (every level above the leaf level).
+
+        Returns:
+            list: The records.
+        """
+
+        list_of_rows = []
+
+        for level in (levels if levels is not None else self.levels):
+            columns = self.aggregate(level)
+
+            for i in range(len(columns["n_leaves"])):
+                record = {field: columns[field][i] for field in GEOGRAPHY_FIELDS}
+
+                for field in self.fields:
+                    record[field] = int(columns[field][i])
+
+                record["date_start"] = columns["date_start"][i] or None
+                record["date_end"] = columns["date_end"][i] or None
+
+                if columns["filters"][i] != "":
+                    record["filters"] = json.loads(columns["filters"][i])
+
+                record["level"] = level
+                record["n_leaves"] = int(columns["n_leaves"][i])
+                record["n_expected"] = int(columns["n_expected"][i])
+                record["complete"] = bool(columns["complete"][i])
+                record["lower_bound"] = bool(columns["lower_bound"][i])
+
+                list_of_rows.append(record)
+
+        return list_of_rows
+
+    def audit(self, server_records: Iterable[dict], tolerance: int = 0) -> list:
+        """Compare the computed totals with the totals sent by the server for the same geographies and queries
+
+        Args:
+            server_records (Iterable[dict]): Records of parent geographies (see `Scrapper.get_totals(...)`). Records without a computed counterpart are ignored.
+            tolerance (int, optional): Largest absolute difference of a field that is not flagged. Defaults to 0.
+
+        Returns:
+            list: One dict per flagged geography and query, with its ids and query fields, `level`, `complete`, `lower_bound`
+                and `differences`, a dict mapping every flagged field to the server's total minus the computed total.
+        """
+
+        np = self.__np
+
+        server_records = list(server_records)
+        by_level = {}
+
+        for record in server_records:
+            level = geography_level(record["state_id"], record.get("mun_id", 0), record.get("neighborhood_id", 0))
+
+            if level in self.levels:
+                by_level.setdefault(level, []).append(record)
+
+        mismatches = []
+
+        for level, records in by_level.items():
+            columns = self.aggregate(level)
+
+            positions = {
+                key: i for i, key in enumerate(zip(*(columns[field] for field in GEOGRAPHY_FIELDS + QUERY_FIELDS)))
+            }
+
+            rows = []
+            matched = []
+
+            for record in records:
+                key = (
+                    str(record["state_id"]), str(record.get("mun_id", 0)), str(record.get("neighborhood_id", 0)),
+                    record.get("date_start") or "", record.get("date_end") or "", filters_key(record.get("filters"))
+                )
+
+                if key in positions:
+                    rows.append(positions[key])
+                    matched.append(record)
+
+            if len(rows) == 0:
+                continue
+
+            # Differences of every matched geography and field at once
+            computed = np.column_stack([columns[field][rows] for field in self.fields])
+            server = np.array([[record[field] for field in self.fields] for record in matched], dtype = np.int64)
+            differences = server - computed
+            flagged = np.abs(differences) > tolerance
+
+            for k in np.flatnonzero(flagged.any(axis = 1)):
+                i = rows[k]
+
+                mismatch = {
+                    **{field: columns[field][i] for field in GEOGRAPHY_FIELDS},
+                    "date_start": columns["date_start"][i] or None,
+                    "date_end": columns["date_end"][i] or None
+                }
+
+                if columns["filters"][i] != "":
+                    mismatch["filters"] = json.loads(columns["filters"][i])
+
+                mismatches.append({
+                    **mismatch,
+                    "level": level,
+                    "complete": bool(columns["complete"][i]),
+                    "lower_bound": bool(columns["lower_bound"][i]),
+                    "differences": {field: int(differences[k, j]) for j, field in enumerate(self.fields) if flagged[k, j]}
+                })
+
+        return mismatches
@@ -0,0 +1,223 @@
+from typing import Iterable, NamedTuple, Union
+
+from RNPDNO.Scrapper.Totals import parse_int
+
+from array import array
+
+def parse_year(category: str) -> Union[int, None]:
+    """Parse a year category of a chart (None if it's not a year, e.g. "1.CIFRA SIN  AÑO DE REFERENCIA")
+    """
+
+    category = str(category).strip()
+
+    return int(category) if category.isdigit() else None
+
+class YearlySeries(NamedTuple):
+    """Number of persons by sex and year of a geography
+
+    Counts are stored as one `array.array` of int64 per sex, aligned with `years` (the years with records, as sent by
+    the server, in ascending order). Persons without a reference year are counted in `undated`, one int per sex.
+    """
+
+    state_id: str
+    mun_id: str
+    neighborhood_id: str
+    date_start: Union[str, None]
+    date_end: Union[str, None]
+    years: tuple
+    sexes: tuple
+    counts: tuple
+    undated: tuple
+
+    @classmethod
+    def from_chart(cls, content: dict, state_id: str = "0", mun_id: str = "0", neighborhood_id: str = "0", date_start: str = "", date_end: str = "") -> "YearlySeries":
+        """Build a series from the content of an AreaChartSexoAnio response
+
+        Args:
+            content (dict): Decoded JSON content of the response, with `XAxisCategories` and `Series` fields.
+            state_id (str, optional): Id of the queried state. Defaults to "0".
+            mun_id (str, optional): Id of the queried municipality. Defaults to "0".
+            neighborhood_id (str, optional): Id of the queried neighborhood. Defaults to "0".
+            date_start (str, optional): Start date of the query. Defaults to "".
+            date_end (str, optional): End date of the query. Defaults to "".
+
+        Returns:
+            YearlySeries: The series.
+        """
+
+        categories = [parse_year(category) for category in content["XAxisCategories"] or []]
+
+        # Sort the years once, the data of every sex follows the same order
+        order = sorted((i for i, year in enumerate(categories) if year is not None), key = lambda i: categories[i])
+        undated_positions = [i for i, year in enumerate(categories) if year is None]
+
+        sexes = []
+        counts = []
+        undated = []
+
+        for obj in content["Series"] or []:
+            data = [value if isinstance(value, int) else parse_int(str(value)) for value in obj["data"]]
+
+            sexes.append(obj["name"])
+            counts.append(array("q", (data[i] for i in order)))
+            undated.append(sum(data[i] for i in undated_positions))
+
+        return cls(
+            state_id = str(state_id),
+            mun_id = str(mun_id),
+            neighborhood_id = str(neighborhood_id),
+            date_start = date_start or None,
+            date_end = date_end or None,
+            years = tuple(categories[i] for i in order),
+            sexes = tuple(sexes),
+            counts = tuple(counts),
+            undated = tuple(undated)
+        )
+
+    @classmethod
+    def from_record(cls, record: dict) -> "YearlySeries":
+        """Rebuild a series from a record (see `YearlySeries.as_record()`)
+        """
+
+        return cls(
+            state_id = record["state_id"],
+            mun_id = record["mun_id"],
+            neighborhood_id = record["neighborhood_id"],
+            date_start = record.get("date_start"),
+            date_end = record.get("date_end"),
+            years = tuple(record["years"]),
+            sexes = tuple(record["sexes"]),
+            counts = tuple(array("q", counts) for counts in record["counts"]),
+            undated = tuple(record["undated"])
+        )
+
+    def as_record(self) -> dict:
+        """Build a single record with the whole series, e.g. to write it into a sink
+
+        Returns:
+            dict: The query identifiers, plus the `years`, `sexes`, `counts` (a list of lists, one per sex) and `undated` fields.
+        """
+
+        return {
+            "state_id": self.state_id,
+            "mun_id": self.mun_id,
+            "neighborhood_id": self.neighborhood_id,
+            "date_start": self.date_start,
+            "date_end": self.date_end,
+            "years": list(self.years),
+            "sexes": list(self.sexes),
+            "counts": [counts.tolist() for counts in self.counts],
+            "undated": list(self.undated)
+        }
+
+    def get(self, sex: str) -> array:
+        """Get the counts of a sex, aligned with `years`
+
+        Raises:
+            KeyError: If the series has no counts for that sex.
+        """
+
+        try:
+            return self.counts[self.sexes.index(sex)]
+        except ValueError as e:
+            raise KeyError(sex) from e
+
+    def totals(self) -> array:
+        """Get the counts of every sex added up, aligned with `years`
+        """
+
+        return array("q", (sum(values) for values in zip(*self.counts))) if len(self.counts) > 0 else array("q", [0] * len(self.years))
+
+    def dense(self, start_year: int = None, end_year: int = None) -> "YearlySeries":
+        """Fill the years without records with zeros
+
+        Args:
+            start_year (int, optional): First year of the series. Defaults to None (the first year with records).
+            end_year (int, optional): Last year of the series. Defaults to None (the last year with records).
+
+        Returns:
+            YearlySeries: A series with one count per year between start_year and end_year. Counts of years out of the range are dropped.
+        """
+
+        if len(self.years) == 0 and (start_year is None or end_year is None):
+            return self
+
+        start_year = start_year if start_year is not None else self.years[0]
+        end_year = end_year if end_year is not None else self.years[-1]
+
+        positions = {year: i for i, year in enumerate(self.years)}
+        years = tuple(range(start_year, end_year + 1))
+
+        counts = tuple(
+            array("q", (values[positions[year]] if year in positions else 0 for year in years))
+            for values in self.counts
+        )
+
+        return self._replace(years = years, counts = counts)
+
+    def to_records(self) -> list:
+        """Build one record per year and sex, with the keys `state_id`, `mun_id`, `neighborhood_id`, `year`, `sex`, `total`,
+        `date_start` and `date_end`. Persons without a reference year have a None year.
+        """
+
+        list_of_rows = []
+        ids = {"state_id": self.state_id, "mun_id": self.mun_id, "neighborhood_id": self.neighborhood_id}
+
+        for sex, values, undated in zip(self.sexes, self.counts, self.undated):
+            for year, total in zip(self.years + (None, ), values.tolist() + [undated]):
+                list_of_rows.append({**ids, "year": year, "sex": sex, "total": total, "date_start": self.date_start, "date_end": self.date_end})
+
+        return list_of_rows
+
+def stack_yearly_series(series: Iterable[YearlySeries], start_year: int = None, end_year: int = None) -> dict:
+    """Stack the series of many geographies into dense NumPy arrays
+
+    Requires numpy.
+
+    Args:
+        series (Iterable[YearlySeries]): Series (e.g. from `Crawler.iter_yearly_series(...)`).
+        start_year (int, optional): First year. Defaults to None (the first year with records of any series).
+        end_year (int, optional): Last year. Defaults to None (the last year with records of any series).
+
+    Returns:
+        dict: `years` (n_years), `sexes` (n_sexes), `state_id`, `mun_id` and `neighborhood_id` (n_series), `counts`
+            (n_series × n_sexes × n_years, int64) and `undated` (n_series × n_sexes, int64).
+    """
+
+    try:
+        import numpy as np
+    except ImportError as e:
+        raise ImportError("Stacking series requires numpy (pip install numpy)!") from e
+
+    series = list(series)
+
+    all_years = sorted({year for item in series for year in item.years})
+    start_year = start_year if start_year is not None else (all_years[0] if all_years else 0)
+    end_year = end_year if end_year is not None else (all_years[-1] if all_years else start_year - 1)
+
+    # Sexes in order of appearance
+    sexes = list(dict.fromkeys(sex for item in series for sex in item.sexes))
+    sex_positions = {sex: i for i, sex in enumerate(sexes)}
+
+    years = np.arange(start_year, end_year + 1, dtype = np.int64)
+    counts = np.zeros((len(series), len(sexes), len(years)), dtype = np.int64)
+    undated = np.zeros((len(series), len(sexes)), dtype = np.int64)
+
+    for i, item in enumerate(series):
+        item_years = np.asarray(item.years, dtype = np.int64)
+        in_range = (item_years >= start_year) & (item_years <= end_year)
+
+        for sex, values, item_undated in zip(item.sexes, item.counts, item.undated):
+            j = sex_positions[sex]
+            counts[i, j, item_years[in_range] - start_year] = np.frombuffer(values, dtype = np.int64)[in_range] if len(values) > 0 else 0
+            undated[i, j] = item_undated
+
+    return {
+        "years": years,
+        "sexes": np.array(sexes, dtype = object),
+        "state_id": np.array([item.state_id for item in series], dtype = object),
+        "mun_id": np.array([item.mun_id for item in series], dtype = object),
+        "neighborhood_id": np.array([item.neighborhood_id for item in series], dtype = object),
+        "counts": counts,
+        "undated": undated
+    }
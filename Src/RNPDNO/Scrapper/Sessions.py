@@ -0,0 +1,267 @@
+from typing import Callable, NamedTuple
+
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.adapters import HTTPAdapter
+
+import requests
+
+import threading
+import logging
+import time
+
+# Init logger
+logger = logging.getLogger(__name__)
+
+def create_pooled_session(pool_maxsize: int = 10) -> requests.Session:
+    """Create a requests session whose connection pools keep up to pool_maxsize connections per host
+    """
+
+    session = requests.Session()
+
+    adapter = HTTPAdapter(pool_connections = pool_maxsize, pool_maxsize = pool_maxsize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    return session
+
+def is_disclaimer_response(response: requests.Response) -> bool:
+    """Check if a response to a data end-point is the disclaimer page
+
+    When the session cookie is missing or expired, the server redirects requests to the welcome message and disclaimer,
+    so the response was redirected or is an HTML page instead of JSON.
+    """
+
+    if len(response.history) > 0:
+        return True
+
+    return "text/html" in response.headers.get("Content-Type", "")
+
+class SessionLease(NamedTuple):
+    """A session handed out by a SessionPool
+
+    The generation identifies the session of a slot, so a session reported as expired twice is only re-initialized once.
+    """
+
+    slot: int
+    generation: int
+    session: requests.Session
+
+class SessionPool:
+    """Pool of pre-warmed requests sessions
+
+    Every session has its own cookie jar and connection pools. Sessions are handed out round-robin, so the workers of
+    a crawl spread over them. When a session's cookie expires (see `is_disclaimer_response(...)`), the session is
+    reported with `SessionPool.report_expired(...)` and replaced by a new one initialized in the background, while the
+    workers go on with the other sessions.
+
+    Usage:
+        pool = SessionPool(create_session, initialize_session, size = 4)
+        pool.start()
+        lease = pool.acquire()
+        r = lease.session.get(url)
+        if is_disclaimer_response(r):
+            pool.report_expired(lease)
+    """
+
+    def __init__(self, create_session: Callable[[], requests.Session], initialize_session: Callable[[requests.Session], None], size: int = 4, acquire_timeout: float = 60.0, retry_delay: float = 1.0, max_retry_delay: float = 60.0) -> None:
+        """Create a new session pool
+
+        Args:
+            create_session (Callable[[], requests.Session]): Function that creates a new session (e.g. `create_pooled_session`).
+            initialize_session (Callable[[requests.Session], None]): Function that gets the session cookie of a session.
+            size (int, optional): Number of sessions. Defaults to 4.
+            acquire_timeout (float, optional): Maximum number of seconds to wait for an initialized session. Defaults to 60.0.
+            retry_delay (float, optional): Seconds to wait before initializing a session again after a failure, doubled after each failure. Defaults to 1.0.
+            max_retry_delay (float, optional): Maximum number of seconds between initialization attempts. Defaults to 60.0.
+
+        Raises:
+            ValueError: If size is not a positive number.
+        """
+
+        if size < 1:
+            raise ValueError("The size of the session pool must be at least 1!")
+
+        self.__create_session = create_session
+        self.__initialize_session = initialize_session
+        self.__size = size
+        self.__acquire_timeout = acquire_timeout
+        self.__retry_delay = retry_delay
+        self.__max_retry_delay = max_retry_delay
+
+        # Session (None while it's being initialized) and generation of each slot
+        self.__sessions = [None] * size
+        self.__generations = [0] * size
+        self.__next_slot = 0
+        self.__closed = False
+        self.__condition = threading.Condition()
+
+        self.__n_reinitializations = 0
+        self.__n_failures = 0
+
+    def __enter__(self) -> "SessionPool":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    @property
+    def size(self) -> int:
+        return self.__size
+
+    @property
+    def stats(self) -> dict:
+        """Pool statistics
+
+        Returns:
+            dict: Number of initialized sessions, number of sessions re-initialized after expiring and number of failed initializations.
+        """
+
+        with self.__condition:
+            return {
+                "ready": sum(session is not None for session in self.__sessions),
+                "reinitializations": self.__n_reinitializations,
+                "failures": self.__n_failures
+            }
+
+    def start(self) -> None:
+        """Create and initialize every session concurrently
+
+        Sessions that fail to initialize are initialized again in the background.
+
+        Raises:
+            Exception: The error of the last failed initialization, if no session could be initialized.
+        """
+
+        logger.info("Initializing %s sessions...", self.size)
+
+        with ThreadPoolExecutor(max_workers = self.size) as executor:
+            futures = [executor.submit(self.__new_session) for _ in range(self.size)]
+
+        error = None
+
+        for slot, future in enumerate(futures):
+            try:
+                self.__set_session(slot, future.result())
+            except Exception as e:
+                error = e
+                self.__count_failure(slot, e)
+                self.__start_reinitialization(slot)
+
+        if self.stats["ready"] == 0:
+            self.close()
+            raise error
+
+        logger.info("Session pool ready! (%s sessions)", self.stats["ready"])
+
+    def acquire(self) -> SessionLease:
+        """Get the next initialized session, waiting for one if every session is being initialized
+
+        Raises:
+            TimeoutError: If no session was initialized within acquire_timeout seconds.
+
+        Returns:
+            SessionLease: The session, with its slot and generation.
+        """
+
+        deadline = time.monotonic() + self.__acquire_timeout
+
+        with self.__condition:
+            while True:
+                if self.__closed:
+                    raise RuntimeError("The session pool is closed!")
+
+                for i in range(self.size):
+                    slot = (self.__next_slot + i) % self.size
+
+                    if self.__sessions[slot] is not None:
+                        self.__next_slot = slot + 1
+                        return SessionLease(slot, self.__generations[slot], self.__sessions[slot])
+
+                remaining = deadline - time.monotonic()
+
+                if remaining <= 0:
+                    raise TimeoutError("No initialized session available after {0} seconds!".format(self.__acquire_timeout))
+
+                self.__condition.wait(remaining)
+
+    def report_expired(self, lease: SessionLease) -> None:
+        """Report that the cookie of a session expired, so it's replaced by a new session initialized in the background
+
+        Sessions already replaced (reported by another worker) are ignored.
+        """
+
+        with self.__condition:
+            if self.__closed or self.__generations[lease.slot] != lease.generation or self.__sessions[lease.slot] is None:
+                return
+
+            self.__sessions[lease.slot] = None
+            self.__generations[lease.slot] += 1
+            self.__n_reinitializations += 1
+
+        # The old session isn't closed, other workers may still be using it
+        logger.warning("The cookie of session %s expired, initializing a new session...", lease.slot)
+
+        self.__start_reinitialization(lease.slot)
+
+    def close(self) -> None:
+
+        with self.__condition:
+            self.__closed = True
+            sessions = [session for session in self.__sessions if session is not None]
+            self.__sessions = [None] * self.size
+            self.__condition.notify_all()
+
+        for session in sessions:
+            session.close()
+
+    def __new_session(self) -> requests.Session:
+
+        session = self.__create_session()
+
+        try:
+            self.__initialize_session(session)
+        except Exception:
+            session.close()
+            raise
+
+        return session
+
+    def __set_session(self, slot: int, session: requests.Session) -> None:
+
+        with self.__condition:
+            if self.__closed:
+                session.close()
+                return
+
+            self.__sessions[slot] = session
+            self.__condition.notify_all()
+
+    def __count_failure(self, slot: int, error: Exception) -> None:
+
+        with self.__condition:
+            self.__n_failures += 1
+
+        logger.warning("Session %s could not be initialized: %s", slot, error)
+
+    def __start_reinitialization(self, slot: int) -> None:
+
+        threading.Thread(target = self.__reinitialize, args = (slot, ), name = "SessionPool-{0}".format(slot), daemon = True).start()
+
+    def __reinitialize(self, slot: int) -> None:
+
+        delay = self.__retry_delay
+
+        while not self.__closed:
+            try:
+                session = self.__new_session()
+            except Exception as e:
+                self.__count_failure(slot, e)
+                time.sleep(delay)
+                delay = min(delay * 2, self.__max_retry_delay)
+                continue
+
+            self.__set_session(slot, session)
+            logger.info("Session %s initialized!", slot)
+            return
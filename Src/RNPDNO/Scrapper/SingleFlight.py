@@ -0,0 +1,115 @@
+from typing import Callable, Hashable, Union
+
+import threading
+
+def request_key(method: str, url: str, payload: Union[dict, None]) -> tuple:
+    """Build the key of a request
+
+    Payload values are coerced as strings, since they are sent as form data (1 and "1" are the same request).
+    """
+
+    normalised_payload = tuple(sorted((str(key), str(value)) for key, value in (payload or {}).items()))
+
+    return (method.upper(), url, normalised_payload)
+
+class _Call:
+
+    __slots__ = ("done", "result", "error", "abandoned")
+
+    def __init__(self) -> None:
+
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+        # The leader was interrupted (e.g. KeyboardInterrupt), its followers must run the function themselves
+        self.abandoned = False
+
+class SingleFlight:
+    """Coalescer of concurrent calls with the same key
+
+    The first caller of a key (the leader) runs the function. Callers of the same key that arrive while the leader's
+    call is in flight wait for it and get its result, or its exception, instead of running the function again. Once
+    the call returns, the key is forgotten, so later callers run the function again (results are not cached).
+
+    Only exceptions (`Exception`) are shared. If the leader is interrupted (e.g. by `KeyboardInterrupt` or `SystemExit`),
+    the interruption is raised in the leader's thread only and its followers call again, one of them as the new leader.
+
+    Usage:
+        single_flight = SingleFlight()
+        r, shared = single_flight.do(request_key("POST", url, payload), session.post, url, data = payload)
+    """
+
+    def __init__(self) -> None:
+
+        self.__calls = {}
+        self.__lock = threading.Lock()
+
+        self.__n_hits = 0
+        self.__n_misses = 0
+
+    @property
+    def stats(self) -> dict:
+        """Coalescing statistics
+
+        Returns:
+            dict: Number of calls that shared a call in flight (hits), number of calls that ran the function (misses) and number of calls in flight.
+        """
+
+        with self.__lock:
+            return {"hits": self.__n_hits, "misses": self.__n_misses, "in_flight": len(self.__calls)}
+
+    def do(self, key: Hashable, function: Callable, *args, **kwargs) -> tuple:
+        """Run a function, or wait for the call in flight with the same key
+
+        Args:
+            key (Hashable): Key of the call (e.g. from `request_key(...)`).
+            function (Callable): Function called with the remaining arguments.
+
+        Raises:
+            Exception: The exception raised by the function (in the leader's call).
+
+        Returns:
+            tuple: The result of the function and whether it was shared with another caller.
+        """
+
+        while True:
+            with self.__lock:
+                call = self.__calls.get(key)
+
+                if call is not None:
+                    self.__n_hits += 1
+                    leader = False
+                else:
+                    call = self.__calls[key] = _Call()
+                    self.__n_misses += 1
+                    leader = True
+
+            if leader:
+                break
+
+            call.done.wait()
+
+            if call.abandoned:
+                continue
+
+            if call.error is not None:
+                raise call.error
+
+            return call.result, True
+
+        try:
+            call.result = function(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        except BaseException:
+            call.abandoned = True
+            raise
+        finally:
+            with self.__lock:
+                del self.__calls[key]
+
+            call.done.set()
+
+        return call.result, False
@@ -0,0 +1,351 @@
+from typing import Callable, Union
+
+from RNPDNO.Scrapper.Windows import TOTALS_FIELDS
+
+import json
+
+# Response field of each totals record field
+TOTALS_RESPONSE_FIELDS = dict(zip(TOTALS_FIELDS, (
+    "TotalGlobal",
+    "TotalDesaparecidos",
+    "TotalSoloDesaparecidos",
+    "TotalSoloNoLocalizados",
+    "TotalLocalizados",
+    "TotalLocalizadosSV",
+    "TotalLocalizadosCV"
+)))
+
+# Percentage fields of totals records (floats, e.g. 23.92 for "23.92 %")
+PERCENTAGE_FIELDS = (
+    "porcentaje_desaparecidos_y_nolocalizados",
+    "porcentaje_localizados",
+    "porcentaje_desaparecidos",
+    "porcentaje_nolocalizados",
+    "porcentaje_localizados_sin_vida",
+    "porcentaje_localizados_con_vida"
+)
+
+# Response field of each percentage record field
+PERCENTAGE_RESPONSE_FIELDS = dict(zip(PERCENTAGE_FIELDS, (
+    "PorcentajeDesaparecidos",
+    "PorcentajeLocalizados",
+    "PorcentajeSoloDesaparecidos",
+    "PorcentajeSoloNoLocalizados",
+    "PorcentajeLocalizadosSV",
+    "PorcentajeLocalizadosCV"
+)))
+
+# Query identifiers of totals records
+ID_FIELDS = ("state_id", "mun_id", "neighborhood_id", "date_start", "date_end")
+
+# JSON decoding backends, fastest first
+JSON_BACKENDS = ("msgspec", "orjson", "json")
+
+def parse_int(value: Union[str, int]) -> int:
+    """Parse a formatted count (e.g. "1,556")
+    """
+
+    # int() already ignores surrounding whitespace
+    return int(value.replace(",", "")) if isinstance(value, str) else int(value)
+
+def parse_percentage(value: Union[str, float, None]) -> Union[float, None]:
+    """Parse a formatted percentage (e.g. "23.92 %")
+
+    Returns:
+        float: The percentage (23.92).
+        None: If the value is empty.
+    """
+
+    if value is None or isinstance(value, (int, float)):
+        return value
+
+    value = value.replace("%", "")
+
+    return float(value) if value.strip() else None
+
+def __get_orjson_loads() -> Union[Callable, None]:
+
+    try:
+        import orjson
+    except ImportError:
+        return None
+
+    return orjson.loads
+
+# Fastest available JSON loads (orjson, if installed)
+json_loads = __get_orjson_loads() or json.loads
+
+def resolve_json_backend(backend: str = "auto") -> str:
+    """Pick the JSON decoding backend of a TotalsParser
+
+    Args:
+        backend (str, optional): "msgspec", "orjson", "json" or "auto" (the fastest one installed). Defaults to "auto".
+
+    Raises:
+        ValueError: If the backend is not valid.
+        ImportError: If the backend is not installed.
+
+    Returns:
+        str: The backend name.
+    """
+
+    if backend == "auto":
+        for candidate in JSON_BACKENDS[:-1]:
+            try:
+                __import__(candidate)
+            except ImportError:
+                continue
+
+            return candidate
+
+        return "json"
+
+    if backend not in JSON_BACKENDS:
+        raise ValueError("The JSON backend must be one of auto, {0}!".format(", ".join(JSON_BACKENDS)))
+
+    if backend != "json":
+        try:
+            __import__(backend)
+        except ImportError as e:
+            raise ImportError("The {0} JSON backend requires {0} (pip install {0})!".format(backend)) from e
+
+    return backend
+
+def build_totals_decoder(response_fields: tuple, backend: str = "auto") -> Callable:
+    """Build a function that decodes a totals response body into a tuple of raw values
+
+    With msgspec, the body is decoded straight into a struct with only the requested fields, so the other fields
+    are skipped instead of being materialised in a dict.
+
+    Args:
+        response_fields (tuple): Response fields to extract, in order.
+        backend (str, optional): JSON decoding backend (see `resolve_json_backend(...)`). Defaults to "auto".
+
+    Returns:
+        Callable: A function that takes a body (bytes or str) and returns the raw values of the fields.
+    """
+
+    backend = resolve_json_backend(backend)
+
+    if backend == "msgspec":
+        import msgspec
+
+        response_type = msgspec.defstruct("TotalsResponse", [(field, Union[str, int, float, None]) for field in response_fields])
+        decoder = msgspec.json.Decoder(response_type)
+        astuple = msgspec.structs.astuple
+
+        def decode_struct(body: Union[bytes, str]) -> tuple:
+
+            try:
+                return astuple(decoder.decode(body))
+            except msgspec.DecodeError as e:
+                # Missing fields and invalid JSON, as the other backends
+                raise ValueError(str(e)) from e
+
+        return decode_struct
+
+    loads = json_loads if backend == "orjson" else json.loads
+
+    def decode(body: Union[bytes, str]) -> tuple:
+
+        content = loads(body)
+
+        return tuple(content[field] for field in response_fields)
+
+    return decode
+
+class TotalsParser:
+    """Columnar parser of totals responses
+
+    Response bodies are decoded as they are added (see `TotalsParser.add(...)`), keeping only the raw values of the
+    totals (and percentages) in one list per column instead of one dict per response. Counts and percentages are
+    coerced once per column when the table is built, with Arrow compute kernels if pyarrow is installed.
+
+    Usage:
+        parser = TotalsParser()
+        for unit, body in responses:
+            parser.add(body, **unit)
+        table = parser.to_arrow()
+    """
+
+    def __init__(self, include_percentages: bool = True, backend: str = "auto") -> None:
+        """Create a new parser
+
+        Args:
+            include_percentages (bool, optional): Should the Porcentaje* fields be parsed? Defaults to True.
+            backend (str, optional): JSON decoding backend ("msgspec", "orjson", "json" or "auto"). Defaults to "auto".
+        """
+
+        self.__int_fields = TOTALS_FIELDS
+        self.__float_fields = PERCENTAGE_FIELDS if include_percentages else ()
+
+        response_fields = tuple(TOTALS_RESPONSE_FIELDS[field] for field in self.__int_fields)
+        response_fields += tuple(PERCENTAGE_RESPONSE_FIELDS[field] for field in self.__float_fields)
+
+        self.__backend = resolve_json_backend(backend)
+        self.__decode = build_totals_decoder(response_fields, self.__backend)
+
+        self.__value_columns = [[] for _ in response_fields]
+        self.__id_columns = {field: [] for field in ID_FIELDS}
+        self.__filters = []
+        self.__has_filters = False
+
+    def __len__(self) -> int:
+        return len(self.__filters)
+
+    @property
+    def backend(self) -> str:
+        return self.__backend
+
+    def add(self, body: Union[bytes, str], state_id: str = "0", mun_id: str = "0", neighborhood_id: str = "0", date_start: str = "", date_end: str = "", filters: dict = None) -> None:
+        """Decode a totals response body and append its values
+
+        Args:
+            body (Union[bytes, str]): Response body (e.g. `requests.Response.content`).
+            state_id (str, optional): Id of the queried state. Defaults to "0".
+            mun_id (str, optional): Id of the queried municipality. Defaults to "0".
+            neighborhood_id (str, optional): Id of the queried neighborhood. Defaults to "0".
+            date_start (str, optional): Start date of the query. Defaults to "".
+            date_end (str, optional): End date of the query. Defaults to "".
+            filters (dict, optional): Additional filters of the query. Defaults to None.
+
+        Raises:
+            ValueError: If the body is not a valid totals response. Nothing is appended.
+        """
+
+        try:
+            values = self.__decode(body)
+        except KeyError as e:
+            raise ValueError("The totals response has no {0} field!".format(e)) from e
+        except TypeError as e:
+            raise ValueError("The totals response is not a JSON object!") from e
+
+        for column, value in zip(self.__value_columns, values):
+            column.append(value)
+
+        self.__id_columns["state_id"].append(str(state_id))
+        self.__id_columns["mun_id"].append(str(mun_id))
+        self.__id_columns["neighborhood_id"].append(str(neighborhood_id))
+        self.__id_columns["date_start"].append(date_start or None)
+        self.__id_columns["date_end"].append(date_end or None)
+
+        self.__filters.append(json.dumps(filters, sort_keys = True) if filters else None)
+        self.__has_filters = self.__has_filters or bool(filters)
+
+    def clear(self) -> None:
+
+        for column in self.__value_columns:
+            column.clear()
+
+        for column in self.__id_columns.values():
+            column.clear()
+
+        self.__filters.clear()
+        self.__has_filters = False
+
+    def __typed_columns(self) -> list:
+
+        n_ints = len(self.__int_fields)
+
+        return [(field, column, True) for field, column in zip(self.__int_fields, self.__value_columns[:n_ints])] + \
+            [(field, column, False) for field, column in zip(self.__float_fields, self.__value_columns[n_ints:])]
+
+    def __id_items(self) -> list:
+
+        items = list(self.__id_columns.items())
+
+        # The filters column is only added to the tables of queries with filters
+        if self.__has_filters:
+            items.append(("filters", self.__filters))
+
+        return items
+
+    @staticmethod
+    def __arrow_column(values: list, is_int: bool):
+
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        target_type = pa.int64() if is_int else pa.float64()
+
+        try:
+            array = pa.array(values)
+
+            if pa.types.is_string(array.type):
+                array = pc.replace_substring(array, ",", "") if is_int else pc.utf8_trim(array, " %")
+
+            return pc.cast(array, target_type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            # Mixed or unusual values (e.g. empty percentages), parse them one by one
+            return pa.array([parse_int(value) if is_int else parse_percentage(value) for value in values], type = target_type)
+
+    def to_arrow(self):
+        """Build an Arrow table with one row per response
+
+        Requires pyarrow.
+
+        Returns:
+            pyarrow.Table: Totals as int64, percentages as float64 and the query identifiers as strings.
+        """
+
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise ImportError("Building an Arrow table requires pyarrow (pip install pyarrow)!") from e
+
+        columns = {field: self.__arrow_column(values, is_int) for field, values, is_int in self.__typed_columns()}
+        columns.update({field: pa.array(values, type = pa.string()) for field, values in self.__id_items()})
+
+        return pa.table(columns)
+
+    def to_numpy(self) -> dict:
+        """Build a dict of NumPy arrays with one item per response
+
+        Requires numpy. Coercion uses Arrow compute kernels if pyarrow is installed.
+
+        Returns:
+            dict: Totals as int64 arrays, percentages as float64 arrays (NaN if empty) and the query identifiers as object arrays.
+        """
+
+        try:
+            import numpy as np
+        except ImportError as e:
+            raise ImportError("Building NumPy arrays requires numpy (pip install numpy)!") from e
+
+        try:
+            import pyarrow
+        except ImportError:
+            pyarrow = None
+
+        columns = {}
+
+        for field, values, is_int in self.__typed_columns():
+            if pyarrow is not None:
+                columns[field] = self.__arrow_column(values, is_int).to_numpy(zero_copy_only = False)
+            elif is_int:
+                columns[field] = np.fromiter((parse_int(value) for value in values), dtype = np.int64, count = len(values))
+            else:
+                columns[field] = np.array([parse_percentage(value) for value in values], dtype = np.float64)
+
+        for field, values in self.__id_items():
+            columns[field] = np.array(values, dtype = object)
+
+        return columns
+
+    def to_records(self) -> list:
+        """Build one record per response, as returned by `Scrapper.get_totals(...)` (plus the percentages, if parsed)
+        """
+
+        fields = [(field, values, is_int) for field, values, is_int in self.__typed_columns()]
+        records = []
+
+        for i in range(len(self)):
+            record = {field: parse_int(values[i]) if is_int else parse_percentage(values[i]) for field, values, is_int in fields}
+            record.update({field: values[i] for field, values in self.__id_columns.items()})
+
+            if self.__filters[i] is not None:
+                record["filters"] = json.loads(self.__filters[i])
+
+            records.append(record)
+
+        return records
@@ -0,0 +1,145 @@
+from typing import Iterable, Union
+from datetime import date, datetime, timedelta
+
+# Date format used by the RNPDNO API (fechaInicio, fechaFin)
+DATE_FORMAT = "%d/%m/%Y"
+
+# Earliest date in the registry
+REGISTRY_START_DATE = "15/03/1964"
+
+# Numeric fields of Scrapper.get_totals(...) records
+TOTALS_FIELDS = (
+    "total",
+    "desaparecidos_y_nolocalizados",
+    "desaparecidos",
+    "nolocalizados",
+    "localizados",
+    "localizados_sin_vida",
+    "localizados_con_vida"
+)
+
+def parse_date(value: Union[str, date]) -> date:
+    """Parse a date in the API format (dd/mm/yyyy)
+    """
+
+    if isinstance(value, date):
+        return value
+
+    return datetime.strptime(value, DATE_FORMAT).date()
+
+def format_date(value: Union[str, date]) -> str:
+    """Format a date in the API format (dd/mm/yyyy)
+    """
+
+    if isinstance(value, str):
+        return value
+
+    return value.strftime(DATE_FORMAT)
+
+def split_date_range(date_start: Union[str, date], date_end: Union[str, date], frequency: str = "month") -> list:
+    """Split a date range into consecutive, non-overlapping windows
+
+    Windows are aligned to calendar months or years, so the first and last windows may be partial.
+    Both ends of every window are inclusive, as in the API's fechaInicio and fechaFin.
+
+    Args:
+        date_start (Union[str, date]): First day of the range.
+        date_end (Union[str, date]): Last day of the range.
+        frequency (str, optional): Window size ("month" or "year"). Defaults to "month".
+
+    Raises:
+        ValueError: If the frequency is not valid.
+
+    Returns:
+        list: A list of (date_start, date_end) tuples of strings in the API format.
+    """
+
+    if frequency not in ("month", "year"):
+        raise ValueError("The frequency must be month or year!")
+
+    date_start = parse_date(date_start)
+    date_end = parse_date(date_end)
+
+    windows = []
+    window_start = date_start
+
+    while window_start <= date_end:
+        # First day of the next window
+        if frequency == "year":
+            next_start = date(window_start.year + 1, 1, 1)
+        elif window_start.month == 12:
+            next_start = date(window_start.year + 1, 1, 1)
+        else:
+            next_start = date(window_start.year, window_start.month + 1, 1)
+
+        window_end = min(date_end, next_start - timedelta(days = 1))
+        windows.append((format_date(window_start), format_date(window_end)))
+
+        window_start = next_start
+
+    return windows
+
+def split_backfill_range(date_start: Union[str, date], date_end: Union[str, date], frequency: str = "month", backfill_frequency: str = None) -> list:
+    """Split a date range that was never scrapped into a backfill of the history and windows of the last period
+
+    The complete periods before the last one are fetched as a single window (or as `backfill_frequency` windows),
+    instead of one window per period, so backfilling the registry costs one request instead of hundreds.
+
+    Args:
+        date_start (Union[str, date]): First day of the range.
+        date_end (Union[str, date]): Last day of the range.
+        frequency (str, optional): Window size of the last period ("month" or "year"). Defaults to "month".
+        backfill_frequency (str, optional): Window size of the history ("month" or "year"). Defaults to None (a single window).
+
+    Raises:
+        ValueError: If a frequency is not valid.
+
+    Returns:
+        list: A list of (date_start, date_end) tuples of strings in the API format.
+    """
+
+    windows = split_date_range(date_start, date_end, frequency = frequency)
+
+    if len(windows) <= 1:
+        return windows
+
+    # End of the last period before the one of date_end
+    history_start, history_end = windows[0][0], windows[-2][1]
+
+    if backfill_frequency is None:
+        history = [(history_start, history_end)]
+    else:
+        history = split_date_range(history_start, history_end, frequency = backfill_frequency)
+
+    return history + windows[-1:]
+
+def combine_totals(records: Iterable[dict]) -> dict:
+    """Combine the totals of several date windows of the same geography into one record
+
+    Args:
+        records (Iterable[dict]): Records returned by `Scrapper.get_totals(...)`.
+
+    Raises:
+        ValueError: If there are no records.
+
+    Returns:
+        dict: A record whose totals are the sum of the records' totals, spanning from the earliest start date to the latest end date.
+    """
+
+    records = list(records)
+
+    if len(records) == 0:
+        raise ValueError("There must be at least one record to combine!")
+
+    combined = dict(records[0])
+
+    for field in TOTALS_FIELDS:
+        combined[field] = sum(record[field] for record in records)
+
+    start_dates = [parse_date(record["date_start"]) for record in records if record.get("date_start")]
+    end_dates = [parse_date(record["date_end"]) for record in records if record.get("date_end")]
+
+    combined["date_start"] = format_date(min(start_dates)) if len(start_dates) == len(records) else None
+    combined["date_end"] = format_date(max(end_dates)) if len(end_dates) == len(records) else None
+
+    return combined
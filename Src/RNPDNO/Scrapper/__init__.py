@@ -0,0 +1,9 @@
+from .Core import Scrapper
+from .RateLimiter import RateLimiter, AdaptiveRateLimiter
+from .Retry import RetryPolicy
+from .Catalogue import CatalogueItem, iter_catalogue_items
+from .Totals import TotalsParser, TOTALS_RESPONSE_FIELDS, PERCENTAGE_FIELDS, PERCENTAGE_RESPONSE_FIELDS, parse_int, parse_percentage
+from .Rollup import TotalsRollup, LEVELS, geography_level, parent_ids
+from .Series import YearlySeries, parse_year, stack_yearly_series
+from .SingleFlight import SingleFlight, request_key
+from .Sessions import SessionPool, SessionLease, create_pooled_session, is_disclaimer_response
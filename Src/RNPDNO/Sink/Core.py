@@ -0,0 +1,238 @@
+from typing import Iterable
+
+import pymongo as pm
+from pymongo import UpdateOne
+
+import threading
+import logging
+import time
+
+# Init logger
+logger = logging.getLogger(__name__)
+
+class MongoSink:
+    """Buffered, batched writer of scrapped records into a MongoDB collection
+
+    Records (the dicts returned by `Scrapper.get_totals(...)`, the catalogue getters or the Crawler) are buffered
+    and flushed with a single unordered `bulk_write` of upserts, keyed on `key_fields`. The buffer is flushed when it
+    holds `batch_size` records, or by a background thread when `flush_interval` seconds have passed since the last
+    flush (so records written before an idle period are not left in the buffer).
+
+    The sink is thread-safe, so it can be shared by the workers of a crawl. The buffer is swapped under a lock and
+    written outside of it, so workers only wait for the MongoDB round trip when they trigger a flush themselves.
+
+    Batches are written `batch_size` records at a time. If a write fails (e.g. MongoDB is down), the records not written
+    are put back in front of the buffer, so the next flush retries them. Once the buffer holds `max_buffered` records,
+    `write()` flushes before buffering the record, and raises the error of the flush if it fails, so the buffer doesn't
+    grow without bound.
+
+    Usage:
+        with scrapper.create_sink("totals") as sink:
+            sink.write(scrapper.get_totals(state_id = "9"))
+    """
+
+    # Records of units of work with additional filters (see `Crawler.crawl_totals(...)`) carry a filters field
+    DEFAULT_KEY_FIELDS = ("state_id", "mun_id", "neighborhood_id", "date_start", "date_end", "filters")
+
+    def __init__(self, collection: pm.collection.Collection, key_fields: Iterable[str] = DEFAULT_KEY_FIELDS, batch_size: int = 1000, flush_interval: float = 10.0, max_buffered: int = None, metrics = None) -> None:
+        """Create a new sink
+
+        Args:
+            collection (pm.collection.Collection): Target collection.
+            key_fields (Iterable[str], optional): Fields that identify a record. Missing fields are matched as null. Defaults to DEFAULT_KEY_FIELDS.
+            batch_size (int, optional): Number of buffered records that triggers a flush. Defaults to 1000.
+            flush_interval (float, optional): Maximum number of seconds between flushes. Defaults to 10.0.
+            max_buffered (int, optional): Maximum number of buffered records while writes fail. Defaults to None (10 batches).
+            metrics (Metrics, optional): Metrics registry where flush times are recorded. Defaults to None (not measured).
+
+        Raises:
+            ValueError: If batch_size is not a positive number or max_buffered is smaller than batch_size.
+        """
+
+        if batch_size < 1:
+            raise ValueError("The batch size must be at least 1!")
+
+        max_buffered = max_buffered if max_buffered is not None else batch_size * 10
+
+        if max_buffered < batch_size:
+            raise ValueError("The maximum number of buffered records must be at least the batch size!")
+
+        self.__collection = collection
+        self.__key_fields = tuple(key_fields)
+        self.__batch_size = batch_size
+        self.__max_buffered = max_buffered
+        self.__flush_interval = flush_interval
+        self.__metrics = metrics
+
+        self.__buffer = []
+        self.__lock = threading.Lock()
+        self.__last_flush = time.monotonic()
+
+        # Serializes bulk writes, so batches are written in the order they were buffered
+        self.__flush_lock = threading.Lock()
+
+        # Background thread flushing the buffer every flush_interval seconds, started by the first write
+        self.__closed = threading.Event()
+        self.__timer = None
+
+        self.__n_written = 0
+        self.__n_flushes = 0
+
+    def __enter__(self) -> "MongoSink":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    @property
+    def collection(self) -> pm.collection.Collection:
+        return self.__collection
+
+    @property
+    def key_fields(self) -> tuple:
+        return self.__key_fields
+
+    @property
+    def batch_size(self) -> int:
+        return self.__batch_size
+
+    @property
+    def flush_interval(self) -> float:
+        return self.__flush_interval
+
+    @property
+    def max_buffered(self) -> int:
+        return self.__max_buffered
+
+    @property
+    def stats(self) -> dict:
+        """Sink statistics
+
+        Returns:
+            dict: Number of records written, number of flushes and number of buffered records.
+        """
+
+        with self.__lock:
+            return {"written": self.__n_written, "flushes": self.__n_flushes, "buffered": len(self.__buffer)}
+
+    def write(self, record: dict) -> None:
+        """Buffer a record, flushing the buffer if it's full or the flush interval has passed
+
+        Args:
+            record (dict): A scrapped record.
+
+        Raises:
+            Exception: The error of the flush, if the buffer was full (see `max_buffered`) and it couldn't be flushed. The record is not buffered.
+        """
+
+        with self.__lock:
+            overflow = len(self.__buffer) >= self.max_buffered
+
+        # Previous writes failed, wait for the buffer to be written before buffering more records
+        if overflow:
+            self.__flush(blocking = True)
+
+        with self.__lock:
+            self.__buffer.append(record)
+            full = len(self.__buffer) >= self.batch_size
+
+            if self.__timer is None and not self.__closed.is_set():
+                self.__timer = threading.Thread(target = self.__flush_periodically, name = "MongoSink-flush", daemon = True)
+                self.__timer.start()
+
+        # A worker doesn't wait for a flush in progress, the records are written by the next flush
+        if full:
+            self.__flush(blocking = False)
+
+    def write_many(self, records: Iterable[dict]) -> None:
+        """Buffer many records, flushing the buffer every time it's full
+
+        Args:
+            records (Iterable[dict]): Scrapped records.
+        """
+
+        for record in records:
+            self.write(record)
+
+    def flush(self) -> None:
+        """Write all the buffered records
+        """
+
+        self.__flush(blocking = True)
+
+    def __flush_periodically(self) -> None:
+
+        while not self.__closed.wait(self.flush_interval):
+            if time.monotonic() - self.__last_flush < self.flush_interval:
+                continue
+
+            try:
+                self.__flush(blocking = False)
+            except Exception as e:
+                # The batch was kept, the next flush retries it
+                logger.error("Periodic flush to %s failed: %s", self.collection.full_name, e)
+
+    def __flush(self, blocking: bool) -> None:
+
+        if not self.__flush_lock.acquire(blocking = blocking):
+            return
+
+        try:
+            self.__write_buffer()
+        finally:
+            self.__flush_lock.release()
+
+    def __write_buffer(self) -> None:
+        # Must be called while holding the flush lock
+
+        with self.__lock:
+            self.__last_flush = time.monotonic()
+
+            if len(self.__buffer) == 0:
+                return
+
+            batch = self.__buffer
+            self.__buffer = []
+
+        logger.debug("Flushing %s records to %s...", len(batch), self.collection.full_name)
+
+        for i in range(0, len(batch), self.batch_size):
+            operations = [
+                UpdateOne({field: record.get(field) for field in self.key_fields}, {"$set": record}, upsert = True)
+                for record in batch[i:i + self.batch_size]
+            ]
+
+            start = time.perf_counter()
+
+            try:
+                self.collection.bulk_write(operations, ordered = False)
+            except Exception:
+                # Upserts are idempotent, keep the records not written so the next flush retries them
+                with self.__lock:
+                    self.__buffer = batch[i:] + self.__buffer
+
+                raise
+
+            if self.__metrics is not None:
+                labels = (self.collection.name, )
+                self.__metrics.observe("rnpdno_sink_flush_seconds", labels, time.perf_counter() - start)
+                self.__metrics.inc("rnpdno_sink_records_total", labels, len(operations))
+
+            with self.__lock:
+                self.__n_written += len(operations)
+                self.__n_flushes += 1
+
+    def close(self) -> None:
+        """Stop the background flushes and flush the remaining records
+        """
+
+        self.__closed.set()
+
+        with self.__lock:
+            timer = self.__timer
+
+        if timer is not None:
+            timer.join()
+
+        self.flush()
+        logger.info("Sink closed (%s records written in %s flushes).", self.__n_written, self.__n_flushes)
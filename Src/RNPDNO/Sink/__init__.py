@@ -0,0 +1 @@
+from .Core import MongoSink
@@ -0,0 +1,284 @@
+from typing import Iterable, Iterator, Union
+
+import pymongo as pm
+
+from RNPDNO.Ledger import UNIT_FIELDS, FILTERS_FIELD, unit_key
+
+from datetime import date, datetime, time as dt_time, timedelta
+
+import threading
+import hashlib
+import json
+import time
+
+# Metadata fields of a record version
+KEY_FIELD = "key"
+VERSION_FIELD = "version"
+HASH_FIELD = "hash"
+VALID_FROM_FIELD = "valid_from"
+VALID_TO_FIELD = "valid_to"
+CHANGED_FIELDS_FIELD = "changed_fields"
+
+VERSION_METADATA_FIELDS = (KEY_FIELD, VERSION_FIELD, HASH_FIELD, VALID_FROM_FIELD, VALID_TO_FIELD, CHANGED_FIELDS_FIELD)
+
+# Fields that identify a record (the query), everything else is a value
+RECORD_KEY_FIELDS = UNIT_FIELDS + (FILTERS_FIELD, )
+
+# Date format of "as of" dates (as in the RNPDNO API)
+DATE_FORMAT = "%d/%m/%Y"
+
+def record_key(record: dict) -> str:
+    """Build the key of a record: its geography, date window and filters (see `RNPDNO.Ledger.unit_key(...)`)
+    """
+
+    return unit_key(record)
+
+def record_values(record: dict, ignore_fields: Iterable[str] = ()) -> dict:
+    """Get the values of a record, without the fields that identify it and the version metadata
+    """
+
+    excluded = set(RECORD_KEY_FIELDS).union(VERSION_METADATA_FIELDS, ignore_fields, ("_id", ))
+
+    return {field: value for field, value in record.items() if field not in excluded}
+
+def record_hash(record: dict, ignore_fields: Iterable[str] = ()) -> str:
+    """Hash the values of a record
+
+    Two records with the same values have the same hash, regardless of the order of their fields.
+
+    Args:
+        record (dict): A scrapped record.
+        ignore_fields (Iterable[str], optional): Value fields left out of the hash (e.g. volatile fields). Defaults to ().
+
+    Returns:
+        str: A 32 characters hex digest.
+    """
+
+    content = json.dumps(record_values(record, ignore_fields), sort_keys = True, separators = (",", ":"), default = str)
+
+    return hashlib.blake2b(content.encode("utf-8"), digest_size = 16).hexdigest()
+
+def as_timestamp(value: Union[float, int, str, date, datetime, None]) -> float:
+    """Convert the date of an "as of" query to a UNIX timestamp
+
+    A date (or a dd/mm/yyyy string) means the end of that day (local time), so the versions written during that day
+    are included. None means now.
+    """
+
+    if value is None:
+        return time.time()
+
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    if isinstance(value, datetime):
+        return value.timestamp()
+
+    if isinstance(value, str):
+        value = datetime.strptime(value, DATE_FORMAT).date()
+
+    return datetime.combine(value + timedelta(days = 1), dt_time()).timestamp() - 1e-6
+
+def build_version(record: dict, previous: Union[dict, None], timestamp: float, ignore_fields: Iterable[str] = ()) -> Union[dict, None]:
+    """Build the next version of a record
+
+    Args:
+        record (dict): A scrapped record.
+        previous (Union[dict, None]): The current version of the record (None if it's new).
+        timestamp (float): UNIX timestamp of the new version.
+        ignore_fields (Iterable[str], optional): Value fields left out of the hash. Defaults to ().
+
+    Returns:
+        dict: The new version, with the record fields and the version metadata.
+        None: If the values of the record didn't change.
+    """
+
+    digest = record_hash(record, ignore_fields)
+
+    if previous is not None and previous[HASH_FIELD] == digest:
+        return None
+
+    values = record_values(record)
+    previous_values = record_values(previous) if previous is not None else {}
+
+    version = {field: value for field, value in record.items() if field not in VERSION_METADATA_FIELDS and field != "_id"}
+    version.update({
+        KEY_FIELD: record_key(record),
+        VERSION_FIELD: previous[VERSION_FIELD] + 1 if previous is not None else 1,
+        HASH_FIELD: digest,
+        VALID_FROM_FIELD: timestamp,
+        VALID_TO_FIELD: None,
+        CHANGED_FIELDS_FIELD: sorted(field for field in set(values).union(previous_values) if values.get(field) != previous_values.get(field))
+    })
+
+    return version
+
+def latest_by_key(versions: Iterable[dict]) -> Iterator[dict]:
+    """Keep the latest version of each key from versions sorted by key and version
+    """
+
+    latest = None
+
+    for version in versions:
+        if latest is not None and latest[KEY_FIELD] != version[KEY_FIELD]:
+            yield latest
+
+        latest = version
+
+    if latest is not None:
+        yield latest
+
+class MemorySnapshotStore:
+    """Versioned records kept in memory
+
+    Same interface as MongoSnapshotStore. Useful for tests and benchmarks.
+    """
+
+    def __init__(self) -> None:
+
+        self.__versions = {}
+        self.__lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return "memory"
+
+    def __len__(self) -> int:
+
+        with self.__lock:
+            return sum(len(versions) for versions in self.__versions.values())
+
+    def get_heads(self, keys: Iterable[str]) -> dict:
+
+        with self.__lock:
+            return {key: dict(self.__versions[key][-1]) for key in keys if key in self.__versions}
+
+    def add_versions(self, versions: list) -> None:
+
+        with self.__lock:
+            for version in versions:
+                history = self.__versions.setdefault(version[KEY_FIELD], [])
+
+                if len(history) > 0:
+                    history[-1][VALID_TO_FIELD] = version[VALID_FROM_FIELD]
+
+                history.append(dict(version))
+
+    def as_of(self, when: Union[float, str, date, datetime] = None, query: dict = None) -> Iterator[dict]:
+
+        timestamp = as_timestamp(when)
+        query = query or {}
+
+        with self.__lock:
+            histories = [self.__versions[key] for key in sorted(self.__versions)]
+
+        for history in histories:
+            versions = [version for version in history if version[VALID_FROM_FIELD] <= timestamp]
+
+            if len(versions) > 0 and all(versions[-1].get(field) == value for field, value in query.items()):
+                yield dict(versions[-1])
+
+    def history(self, record: dict) -> list:
+
+        with self.__lock:
+            return [dict(version) for version in self.__versions.get(record_key(record), [])]
+
+class MongoSnapshotStore:
+    """Versioned records stored in a MongoDB collection
+
+    Every version of a record is a document with the record fields, the key of the record, the version number, the
+    hash of its values, the fields that changed since the previous version and the period it was valid
+    (`valid_from` and `valid_to`, UNIX timestamps, `valid_to` is null for the current version).
+    """
+
+    def __init__(self, collection: pm.collection.Collection) -> None:
+
+        self.__collection = collection
+        self.__collection.create_index([(KEY_FIELD, pm.ASCENDING), (VERSION_FIELD, pm.ASCENDING)], unique = True)
+        self.__collection.create_index([(VALID_TO_FIELD, pm.ASCENDING), (KEY_FIELD, pm.ASCENDING)])
+
+    @property
+    def collection(self) -> pm.collection.Collection:
+        return self.__collection
+
+    @property
+    def name(self) -> str:
+        return self.collection.name
+
+    def __len__(self) -> int:
+        return self.collection.count_documents({})
+
+    def get_heads(self, keys: Iterable[str]) -> dict:
+        """Get the current version of records
+
+        Args:
+            keys (Iterable[str]): Record keys (see `record_key(...)`).
+
+        Returns:
+            dict: The current version of each key (keys without versions are left out).
+        """
+
+        keys = list(keys)
+        heads = {}
+
+        for i in range(0, len(keys), 1000):
+            for document in self.collection.find({KEY_FIELD: {"$in": keys[i:i + 1000]}, VALID_TO_FIELD: None}, {"_id": 0}):
+                # An interrupted write may leave two open versions, the latest wins
+                head = heads.get(document[KEY_FIELD])
+
+                if head is None or document[VERSION_FIELD] > head[VERSION_FIELD]:
+                    heads[document[KEY_FIELD]] = document
+
+        return heads
+
+    def add_versions(self, versions: list) -> None:
+        """Add new versions of records, closing their previous versions
+
+        Args:
+            versions (list): New versions (see `build_version(...)`), at most one per key.
+        """
+
+        if len(versions) == 0:
+            return
+
+        # Insert first, so an interrupted write never leaves a record without a current version
+        inserted_ids = self.collection.insert_many([dict(version) for version in versions], ordered = False).inserted_ids
+
+        keys = [version[KEY_FIELD] for version in versions]
+        valid_to = versions[0][VALID_FROM_FIELD]
+
+        for i in range(0, len(keys), 1000):
+            self.collection.update_many(
+                {KEY_FIELD: {"$in": keys[i:i + 1000]}, VALID_TO_FIELD: None, "_id": {"$nin": inserted_ids[i:i + 1000]}},
+                {"$set": {VALID_TO_FIELD: valid_to}}
+            )
+
+    def as_of(self, when: Union[float, str, date, datetime] = None, query: dict = None) -> Iterator[dict]:
+        """Get the records as they were at a point in time
+
+        Args:
+            when (Union[float, str, date, datetime], optional): A UNIX timestamp, a datetime, or a date (or dd/mm/yyyy string),
+                meaning the end of that day. Defaults to None (now).
+            query (dict, optional): Additional conditions on the record fields (e.g. {"state_id": "9"}). Defaults to None.
+
+        Yields:
+            dict: The version of each record that was current at that time, sorted by key.
+        """
+
+        timestamp = as_timestamp(when)
+
+        condition = {
+            **(query or {}),
+            VALID_FROM_FIELD: {"$lte": timestamp},
+            "$or": [{VALID_TO_FIELD: None}, {VALID_TO_FIELD: {"$gt": timestamp}}]
+        }
+
+        cursor = self.collection.find(condition, {"_id": 0}).sort([(KEY_FIELD, pm.ASCENDING), (VERSION_FIELD, pm.ASCENDING)])
+
+        yield from latest_by_key(cursor)
+
+    def history(self, record: dict) -> list:
+        """Get every version of a record (or unit of work), oldest first
+        """
+
+        return list(self.collection.find({KEY_FIELD: record_key(record)}, {"_id": 0}).sort(VERSION_FIELD, pm.ASCENDING))
@@ -0,0 +1,159 @@
+from typing import Iterable
+
+from RNPDNO.Snapshot.Core import record_key, build_version
+
+import threading
+import logging
+import time
+
+# Init logger
+logger = logging.getLogger(__name__)
+
+class DeltaSink:
+    """Buffered writer that stores only the records that changed since the previous snapshot
+
+    Same interface as `RNPDNO.Sink.MongoSink`, so it can be passed to the Crawler. On every flush, the hashes of the
+    buffered records are compared with the current versions in the store and only new or changed records are
+    written, as new versions (see `MongoSnapshotStore`). Unchanged records cost a read, not a write.
+
+    Usage:
+        with scrapper.create_delta_sink("totals_versions") as sink:
+            crawler.crawl_totals(ledger, sink = sink)
+
+        records = list(sink.store.as_of("31/12/2022", query = {"state_id": "9"}))
+    """
+
+    def __init__(self, store, batch_size: int = 1000, flush_interval: float = 10.0, ignore_fields: Iterable[str] = (), metrics = None) -> None:
+        """Create a new sink
+
+        Args:
+            store (MongoSnapshotStore or MemorySnapshotStore): Store of the record versions.
+            batch_size (int, optional): Number of buffered records that triggers a flush. Defaults to 1000.
+            flush_interval (float, optional): Maximum number of seconds between flushes. Defaults to 10.0.
+            ignore_fields (Iterable[str], optional): Value fields left out of the change detection. Defaults to ().
+            metrics (Metrics, optional): Metrics registry where flush times are recorded. Defaults to None (not measured).
+
+        Raises:
+            ValueError: If batch_size is not a positive number.
+        """
+
+        if batch_size < 1:
+            raise ValueError("The batch size must be at least 1!")
+
+        self.__store = store
+        self.__batch_size = batch_size
+        self.__flush_interval = flush_interval
+        self.__ignore_fields = tuple(ignore_fields)
+        self.__metrics = metrics
+
+        # Buffered records by key, a record written twice before a flush is stored once
+        self.__buffer = {}
+        self.__lock = threading.Lock()
+        self.__last_flush = time.monotonic()
+
+        self.__n_changed = 0
+        self.__n_unchanged = 0
+        self.__n_flushes = 0
+
+    def __enter__(self) -> "DeltaSink":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    @property
+    def store(self):
+        return self.__store
+
+    @property
+    def batch_size(self) -> int:
+        return self.__batch_size
+
+    @property
+    def flush_interval(self) -> float:
+        return self.__flush_interval
+
+    @property
+    def stats(self) -> dict:
+        """Sink statistics
+
+        Returns:
+            dict: Number of records written (new or changed), number of unchanged records, number of flushes and number of buffered records.
+        """
+
+        with self.__lock:
+            return {"written": self.__n_changed, "unchanged": self.__n_unchanged, "flushes": self.__n_flushes, "buffered": len(self.__buffer)}
+
+    def write(self, record: dict) -> None:
+        """Buffer a record, flushing the buffer if it's full or the flush interval has passed
+
+        Args:
+            record (dict): A scrapped record.
+        """
+
+        with self.__lock:
+            self.__buffer[record_key(record)] = record
+
+            if len(self.__buffer) >= self.batch_size or time.monotonic() - self.__last_flush >= self.flush_interval:
+                self.__flush()
+
+    def write_many(self, records: Iterable[dict]) -> None:
+        """Buffer many records, flushing the buffer every time it's full
+
+        Args:
+            records (Iterable[dict]): Scrapped records.
+        """
+
+        for record in records:
+            self.write(record)
+
+    def flush(self) -> None:
+        """Write the buffered records that changed
+        """
+
+        with self.__lock:
+            self.__flush()
+
+    def __flush(self) -> None:
+
+        self.__last_flush = time.monotonic()
+
+        if len(self.__buffer) == 0:
+            return
+
+        batch = self.__buffer
+        self.__buffer = {}
+
+        start = time.perf_counter()
+
+        try:
+            heads = self.store.get_heads(batch.keys())
+
+            # Every version written by a flush is valid from the same time
+            timestamp = time.time()
+            versions = [build_version(record, heads.get(key), timestamp, self.__ignore_fields) for key, record in batch.items()]
+            versions = [version for version in versions if version is not None]
+
+            logger.debug("Flushing %s changed records out of %s...", len(versions), len(batch))
+
+            self.store.add_versions(versions)
+        except Exception:
+            # Keep the batch so the next flush retries it, records written in between win
+            self.__buffer = {**batch, **self.__buffer}
+            raise
+
+        if self.__metrics is not None:
+            labels = (self.store.name, )
+            self.__metrics.observe("rnpdno_sink_flush_seconds", labels, time.perf_counter() - start)
+            self.__metrics.inc("rnpdno_sink_records_total", labels, len(versions))
+
+        self.__n_changed += len(versions)
+        self.__n_unchanged += len(batch) - len(versions)
+        self.__n_flushes += 1
+
+    def close(self) -> None:
+        """Flush the remaining records
+        """
+
+        self.flush()
+        logger.info("Delta sink closed (%s records written, %s unchanged, in %s flushes).", self.__n_changed, self.__n_unchanged, self.__n_flushes)
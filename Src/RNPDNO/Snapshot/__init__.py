@@ -0,0 +1,3 @@
+from .Core import MemorySnapshotStore, MongoSnapshotStore, record_key, record_hash, record_values, build_version, as_timestamp
+from .Core import KEY_FIELD, VERSION_FIELD, HASH_FIELD, VALID_FROM_FIELD, VALID_TO_FIELD, CHANGED_FIELDS_FIELD
+from .Sink import DeltaSink
@@ -0,0 +1,5 @@
+from RNPDNO.Main import main
+
+import sys
+
+sys.exit(main())
@@ -9,8 +9,25 @@ setuptools.setup(
     url = "https://github.com/pablorm296/ScrapperRNPDNO",
     license = "GNU General Public License v3.0.",
     keywords = ["Mexico", "scrapping", "web scrapping", "requests"],
-    packages = ["RNPDNO_Scrapper"],
-    package_dir = {
-        "RNPDNO_Scrapper": "RNPDNO_Scrapper"
+    packages = setuptools.find_packages(include = ["RNPDNO", "RNPDNO.*"]),
+    package_data = {
+        "RNPDNO": ["Data/*.json"]
+    },
+    python_requires = ">=3.8",
+    install_requires = [
+        "requests",
+        "pymongo"
+    ],
+    extras_require = {
+        "async": ["aiohttp"],
+        "parquet": ["pyarrow"],
+        "numpy": ["numpy"],
+        "fast": ["orjson", "msgspec"],
+        "bench": ["mongomock", "pytest", "pytest-benchmark"]
+    },
+    entry_points = {
+        "console_scripts": [
+            "rnpdno = RNPDNO.Main:main"
+        ]
     }
-)
\ No newline at end of file
+)
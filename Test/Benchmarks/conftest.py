@@ -0,0 +1,60 @@
+import logging
+import sys
+import os
+
+import pytest
+
+# Run against the working tree
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Src"))
+
+from RNPDNO.Bench import FakeRNPDNOServer, fake_request_templates, mock_config_db
+from RNPDNO.Crawler import bootstrap_scrapper
+
+def pytest_addoption(parser):
+
+    group = parser.getgroup("rnpdno", "RNPDNO benchmarks")
+    group.addoption("--fake-latency", type = float, default = 0.0, help = "Latency of the fake RNPDNO server in seconds.")
+    group.addoption("--fake-error-rate", type = float, default = 0.0, help = "Error rate of the fake RNPDNO server.")
+    group.addoption("--fake-states", type = int, default = 8, help = "Number of states of the fake catalogue.")
+    group.addoption("--fake-municipalities", type = int, default = 10, help = "Number of municipalities per state.")
+    group.addoption("--fake-neighborhoods", type = int, default = 10, help = "Number of neighborhoods per municipality.")
+    group.addoption("--config-db-uri", default = None, help = "URI of a local mongod to use instead of mongomock.")
+
+@pytest.fixture(scope = "session")
+def fake_api(request):
+    """A FakeRNPDNOServer shared by the session
+    """
+
+    options = request.config.option
+
+    with FakeRNPDNOServer(
+        n_states = options.fake_states,
+        n_municipalities = options.fake_municipalities,
+        n_neighborhoods = options.fake_neighborhoods,
+        latency = options.fake_latency,
+        error_rate = options.fake_error_rate
+    ) as server:
+        yield server
+
+@pytest.fixture(scope = "session")
+def config_db(request, fake_api):
+    """A config DB seeded with templates pointing to the fake server (mongomock, or a local mongod with --config-db-uri)
+    """
+
+    client = None
+
+    if request.config.option.config_db_uri is not None:
+        import pymongo as pm
+        client = pm.MongoClient(request.config.option.config_db_uri)
+    else:
+        pytest.importorskip("mongomock")
+
+    with mock_config_db(fake_request_templates(fake_api.url), client = client) as client:
+        yield client
+
+@pytest.fixture(scope = "session")
+def scrapper(config_db):
+    """A Scrapper bootstrapped against the fake server and the config DB
+    """
+
+    return bootstrap_scrapper(level = logging.WARNING)
@@ -0,0 +1,72 @@
+"""Offline benchmarks of the Scrapper against a FakeRNPDNOServer
+
+Run with pytest-benchmark, saving the results of each commit and comparing them with the previous run:
+
+    pytest Test/Benchmarks --benchmark-autosave --benchmark-compare
+
+The fake server can be tuned with --fake-latency, --fake-error-rate and the catalogue size options (see conftest.py).
+Requests per second and peak memory are stored in the extra info of each benchmark.
+"""
+
+import logging
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from RNPDNO.Bench import measure
+from RNPDNO.Config import ConfigReader
+from RNPDNO.Crawler import Crawler, bootstrap_scrapper
+from RNPDNO.Ledger import MemoryLedger
+
+def test_startup(benchmark, config_db):
+
+    def setup():
+        # Every run connects to the config DB, as a new process would
+        ConfigReader.clear_clients()
+
+    scrapper = benchmark.pedantic(bootstrap_scrapper, kwargs = {"level": logging.WARNING}, setup = setup, rounds = 10)
+
+    assert scrapper.request_templates
+
+def test_catalogue_crawl(benchmark, scrapper, fake_api):
+
+    crawler = Crawler(scrapper, max_workers = 8)
+
+    fake_api.reset_counts()
+    records = benchmark.pedantic(crawler.get_catalogue, rounds = 3)
+
+    # Requests of a single round
+    n_requests = fake_api.n_requests / 3
+    _, _, peak = measure(crawler.get_catalogue, trace_memory = True)
+
+    # Benchmarks don't collect stats with --benchmark-disable
+    if benchmark.stats is not None:
+        benchmark.extra_info["requests_per_second"] = n_requests / benchmark.stats.stats.mean
+
+    benchmark.extra_info["peak_memory_mb"] = peak / 2 ** 20
+
+    assert len(records) == fake_api.n_states * fake_api.n_municipalities * fake_api.n_neighborhoods
+
+@pytest.mark.parametrize("max_workers", [1, 8, 32])
+def test_totals_crawl(benchmark, scrapper, fake_api, max_workers):
+
+    crawler = Crawler(scrapper, max_workers = max_workers)
+    units = list(crawler.iter_totals_units(level = "municipality"))
+
+    def setup():
+        return (MemoryLedger(units), ), {}
+
+    fake_api.reset_counts()
+    result = benchmark.pedantic(crawler.crawl_totals, setup = setup, rounds = 3)
+
+    n_requests = fake_api.n_requests / 3
+    _, _, peak = measure(crawler.crawl_totals, MemoryLedger(units), trace_memory = True)
+
+    # Benchmarks don't collect stats with --benchmark-disable
+    if benchmark.stats is not None:
+        benchmark.extra_info["requests_per_second"] = n_requests / benchmark.stats.stats.mean
+
+    benchmark.extra_info["peak_memory_mb"] = peak / 2 ** 20
+
+    assert result == {"done": len(units), "failed": 0}
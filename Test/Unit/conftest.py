@@ -0,0 +1,5 @@
+import sys
+import os
+
+# Run against the working tree
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Src"))
@@ -0,0 +1,128 @@
+"""Behaviour of the streaming exporter and of its NDJSON, CSV and Parquet writers
+"""
+
+import logging
+import json
+import csv
+import os
+
+import pytest
+
+from RNPDNO.Export import Exporter, export_records
+
+FORMATS = ["ndjson", "csv", "parquet"]
+
+def totals_record(state_id: int, filters: dict = None) -> dict:
+
+    record = {"state_id": state_id, "mun_id": "0", "neighborhood_id": "0", "date_start": None, "date_end": "31/12/2021", "total": state_id * 10, "desaparecidos": state_id}
+
+    if filters is not None:
+        record["filters"] = filters
+
+    return record
+
+def read_rows(path: str, format: str) -> list:
+    """Read an exported file as a list of dicts
+    """
+
+    if format == "ndjson":
+        with open(path, encoding = "utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    if format == "csv":
+        with open(path, encoding = "utf-8", newline = "") as f:
+            return list(csv.DictReader(f))
+
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    return pq.read_table(path).to_pylist()
+
+@pytest.fixture(params = FORMATS)
+def format(request):
+
+    if request.param == "parquet":
+        pytest.importorskip("pyarrow")
+
+    return request.param
+
+def test_records_are_written_in_chunks(tmp_path, format):
+
+    path = str(tmp_path / "totals.{0}".format(format))
+    records = [totals_record(i) for i in range(1, 8)]
+
+    assert export_records(iter(records), path, format = format, chunk_size = 3) == 7
+
+    rows = read_rows(path, format)
+
+    assert len(rows) == 7
+    assert [str(row["state_id"]) for row in rows] == [str(i) for i in range(1, 8)]
+    assert [int(row["total"]) for row in rows] == [i * 10 for i in range(1, 8)]
+
+def test_filters_of_later_chunks_are_exported(tmp_path, format):
+
+    path = str(tmp_path / "totals.{0}".format(format))
+
+    # Only the records of the second chunk were filtered
+    records = [totals_record(1), totals_record(2), totals_record(3, filters = {"idEstatusVictima": "7"})]
+    export_records(records, path, format = format, chunk_size = 2)
+
+    rows = read_rows(path, format)
+    filters = rows[2]["filters"]
+
+    assert (json.loads(filters) if isinstance(filters, str) else filters) == {"idEstatusVictima": "7"}
+    assert rows[0].get("filters") in (None, "")
+
+def test_parquet_columns_have_fixed_types(tmp_path):
+
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = str(tmp_path / "totals.parquet")
+
+    export_records([totals_record(1), {**totals_record(2), "state_id": "2"}], path, chunk_size = 1)
+
+    schema = pq.read_schema(path)
+
+    assert str(schema.field("state_id").type) == "string"
+    assert str(schema.field("date_start").type) == "string"
+    assert str(schema.field("total").type) == "int64"
+    assert str(schema.field("filters").type) == "string"
+
+@pytest.mark.parametrize("format", ["csv", "parquet"])
+def test_fields_without_a_column_are_reported(tmp_path, caplog, format):
+
+    if format == "parquet":
+        pytest.importorskip("pyarrow")
+
+    path = str(tmp_path / "catalogue.{0}".format(format))
+    records = [{"state_id": "1", "name": "ESTADO 1"}, {"state_id": "2", "name": "ESTADO 2", "abbreviation": "E2"}]
+
+    with caplog.at_level(logging.WARNING, logger = "RNPDNO.Export.Core"):
+        export_records(records, path, format = format, chunk_size = 1)
+
+    assert "abbreviation" in caplog.text
+    assert all("abbreviation" not in row for row in read_rows(path, format))
+
+def test_partitions_reopened_after_eviction_get_a_new_part(tmp_path, format):
+
+    path = str(tmp_path / "totals")
+
+    # One open file and one record per chunk, so every change of state closes the previous file
+    with Exporter(path, format = format, chunk_size = 1, partition_by = "state_id", max_open_files = 1) as exporter:
+        exporter.write_many([totals_record(1), totals_record(2), totals_record(1)])
+
+    assert sorted(os.listdir(path)) == ["state_id=1", "state_id=2"]
+    assert sorted(os.listdir(os.path.join(path, "state_id=1"))) == ["part-0.{0}".format(format), "part-1.{0}".format(format)]
+    assert os.listdir(os.path.join(path, "state_id=2")) == ["part-0.{0}".format(format)]
+
+    # The partition field is only in the directory name
+    row, = read_rows(os.path.join(path, "state_id=1", "part-1.{0}".format(format)), format)
+
+    assert "state_id" not in row
+    assert int(row["total"]) == 10
+
+def test_exporter_arguments_are_checked(tmp_path):
+
+    with pytest.raises(ValueError):
+        Exporter(str(tmp_path / "totals.xml"), format = "xml")
+
+    with pytest.raises(ValueError):
+        Exporter(str(tmp_path / "totals.csv"), format = "csv", max_open_files = 0)
@@ -0,0 +1,219 @@
+"""Behaviour of the job ledgers: claims, status updates, resets and concurrent claims of a shared MongoLedger
+"""
+
+import logging
+import time
+
+import pytest
+
+from RNPDNO.Ledger import SQLiteLedger, MemoryLedger, MongoLedger, unit_key, CLAIM_FIELD, FILTERS_FIELD
+from RNPDNO.Ledger import PENDING, IN_FLIGHT, DONE, FAILED
+from RNPDNO.Ledger.Core import unit_document
+
+UNITS = [{"state_id": str(i), "mun_id": "0", "neighborhood_id": "0", "date_start": None, "date_end": None} for i in range(1, 6)]
+
+def add_units(ledger, units: list) -> None:
+    """Register units of work as pending
+
+    mongomock's bulk_write doesn't accept the operations of recent pymongo versions, so the documents written by
+    `MongoLedger.add_units(...)` are inserted directly.
+    """
+
+    if not isinstance(ledger, MongoLedger):
+        ledger.add_units(units)
+        return
+
+    # Units already in the ledger are left untouched
+    position = ledger.collection.count_documents({})
+    units = [unit for unit in units if ledger.collection.find_one({"_id": unit_key(unit)}) is None]
+
+    ledger.collection.insert_many([
+        {"_id": unit_key(unit), **unit_document(unit), "status": PENDING, "attempts": 0, "error": None, "updated_at": time.time(), "position": position + i}
+        for i, unit in enumerate(units)
+    ])
+
+def create_mongo_ledger() -> MongoLedger:
+
+    mongomock = pytest.importorskip("mongomock")
+
+    return MongoLedger(mongomock.MongoClient().db.ledger)
+
+@pytest.fixture(params = ["sqlite", "memory", "mongo"])
+def ledger(request, tmp_path):
+
+    if request.param == "sqlite":
+        ledger = SQLiteLedger(str(tmp_path / "ledger.db"))
+        yield ledger
+        ledger.close()
+    elif request.param == "memory":
+        yield MemoryLedger()
+    else:
+        yield create_mongo_ledger()
+
+def identity(unit: dict) -> dict:
+    """Fields that identify a claimed unit, without its claim id
+    """
+
+    return {key: value for key, value in unit.items() if key != CLAIM_FIELD}
+
+def test_units_are_claimed_once(ledger):
+
+    add_units(ledger, UNITS)
+
+    first = ledger.claim(limit = 3)
+    second = ledger.claim(limit = 3)
+
+    assert len(first) == 3 and len(second) == 2
+    assert sorted(unit_key(unit) for unit in first + second) == sorted(unit_key(unit) for unit in UNITS)
+    assert ledger.claim(limit = 3) == []
+    assert ledger.counts() == {PENDING: 0, IN_FLIGHT: 5, DONE: 0, FAILED: 0}
+
+def test_units_are_claimed_in_the_order_they_were_added(ledger):
+
+    # e.g. the locality order of a QueryPlan, not the order of the keys
+    units = [UNITS[1], UNITS[4], UNITS[0]]
+    add_units(ledger, units)
+    add_units(ledger, [UNITS[3], UNITS[1]])
+
+    assert [identity(unit) for unit in ledger.claim(limit = 10)] == units + [UNITS[3]]
+
+def test_filters_are_kept_in_claimed_units(ledger):
+
+    unit = {**UNITS[0], FILTERS_FIELD: {"idEstatusVictima": 7}}
+    add_units(ledger, [UNITS[0], unit])
+
+    claimed = [identity(unit) for unit in ledger.claim(limit = 2)]
+
+    assert {**UNITS[0], FILTERS_FIELD: {"idEstatusVictima": "7"}} in claimed
+    assert UNITS[0] in claimed
+
+def test_mark_and_reset(ledger):
+
+    add_units(ledger, UNITS)
+    done, failed, in_flight = ledger.claim(limit = 3)
+
+    ledger.mark_done(done)
+    ledger.mark_failed(failed, error = "ConnectionError()")
+
+    assert ledger.get_statuses([done, failed, in_flight, UNITS[4], {**UNITS[0], "state_id": "99"}]) == [DONE, FAILED, IN_FLIGHT, PENDING, None]
+
+    # Failed units only
+    assert ledger.reset(statuses = (FAILED, )) == 1
+    assert ledger.counts() == {PENDING: 3, IN_FLIGHT: 1, DONE: 1, FAILED: 0}
+
+    # In-flight units, done units are never reset
+    assert ledger.reset() == 1
+    assert ledger.counts() == {PENDING: 4, IN_FLIGHT: 0, DONE: 1, FAILED: 0}
+
+def test_reset_only_requeues_expired_claims(ledger):
+
+    add_units(ledger, UNITS)
+    ledger.claim(limit = 2)
+
+    # Claims of live processes are left in flight
+    assert ledger.reset(statuses = (IN_FLIGHT, ), claim_timeout = 3600) == 0
+
+    time.sleep(0.01)
+
+    assert ledger.reset(statuses = (IN_FLIGHT, ), claim_timeout = 0) == 2
+    assert ledger.counts()[PENDING] == 5
+
+class RacingCollection:
+    """Collection where a rival process claims units between the find and the update_many of the next claim
+    """
+
+    def __init__(self, collection, n_rival_units: int) -> None:
+
+        self.collection = collection
+        self.rival = MongoLedger(collection)
+        self.n_rival_units = n_rival_units
+        self.rival_units = []
+
+    def __getattr__(self, name: str):
+        return getattr(self.collection, name)
+
+    def update_many(self, query: dict, *args, **kwargs):
+
+        # Only the update_many of a claim selects units by id (resets select them by status)
+        if self.n_rival_units > 0 and "_id" in query:
+            self.rival_units += self.rival.claim(limit = self.n_rival_units)
+            self.n_rival_units = 0
+
+        return self.collection.update_many(query, *args, **kwargs)
+
+def test_mongo_claim_skips_units_taken_by_another_process():
+
+    collection = RacingCollection(create_mongo_ledger().collection, n_rival_units = 1)
+    ledger = MongoLedger(collection)
+    add_units(ledger, UNITS)
+
+    units = ledger.claim(limit = 2)
+
+    # The rival took the first candidate, only the second one was claimed
+    assert [unit_key(unit) for unit in collection.rival_units] == [unit_key(UNITS[0])]
+    assert [unit_key(unit) for unit in units] == [unit_key(UNITS[1])]
+    assert ledger.counts() == {PENDING: 3, IN_FLIGHT: 2, DONE: 0, FAILED: 0}
+
+def test_mongo_claim_reads_new_candidates_when_all_were_taken():
+
+    collection = RacingCollection(create_mongo_ledger().collection, n_rival_units = 2)
+    ledger = MongoLedger(collection)
+    add_units(ledger, UNITS)
+
+    units = ledger.claim(limit = 2)
+
+    # Units are only missing when none are pending
+    assert [unit_key(unit) for unit in units] == [unit_key(unit) for unit in UNITS[2:4]]
+    assert ledger.counts() == {PENDING: 1, IN_FLIGHT: 4, DONE: 0, FAILED: 0}
+
+def test_mongo_claim_returns_nothing_when_a_rival_took_every_unit():
+
+    collection = RacingCollection(create_mongo_ledger().collection, n_rival_units = len(UNITS))
+    ledger = MongoLedger(collection)
+    add_units(ledger, UNITS)
+
+    assert ledger.claim(limit = 2) == []
+    assert len(collection.rival_units) == len(UNITS)
+
+def test_mongo_requeued_claim_is_not_marked_by_its_previous_holder():
+
+    ledger = create_mongo_ledger()
+    add_units(ledger, UNITS[:1])
+
+    stalled_unit, = ledger.claim()
+    time.sleep(0.01)
+
+    # The claim expired, another process claims and finishes the unit
+    assert ledger.reset(statuses = (IN_FLIGHT, ), claim_timeout = 0) == 1
+    unit, = ledger.claim()
+    assert unit[CLAIM_FIELD] != stalled_unit[CLAIM_FIELD]
+    assert ledger.mark_done(unit)
+
+    # The stalled process can't overwrite it
+    assert not ledger.mark_failed(stalled_unit, error = "TimeoutError()")
+    assert ledger.get_statuses([unit]) == [DONE]
+    assert ledger.collection.find_one({"_id": unit_key(unit)})["attempts"] == 2
+
+def test_crawl_on_a_shared_mongo_ledger_goes_on_after_losing_a_claim_race():
+
+    pytest.importorskip("mongomock")
+
+    from RNPDNO.Bench import FakeRNPDNOServer, fake_request_templates, mock_config_db
+    from RNPDNO.Config import ConfigReader
+    from RNPDNO.Crawler import Crawler, bootstrap_scrapper
+
+    with FakeRNPDNOServer(n_states = 1, n_municipalities = 6, n_neighborhoods = 1) as server:
+        with mock_config_db(fake_request_templates(server.url)):
+            ConfigReader.clear_clients()
+            crawler = Crawler(bootstrap_scrapper(level = logging.WARNING), max_workers = 2)
+            units = list(crawler.iter_totals_units(level = "municipality"))
+
+            # The rival takes the whole first batch of the crawl
+            collection = RacingCollection(create_mongo_ledger().collection, n_rival_units = 2)
+            ledger = MongoLedger(collection)
+            add_units(ledger, units)
+
+            result = crawler.crawl_totals(ledger, batch_size = 2)
+
+    assert result == {"done": len(units) - 2, "failed": 0}
+    assert ledger.counts() == {PENDING: 0, IN_FLIGHT: 2, DONE: len(units) - 2, FAILED: 0}
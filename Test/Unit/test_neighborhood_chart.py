@@ -0,0 +1,68 @@
+"""Behaviour of Scrapper.get_missing_by_neighborhood against a FakeRNPDNOServer
+"""
+
+import logging
+
+import pytest
+
+from RNPDNO.Bench import FakeRNPDNOServer, fake_request_templates, mock_config_db
+from RNPDNO.Config import ConfigReader
+from RNPDNO.Crawler import bootstrap_scrapper
+from RNPDNO.Scrapper import Scrapper
+
+def create_scrapper(n_neighborhoods: int):
+    """Run a fake server with one municipality of n_neighborhoods neighborhoods, yielding a Scrapper
+    """
+
+    pytest.importorskip("mongomock")
+
+    with FakeRNPDNOServer(n_states = 1, n_municipalities = 1, n_neighborhoods = n_neighborhoods) as server:
+        with mock_config_db(fake_request_templates(server.url)):
+            ConfigReader.clear_clients()
+            yield bootstrap_scrapper(level = logging.ERROR)
+
+@pytest.fixture
+def small_municipality():
+    yield from create_scrapper(5)
+
+@pytest.fixture
+def full_municipality():
+    yield from create_scrapper(Scrapper.MAX_CHART_NEIGHBORHOODS)
+
+@pytest.fixture
+def large_municipality():
+    yield from create_scrapper(Scrapper.MAX_CHART_NEIGHBORHOODS + 10)
+
+def test_unknown_neighborhoods_are_unattributed(small_municipality):
+
+    rows = small_municipality.get_missing_by_neighborhood("1", "1")
+
+    assert len({row["neighborhood_name"] for row in rows}) == 5
+    assert all(row["neighborhood_id"] is not None for row in rows)
+    assert not any(row["truncated"] for row in rows)
+
+    # The table exceeds the chart by the persons whose neighborhood is unknown
+    unattributed = {row["sex"]: row["unattributed"] for row in rows}
+
+    assert all(n >= 0 for n in unattributed.values())
+    assert sum(unattributed.values()) > 0
+
+def test_large_municipality_chart_is_truncated(large_municipality):
+
+    with pytest.raises(Scrapper.Exceptions.TruncatedChart):
+        large_municipality.get_missing_by_neighborhood("1", "1")
+
+    rows = large_municipality.get_missing_by_neighborhood("1", "1", allow_truncated = True)
+
+    assert len({row["neighborhood_name"] for row in rows}) == Scrapper.MAX_CHART_NEIGHBORHOODS
+    assert all(row["truncated"] for row in rows)
+
+def test_full_chart_is_checked_against_the_catalogue(full_municipality):
+
+    rows = full_municipality.get_missing_by_neighborhood("1", "1")
+
+    assert not any(row["truncated"] for row in rows)
+
+    # Without the catalogue, a chart with as many neighborhoods as the server charts may leave some out
+    with pytest.raises(Scrapper.Exceptions.TruncatedChart):
+        full_municipality.get_missing_by_neighborhood("1", "1", resolve_ids = False)
@@ -0,0 +1,126 @@
+"""Behaviour of the session pool and of the session re-initialization against a FakeRNPDNOServer with expiring cookies
+"""
+
+import logging
+import threading
+
+import pytest
+
+from RNPDNO.Bench import FakeRNPDNOServer, fake_request_templates, mock_config_db
+from RNPDNO.Config import ConfigReader
+from RNPDNO.Crawler import Crawler, bootstrap_scrapper
+from RNPDNO.Ledger import MemoryLedger
+from RNPDNO.Scrapper import Scrapper, SessionPool
+
+@pytest.fixture
+def expiring_api():
+
+    pytest.importorskip("mongomock")
+
+    # Cookies are valid for 10 requests
+    with FakeRNPDNOServer(n_states = 2, n_municipalities = 10, n_neighborhoods = 2, session_ttl = 10) as server:
+        with mock_config_db(fake_request_templates(server.url)):
+            ConfigReader.clear_clients()
+            yield server
+
+def crawl_municipalities(scrapper: Scrapper, max_workers: int = 4) -> dict:
+
+    crawler = Crawler(scrapper, max_workers = max_workers)
+    units = list(crawler.iter_totals_units(level = "municipality"))
+
+    # Every unit twice, so every session expires several times
+    return crawler.crawl_totals(MemoryLedger(units + [{**unit, "date_end": "31/12/2021"} for unit in units]))
+
+def test_crawl_without_pool_reinitializes_the_session(expiring_api):
+
+    scrapper = bootstrap_scrapper(level = logging.WARNING)
+    n_initializations = expiring_api.request_counts["/Dashboard/Index"]
+
+    result = crawl_municipalities(scrapper)
+
+    assert result == {"done": 40, "failed": 0}
+    assert expiring_api.request_counts["/Dashboard/Index"] > n_initializations
+
+def test_crawl_with_pool_reinitializes_sessions(expiring_api):
+
+    scrapper = bootstrap_scrapper(level = logging.WARNING)
+    pool = scrapper.create_session_pool(size = 3, max_workers = 4)
+
+    try:
+        result = crawl_municipalities(scrapper)
+    finally:
+        scrapper.close_session_pool()
+
+    assert result == {"done": 40, "failed": 0}
+    assert pool.stats["reinitializations"] > 0
+
+def test_pool_raises_session_expired_after_size_retries():
+
+    pytest.importorskip("mongomock")
+
+    # Cookies are never valid
+    with FakeRNPDNOServer(n_states = 1, n_municipalities = 1, n_neighborhoods = 1, session_ttl = 0) as server:
+        with mock_config_db(fake_request_templates(server.url)):
+            ConfigReader.clear_clients()
+            scrapper = bootstrap_scrapper(level = logging.CRITICAL)
+            scrapper.create_session_pool(size = 2, max_workers = 1)
+            server.reset_counts()
+
+            try:
+                with pytest.raises(Scrapper.Exceptions.SessionExpired):
+                    scrapper.get_totals(state_id = "1")
+            finally:
+                scrapper.close_session_pool()
+
+            # The first request and one retry per session
+            assert server.request_counts["/Sociodemograficos/Totales"] == 3
+
+class FakeSession:
+
+    def close(self) -> None:
+        pass
+
+def test_pool_reinitializes_an_expired_session_once():
+
+    initialized = threading.Event()
+    n_initializations = []
+
+    def initialize_session(session) -> None:
+        n_initializations.append(session)
+
+        if len(n_initializations) > 1:
+            initialized.set()
+
+    with SessionPool(FakeSession, initialize_session, size = 1) as pool:
+        lease = pool.acquire()
+
+        # Two workers report the same session
+        pool.report_expired(lease)
+        pool.report_expired(lease)
+
+        assert initialized.wait(5)
+        assert pool.acquire().generation == lease.generation + 1
+        assert pool.stats["reinitializations"] == 1
+
+    assert len(n_initializations) == 2
+
+def test_pool_retries_failed_initializations_with_backoff():
+
+    n_attempts = []
+
+    def initialize_session(session) -> None:
+        n_attempts.append(session)
+
+        # The start and two re-initializations fail
+        if len(n_attempts) <= 3:
+            raise ConnectionError("Dashboard unavailable")
+
+    with pytest.raises(ConnectionError):
+        SessionPool(FakeSession, initialize_session, size = 1, retry_delay = 0.01).start()
+
+    n_attempts.clear()
+
+    with SessionPool(FakeSession, initialize_session, size = 2, retry_delay = 0.01, acquire_timeout = 5) as pool:
+        pool.acquire()
+
+        assert pool.stats["failures"] >= 1
@@ -0,0 +1,174 @@
+"""Behaviour of the shard store leases and of ShardWorker when a lease is lost
+"""
+
+import logging
+import threading
+import time
+
+import pytest
+
+from RNPDNO.Bench import FakeRNPDNOServer, fake_request_templates, mock_config_db
+from RNPDNO.Config import ConfigReader
+from RNPDNO.Crawler import ShardStore, ShardWorker, bootstrap_scrapper
+from RNPDNO.Crawler.Shards import PENDING, LEASED, DONE, _LeasedLedger, _LeasedSink
+
+UNITS = [{"state_id": str(i), "mun_id": "0", "neighborhood_id": "0", "date_start": None, "date_end": None} for i in range(1, 5)]
+
+def add_shards(store: ShardStore, shards: list) -> list:
+    """Insert shards of units of work, returning their ids
+
+    mongomock's bulk_write doesn't accept the operations of recent pymongo versions, so the documents written by
+    `ShardStore.create_shards(...)` are inserted directly.
+    """
+
+    documents = [
+        {"_id": "shard-{0}".format(i), "units": units, "status": PENDING, "lease_owner": None, "lease_expires": None, "attempts": 0, "failed_units": [], "updated_at": time.time()}
+        for i, units in enumerate(shards)
+    ]
+    store.collection.insert_many(documents)
+
+    return [document["_id"] for document in documents]
+
+@pytest.fixture
+def store():
+
+    mongomock = pytest.importorskip("mongomock")
+
+    return ShardStore(mongomock.MongoClient().db.shards)
+
+class MemorySink:
+
+    def __init__(self) -> None:
+
+        self.records = []
+        self.n_flushes = 0
+
+    def write_many(self, records) -> None:
+        self.records.extend(records)
+
+    def flush(self) -> None:
+        self.n_flushes += 1
+
+def test_shards_are_leased_by_one_worker(store):
+
+    first_id, second_id = add_shards(store, [UNITS[:2], UNITS[2:]])
+
+    assert store.lease("a")["_id"] == first_id
+    assert store.lease("b")["_id"] == second_id
+    assert store.lease("c") is None
+    assert store.counts() == {PENDING: 0, LEASED: 2, DONE: 0}
+
+def test_only_the_owner_renews_and_completes_a_lease(store):
+
+    shard_id, = add_shards(store, [UNITS])
+    store.lease("a")
+
+    assert not store.heartbeat(shard_id, "b")
+    assert not store.complete(shard_id, "b")
+    assert store.heartbeat(shard_id, "a")
+    assert store.complete(shard_id, "a", failed_units = UNITS[:1])
+
+    # Done shards are not leased again until their failed units are requeued
+    assert store.lease("a") is None
+    assert store.requeue_failed() == 1
+
+    shard = store.lease("b")
+    assert shard["units"] == UNITS[:1]
+    assert shard["attempts"] == 2
+
+def test_expired_lease_is_leased_again(store):
+
+    shard_id, = add_shards(store, [UNITS])
+
+    store.lease("stalled", lease_seconds = 0.01)
+    assert store.lease("b") is None
+
+    time.sleep(0.02)
+
+    shard = store.lease("b")
+    assert shard["_id"] == shard_id
+    assert shard["lease_owner"] == "b"
+
+    # The stalled worker lost the shard
+    assert not store.heartbeat(shard_id, "stalled")
+    assert not store.complete(shard_id, "stalled")
+    assert not store.release(shard_id, "stalled")
+    assert store.complete(shard_id, "b")
+
+def test_results_are_dropped_once_the_lease_is_lost(store):
+
+    shard_id, = add_shards(store, [UNITS])
+    store.lease("a")
+
+    lease_lost = threading.Event()
+    ledger = _LeasedLedger(UNITS, lease_lost)
+    target = MemorySink()
+    sink = _LeasedSink(target, store, shard_id, "a", 300, lease_lost)
+
+    sink.write({"state_id": "1"})
+    sink.flush()
+
+    assert target.records == [{"state_id": "1"}]
+
+    # Another worker took the shard
+    store.collection.update_one({"_id": shard_id}, {"$set": {"lease_owner": "b"}})
+
+    sink.write({"state_id": "2"})
+    sink.flush()
+
+    assert target.records == [{"state_id": "1"}]
+    assert lease_lost.is_set()
+    assert ledger.claim(limit = 4) == []
+
+@pytest.fixture
+def api():
+
+    pytest.importorskip("mongomock")
+
+    with FakeRNPDNOServer(n_states = 4, n_municipalities = 1, n_neighborhoods = 1) as server:
+        with mock_config_db(fake_request_templates(server.url)):
+            ConfigReader.clear_clients()
+            yield server
+
+def test_worker_crawls_every_shard(api, store):
+
+    add_shards(store, [UNITS[:2], UNITS[2:]])
+    sink = MemorySink()
+
+    result = ShardWorker(bootstrap_scrapper(level = logging.WARNING), store, sink = sink, max_workers = 2).run()
+
+    assert result == {"shards": 2, "done": 4, "failed": 0}
+    assert sorted(record["state_id"] for record in sink.records) == ["1", "2", "3", "4"]
+    assert store.counts() == {PENDING: 0, LEASED: 0, DONE: 2}
+
+class StealingSink(MemorySink):
+    """Sink where another worker takes the shard right after the first flush
+    """
+
+    def __init__(self, store: ShardStore, shard_id: str) -> None:
+
+        super().__init__()
+        self.store = store
+        self.shard_id = shard_id
+
+    def flush(self) -> None:
+
+        super().flush()
+
+        if self.n_flushes == 1:
+            self.store.collection.update_one({"_id": self.shard_id}, {"$set": {"lease_owner": "b", "lease_expires": time.time() + 300}})
+
+def test_worker_drops_results_of_a_lost_lease(api, store):
+
+    shard_id, = add_shards(store, [UNITS])
+    sink = StealingSink(store, shard_id)
+
+    # One unit per batch, so the lease is checked before writing each record
+    result = ShardWorker(bootstrap_scrapper(level = logging.ERROR), store, sink = sink, max_workers = 1, batch_size = 1).run()
+
+    assert result == {"shards": 0, "done": 0, "failed": 0}
+    assert len(sink.records) == 1
+
+    # The shard is left to its new owner
+    shard = store.collection.find_one({"_id": shard_id})
+    assert (shard["status"], shard["lease_owner"]) == (LEASED, "b")
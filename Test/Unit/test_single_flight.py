@@ -0,0 +1,105 @@
+"""Behaviour of the SingleFlight request coalescer
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+import pytest
+
+from RNPDNO.Scrapper import SingleFlight, request_key
+
+N_CALLERS = 8
+
+def call_concurrently(single_flight: SingleFlight, function, n_callers: int = N_CALLERS) -> list:
+    """Call a blocked function from several threads with the same key, release it once every caller is waiting
+    """
+
+    release = threading.Event()
+
+    def blocked_function():
+        release.wait(5)
+        return function()
+
+    def caller():
+        try:
+            return single_flight.do("key", blocked_function)
+        except BaseException as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers = n_callers) as executor:
+        futures = [executor.submit(caller) for _ in range(n_callers)]
+
+        # Every caller but the leader waits for the call in flight
+        while single_flight.stats["hits"] < n_callers - 1:
+            time.sleep(0.001)
+
+        release.set()
+
+        return [future.result() for future in futures]
+
+def test_identical_concurrent_calls_are_coalesced():
+
+    single_flight = SingleFlight()
+    n_calls = []
+
+    results = call_concurrently(single_flight, lambda: n_calls.append(1) or "response")
+
+    assert len(n_calls) == 1
+    assert sorted(shared for _, shared in results) == [False] + [True] * (N_CALLERS - 1)
+    assert all(result == "response" for result, _ in results)
+    assert single_flight.stats == {"hits": N_CALLERS - 1, "misses": 1, "in_flight": 0}
+
+def test_exceptions_are_raised_in_every_caller():
+
+    single_flight = SingleFlight()
+
+    def failing_function():
+        raise ConnectionError("Server unavailable")
+
+    results = call_concurrently(single_flight, failing_function)
+
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert single_flight.stats["misses"] == 1
+
+def test_key_is_forgotten_after_the_call():
+
+    single_flight = SingleFlight()
+
+    assert single_flight.do("key", lambda: 1) == (1, False)
+    assert single_flight.do("key", lambda: 2) == (2, False)
+
+    with pytest.raises(ValueError):
+        single_flight.do("key", int, "not a number")
+
+    assert single_flight.do("key", lambda: 3) == (3, False)
+    assert single_flight.stats == {"hits": 0, "misses": 4, "in_flight": 0}
+
+def test_interrupted_leader_is_replaced_by_a_follower():
+
+    single_flight = SingleFlight()
+    n_calls = []
+
+    def function():
+        n_calls.append(1)
+
+        # Only the first leader is interrupted
+        if len(n_calls) == 1:
+            raise KeyboardInterrupt()
+
+        return "response"
+
+    results = call_concurrently(single_flight, function)
+
+    interrupted = [result for result in results if isinstance(result, KeyboardInterrupt)]
+    responses = [result for result in results if isinstance(result, tuple)]
+
+    assert len(interrupted) == 1
+    assert len(responses) == N_CALLERS - 1
+    assert all(result == "response" for result, _ in responses)
+    assert single_flight.stats["in_flight"] == 0
+
+def test_request_key_coerces_payload_values():
+
+    assert request_key("post", "http://host/Totales", {"idEstado": 9, "idMunicipio": "7"}) == request_key("POST", "http://host/Totales", {"idMunicipio": 7, "idEstado": "9"})
+    assert request_key("POST", "http://host/Totales", None) == request_key("POST", "http://host/Totales", {})
@@ -0,0 +1,153 @@
+"""Behaviour of the MongoSink buffer: flushes by size and by interval, and retries of failed writes
+"""
+
+import time
+
+import pytest
+from pymongo import UpdateOne
+
+from RNPDNO.Sink import MongoSink
+
+class MockCollection:
+    """mongomock collection whose bulk writes can fail
+
+    Each bulk write takes the next outcome (True: written, False: failed), bulk writes without outcomes left are written.
+    If `down` is set, every bulk write fails. mongomock's bulk_write doesn't accept the operations of recent pymongo
+    versions, so upserts are applied one by one.
+    """
+
+    def __init__(self, collection) -> None:
+
+        self.collection = collection
+        self.outcomes = []
+        self.down = False
+        self.batch_sizes = []
+
+    def __getattr__(self, name: str):
+        return getattr(self.collection, name)
+
+    def bulk_write(self, operations: list, ordered: bool = True) -> None:
+
+        if self.down or (len(self.outcomes) > 0 and not self.outcomes.pop(0)):
+            raise ConnectionError("MongoDB unavailable")
+
+        self.batch_sizes.append(len(operations))
+
+        for operation in operations:
+            assert isinstance(operation, UpdateOne)
+            self.collection.update_one(operation._filter, operation._doc, upsert = operation._upsert)
+
+@pytest.fixture
+def collection():
+
+    mongomock = pytest.importorskip("mongomock")
+
+    return MockCollection(mongomock.MongoClient().db.totals)
+
+def record(i: int) -> dict:
+    return {"state_id": str(i), "mun_id": "0", "neighborhood_id": "0", "date_start": None, "date_end": None, "total": i}
+
+def test_full_buffer_is_flushed(collection):
+
+    with MongoSink(collection, batch_size = 3, flush_interval = 60) as sink:
+        sink.write_many(record(i) for i in range(4))
+
+        assert sink.stats == {"written": 3, "flushes": 1, "buffered": 1}
+
+    assert collection.count_documents({}) == 4
+
+def test_buffer_is_flushed_after_the_interval(collection):
+
+    with MongoSink(collection, batch_size = 100, flush_interval = 0.05) as sink:
+        sink.write(record(1))
+
+        deadline = time.monotonic() + 5
+
+        while sink.stats["written"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert sink.stats == {"written": 1, "flushes": 1, "buffered": 0}
+
+def test_upserts_are_keyed_on_the_key_fields(collection):
+
+    with MongoSink(collection, batch_size = 10, flush_interval = 60) as sink:
+        sink.write(record(1))
+        sink.flush()
+        sink.write({**record(1), "total": 2})
+        sink.write({**record(1), "filters": {"idEstatusVictima": "7"}})
+
+    assert collection.count_documents({}) == 2
+    assert collection.find_one({"state_id": "1", "filters": None})["total"] == 2
+
+def test_failed_batch_is_kept_and_retried(collection):
+
+    sink = MongoSink(collection, batch_size = 10, flush_interval = 60)
+    sink.write_many(record(i) for i in range(5))
+    collection.outcomes = [False]
+
+    with pytest.raises(ConnectionError):
+        sink.flush()
+
+    assert sink.stats == {"written": 0, "flushes": 0, "buffered": 5}
+
+    sink.write(record(5))
+    sink.close()
+
+    # The failed records are written first, in a single batch with the new one
+    assert collection.batch_sizes == [6]
+    assert [document["total"] for document in collection.find({}, sort = [("total", 1)])] == list(range(6))
+
+def test_only_records_not_written_are_retried(collection):
+
+    sink = MongoSink(collection, batch_size = 2, max_buffered = 10, flush_interval = 60)
+
+    # Records are buffered while MongoDB is down
+    collection.down = True
+
+    for i in range(6):
+        try:
+            sink.write(record(i))
+        except ConnectionError:
+            pass
+
+    assert sink.stats == {"written": 0, "flushes": 0, "buffered": 6}
+
+    # The backlog is written a batch at a time, the second batch fails
+    collection.down = False
+    collection.outcomes = [True, False]
+
+    with pytest.raises(ConnectionError):
+        sink.flush()
+
+    assert sink.stats == {"written": 2, "flushes": 1, "buffered": 4}
+
+    sink.close()
+
+    assert collection.batch_sizes == [2, 2, 2]
+    assert [document["total"] for document in collection.find({}, sort = [("total", 1)])] == list(range(6))
+
+def test_buffer_is_bounded_while_writes_fail(collection):
+
+    collection.down = True
+    sink = MongoSink(collection, batch_size = 2, max_buffered = 4, flush_interval = 60)
+    n_rejected = 0
+
+    for i in range(10):
+        try:
+            sink.write(record(i))
+        except ConnectionError:
+            n_rejected += 1
+
+    assert sink.stats["buffered"] == 4
+    assert n_rejected > 0
+
+    # Records buffered before MongoDB came back are written
+    collection.down = False
+    sink.close()
+
+    assert collection.count_documents({}) == 4
+
+def test_max_buffered_must_hold_a_batch(collection):
+
+    with pytest.raises(ValueError):
+        MongoSink(collection, batch_size = 10, max_buffered = 5)
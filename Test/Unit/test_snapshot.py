@@ -0,0 +1,114 @@
+"""Behaviour of the versioned record stores and of the DeltaSink
+"""
+
+from datetime import datetime
+
+import pytest
+
+from RNPDNO.Snapshot import MemorySnapshotStore, MongoSnapshotStore, DeltaSink, build_version, record_key
+from RNPDNO.Snapshot import VERSION_FIELD, VALID_FROM_FIELD, VALID_TO_FIELD, CHANGED_FIELDS_FIELD
+
+RECORD = {"state_id": "9", "mun_id": "7", "neighborhood_id": "0", "date_start": None, "date_end": None, "total": 10, "desaparecidos": 4}
+
+@pytest.fixture(params = ["memory", "mongo"])
+def store(request):
+
+    if request.param == "memory":
+        return MemorySnapshotStore()
+
+    mongomock = pytest.importorskip("mongomock")
+
+    return MongoSnapshotStore(mongomock.MongoClient().db.versions)
+
+class FailingStore:
+    """Store whose first add_versions call fails
+    """
+
+    def __init__(self, store) -> None:
+
+        self.store = store
+        self.n_failures = 1
+
+    @property
+    def name(self) -> str:
+        return self.store.name
+
+    def get_heads(self, keys):
+        return self.store.get_heads(keys)
+
+    def add_versions(self, versions: list) -> None:
+
+        if self.n_failures > 0:
+            self.n_failures -= 1
+            raise ConnectionError("Store unavailable")
+
+        self.store.add_versions(versions)
+
+def timestamp(*args) -> float:
+    return datetime(*args).timestamp()
+
+def test_unchanged_record_is_not_rewritten(store):
+
+    with DeltaSink(store) as sink:
+        sink.write(dict(RECORD))
+
+    with DeltaSink(store) as sink:
+        # Field order doesn't change the hash
+        sink.write(dict(reversed(list(RECORD.items()))))
+
+    assert sink.stats["written"] == 0
+    assert sink.stats["unchanged"] == 1
+    assert len(store.history(RECORD)) == 1
+
+def test_changed_record_closes_previous_version(store):
+
+    with DeltaSink(store) as sink:
+        sink.write(dict(RECORD))
+
+    with DeltaSink(store) as sink:
+        sink.write({**RECORD, "total": 11})
+
+    first, second = store.history(RECORD)
+
+    assert (first[VERSION_FIELD], second[VERSION_FIELD]) == (1, 2)
+    assert first[VALID_TO_FIELD] == second[VALID_FROM_FIELD]
+    assert second[VALID_TO_FIELD] is None
+    assert second[CHANGED_FIELDS_FIELD] == ["total"]
+    assert second["total"] == 11
+
+def test_as_of_between_versions(store):
+
+    first = build_version(dict(RECORD), None, timestamp(2023, 1, 10, 15))
+    store.add_versions([first])
+
+    second = build_version({**RECORD, "total": 11}, store.get_heads([record_key(RECORD)])[record_key(RECORD)], timestamp(2023, 2, 10, 15))
+    store.add_versions([second])
+
+    # Nothing before the first version
+    assert list(store.as_of("09/01/2023")) == []
+
+    # A date means the end of that day
+    assert [record["total"] for record in store.as_of("10/01/2023")] == [10]
+    assert [record["total"] for record in store.as_of("01/02/2023")] == [10]
+    assert [record["total"] for record in store.as_of("10/02/2023")] == [11]
+    assert [record["total"] for record in store.as_of()] == [11]
+
+    assert list(store.as_of("01/02/2023", query = {"state_id": "1"})) == []
+
+def test_failed_write_keeps_the_batch(store):
+
+    failing_store = FailingStore(store)
+    sink = DeltaSink(failing_store)
+    sink.write(dict(RECORD))
+
+    with pytest.raises(ConnectionError):
+        sink.flush()
+
+    assert sink.stats["buffered"] == 1
+
+    # A record written after the failure wins over the retried one
+    sink.write({**RECORD, "total": 12})
+    sink.close()
+
+    assert sink.stats == {"written": 1, "unchanged": 0, "flushes": 1, "buffered": 0}
+    assert [version["total"] for version in store.history(RECORD)] == [12]